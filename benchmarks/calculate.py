@@ -0,0 +1,49 @@
+"""Benchmark calculate_additional_data() on a track file.
+
+Usage: python benchmarks/calculate.py [TRACK_FILE] [--repeat N] [--engine {python,numpy}]
+"""
+import argparse
+import logging
+import os
+import time
+
+from pathlib import Path
+
+from gpst.data.load_track import load_track
+from gpst.data.processors import calculate_additional_data, Engine
+from gpst.utils.logger import setup_logger
+
+
+SAMPLE = Path(__file__).parent.parent / "tests" / "data" / "sample.fit"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", type=Path, nargs="?", default=SAMPLE)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--engine", type=Engine, choices=list(Engine), default=Engine.PYTHON)
+    args = parser.parse_args()
+
+    setup_logger() # honours DEBUG like the gpst command
+    if os.getenv("DEBUG", "0") == "0":
+        logging.getLogger().setLevel(logging.WARNING) # keep per-stage info messages out of the timing
+
+    times: list[float] = []
+    points = 0
+    for _ in range(args.repeat):
+        track = load_track(args.path)
+        if track is None:
+            raise SystemExit(f"Failed to load '{args.path}'.")
+        points = len(track.points)
+
+        start = time.perf_counter()
+        calculate_additional_data(track, 100, 100, engine=args.engine)
+        times.append(time.perf_counter() - start)
+
+    best = min(times)
+    print(f"{args.path.name}: {points} points, best {best * 1000:.1f} ms, "
+          f"median {sorted(times)[len(times) // 2] * 1000:.1f} ms, {points / best:,.0f} points/s")
+
+
+if __name__ == "__main__":
+    main()
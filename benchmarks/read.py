@@ -0,0 +1,66 @@
+"""Benchmark load_track() on a track file.
+
+Usage: python benchmarks/read.py [TRACK_FILE] [--repeat N] [--metadata]
+
+Without TRACK_FILE the sample FIT file and a GPX file written from it are read. With
+--metadata files are read without points, like when scanning a library of activities.
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from pathlib import Path
+
+from gpst.data.load_track import load_track
+from gpst.data.save_track import save_track
+from gpst.utils.logger import setup_logger
+
+
+SAMPLE = Path(__file__).parent.parent / "tests" / "data" / "sample.fit"
+
+
+def bench(path: Path, repeat: int, metadata: bool = False) -> None:
+    times: list[float] = []
+    points = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        track = load_track(path, points=not metadata)
+        times.append(time.perf_counter() - start)
+        if track is None:
+            raise SystemExit(f"Failed to load '{path}'.")
+        points = len(track.points)
+
+    best = min(times)
+    rate = f"{1 / best:,.0f} files/s" if metadata else f"{points / best:,.0f} points/s"
+    print(f"{path.name}: {points} points, best {best * 1000:.1f} ms, "
+          f"median {sorted(times)[len(times) // 2] * 1000:.1f} ms, {rate}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", type=Path, nargs="?")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--metadata", action="store_true", help="read metadata only")
+    args = parser.parse_args()
+
+    setup_logger() # honours DEBUG like the gpst command
+    if os.getenv("DEBUG", "0") == "0":
+        logging.getLogger().setLevel(logging.ERROR) # keep reader warnings out of the timing
+
+    if args.path is not None:
+        bench(args.path, args.repeat, args.metadata)
+        return
+
+    bench(SAMPLE, args.repeat, args.metadata)
+    with tempfile.TemporaryDirectory() as tmp:
+        gpx = Path(tmp) / "sample.gpx"
+        track = load_track(SAMPLE)
+        if track is None or not save_track(track, gpx):
+            raise SystemExit("Failed to write sample GPX file.")
+        bench(gpx, args.repeat, args.metadata)
+
+
+if __name__ == "__main__":
+    main()
@@ -25,6 +25,13 @@ def parse_args() -> argparse.Namespace:
         version=f"GPS Tools {__version__}"
     )
 
+    parser.add_argument(
+        "--cache-dir",
+        metavar="DIR",
+        type=str,
+        help="Cache decoded FIT and GPX tracks in DIR so repeated runs on the same file skip decoding (default: GPST_CACHE_DIR environment variable, no caching if unset)."
+    )
+
     for tool in tools.values():
         tool.add_argparser(subparsers)
 
@@ -35,7 +42,9 @@ def main() -> int:
     setup_logger()
 
     args = parse_args()
-    tool_args = {k: v for k, v in vars(args).items() if k != 'tool'}
+    tool_args = {k: v for k, v in vars(args).items() if k not in ('tool', 'cache_dir')}
+    if args.cache_dir is not None:
+        os.environ["GPST_CACHE_DIR"] = args.cache_dir
 
     try:
         logger.debug(f"Running tool '{args.tool}' with arguments: {tool_args}")
@@ -0,0 +1,362 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone, tzinfo
+from typing import Iterable, Iterator, Mapping, MutableMapping
+
+from .track import Track, Value, point_fields
+
+
+_EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_EPOCH_NAIVE = datetime(1970, 1, 1)
+_US = timedelta(microseconds=1)
+
+INT64_MIN = -2**63
+INT64_MAX = 2**63 - 1
+
+
+def _to_us(dt: datetime) -> int:
+    epoch = _EPOCH_NAIVE if dt.tzinfo is None else _EPOCH_UTC
+    return (dt - epoch) // _US
+
+
+def _from_us(us: int, tz: tzinfo | None) -> datetime:
+    if tz is None:
+        return _EPOCH_NAIVE + us * _US
+    dt = _EPOCH_UTC + us * _US
+    return dt if tz is timezone.utc else dt.astimezone(tz)
+
+
+def _keeps_offset(dt: datetime, tz: tzinfo | None) -> bool:
+    """Whether dt comes back with the same UTC offset when stored in a column with time zone tz."""
+    if tz is None or dt.tzinfo is None:
+        return tz is None and dt.tzinfo is None
+    return dt.tzinfo is tz or dt.astimezone(tz).utcoffset() == dt.utcoffset()
+
+
+class Column:
+    """Values of a single point field stored in a typed buffer with a validity mask.
+
+    Floats are kept in an array('d'), ints in an array('q') and datetimes as int64
+    epoch microseconds in the time zone of the column. Fields of any other type (or
+    values not matching the column type) are kept in a plain list.
+    """
+
+    def __init__(self, kind: str | None, length: int, tz: tzinfo | None = None) -> None:
+        self.kind: str | None = kind
+        self.tz: tzinfo | None = tz
+        self.values: array | list = self._empty(kind, length)
+        self.mask: bytearray = bytearray(length)
+
+
+    @staticmethod
+    def kind_for(key: str) -> str | None:
+        type_info = point_fields.get(key)
+        if type_info is None:
+            return None
+        if type_info.pytype is float:
+            return 'd'
+        if type_info.pytype is int:
+            return 'q'
+        if type_info.pytype is datetime:
+            return 't'
+        return None
+
+
+    @staticmethod
+    def _empty(kind: str | None, length: int) -> array | list:
+        if kind == 'd':
+            return array('d', bytes(8 * length))
+        if kind in ('q', 't'):
+            return array('q', bytes(8 * length))
+        return [None] * length
+
+
+    def __len__(self) -> int:
+        return len(self.mask)
+
+
+    def accepts(self, value: Value) -> bool:
+        if self.kind == 'd':
+            return isinstance(value, float)
+        if self.kind == 'q':
+            return isinstance(value, int) and not isinstance(value, bool) and INT64_MIN <= value <= INT64_MAX
+        if self.kind == 't':
+            return isinstance(value, datetime) and _keeps_offset(value, self.tz)
+        return True
+
+
+    def get(self, row: int) -> Value | None:
+        if not self.mask[row]:
+            return None
+        value = self.values[row]
+        if self.kind == 't':
+            return _from_us(value, self.tz)
+        return value
+
+
+    def set(self, row: int, value: Value) -> None:
+        if not self.accepts(value):
+            self._demote()
+        if self.kind == 't':
+            self.values[row] = _to_us(value) # type: ignore[arg-type]
+        elif self.kind == 'd':
+            self.values[row] = float(value) # type: ignore[arg-type]
+        else:
+            self.values[row] = value
+        self.mask[row] = 1
+
+
+    def clear(self, row: int) -> None:
+        self.mask[row] = 0
+        if self.kind is None:
+            self.values[row] = None
+
+
+    def append_empty(self) -> None:
+        self.values.append(None if self.kind is None else 0)
+        self.mask.append(0)
+
+
+    def insert_empty(self, row: int) -> None:
+        self.values.insert(row, None if self.kind is None else 0)
+        self.mask.insert(row, 0)
+
+
+    def _demote(self) -> None:
+        """Convert the column into a plain list so it can hold values of any type."""
+        self.values = [self.get(row) for row in range(len(self.mask))]
+        self.kind = None
+
+
+class PointView(MutableMapping[str, Value]):
+    """Dictionary-like view of a single row of a ColumnarTrack."""
+
+    __slots__ = ('_track', '_us', '_row', '_generation')
+
+    def __init__(self, track: 'ColumnarTrack', us: int, row: int) -> None:
+        self._track = track
+        self._us = us
+        self._row = row
+        self._generation = track._generation
+
+
+    def _index(self) -> int:
+        if self._generation != self._track._generation:
+            self._row = self._track._find_row(self._us)
+            self._generation = self._track._generation
+        return self._row
+
+
+    def __getitem__(self, key: str) -> Value:
+        column = self._track._columns.get(key)
+        if column is not None:
+            row = self._index()
+            if column.mask[row]:
+                return column.get(row) # type: ignore[return-value]
+        raise KeyError(key)
+
+
+    def __setitem__(self, key: str, value: Value) -> None:
+        self._track._column(key, value).set(self._index(), value)
+
+
+    def __delitem__(self, key: str) -> None:
+        column = self._track._columns.get(key)
+        row = self._index()
+        if column is None or not column.mask[row]:
+            raise KeyError(key)
+        column.clear(row)
+
+
+    def __contains__(self, key: object) -> bool:
+        column = self._track._columns.get(key) # type: ignore[call-overload]
+        return column is not None and bool(column.mask[self._index()])
+
+
+    def get(self, key: str, default: Value | None = None) -> Value | None: # type: ignore[override]
+        column = self._track._columns.get(key)
+        if column is None:
+            return default
+        row = self._index()
+        if not column.mask[row]:
+            return default
+        return column.get(row)
+
+
+    def __iter__(self) -> Iterator[str]:
+        row = self._index()
+        for key, column in self._track._columns.items():
+            if column.mask[row]:
+                yield key
+
+
+    def __len__(self) -> int:
+        row = self._index()
+        return sum(column.mask[row] for column in self._track._columns.values())
+
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
+
+
+class _PointsMapping(Mapping[datetime, MutableMapping[str, Value]]):
+    def __init__(self, track: 'ColumnarTrack') -> None:
+        self._track = track
+
+
+    def __getitem__(self, timestamp: datetime) -> MutableMapping[str, Value]:
+        point = self._track.get_point(timestamp)
+        if point is None:
+            raise KeyError(timestamp)
+        return point
+
+
+    def __iter__(self) -> Iterator[datetime]:
+        for ts, _ in self._track.points_iter:
+            yield ts
+
+
+    def __len__(self) -> int:
+        return len(self._track._timestamps)
+
+
+class ColumnarTrack(Track):
+    """Track storing points column-wise instead of as one dictionary per point.
+
+    Timestamps are kept sorted in an int64 epoch-microseconds column and every point
+    field gets its own typed column with a validity mask, see Column. Points are
+    exposed through PointView objects so the Track API stays the same. The time zone
+    of the first point applies to the whole track, storing a timestamp that would come
+    back with a different UTC offset raises ValueError.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._timestamps: array = array('q')
+        self._columns: dict[str, Column] = {}
+        self._tz: tzinfo | None = None
+        self._generation: int = 0 # bumped whenever existing rows are shifted
+
+
+    @property
+    def points(self) -> Mapping[datetime, MutableMapping[str, Value]]:
+        return _PointsMapping(self)
+
+
+    @property
+    def points_iter(self) -> Iterable[tuple[datetime, MutableMapping[str, Value]]]:
+        tz = self._tz
+        for row, us in enumerate(self._timestamps):
+            yield _from_us(us, tz), PointView(self, us, row)
+
+
+    def range_iter(self, start: datetime | None = None, end: datetime | None = None) -> Iterable[tuple[datetime, MutableMapping[str, Value]]]:
+        for bound in (start, end):
+            if bound is not None and self._timestamps and (bound.tzinfo is None) != (self._tz is None):
+                raise TypeError("Cannot compare offset-naive and offset-aware timestamps.")
+
+        lo = bisect_left(self._timestamps, _to_us(start)) if start is not None else 0
+        hi = bisect_right(self._timestamps, _to_us(end)) if end is not None else len(self._timestamps)
+        tz = self._tz
+        timestamps = self._timestamps
+        for row in range(lo, hi):
+            us = timestamps[row]
+            yield _from_us(us, tz), PointView(self, us, row)
+
+
+    @property
+    def timestamps_us(self) -> array:
+        return self._timestamps
+
+
+    @property
+    def tz(self) -> tzinfo | None:
+        return self._tz
+
+
+    @property
+    def columns(self) -> Mapping[str, Column]:
+        return self._columns
+
+
+    def column(self, key: str) -> Column | None:
+        return self._columns.get(key)
+
+
+    def get_point(self, timestamp: datetime) -> MutableMapping[str, Value] | None:
+        if not self._timestamps or (timestamp.tzinfo is None) != (self._tz is None):
+            return None
+        us = _to_us(timestamp)
+        row = bisect_left(self._timestamps, us)
+        if row == len(self._timestamps) or self._timestamps[row] != us:
+            return None
+        return PointView(self, us, row)
+
+
+    def remove_point_fields(self, fields: list[str]) -> None:
+        for field in fields:
+            self._columns.pop(field, None)
+
+
+    def _store_point(self, timestamp: datetime, data: dict[str, Value]) -> None:
+        row = self._row_for(timestamp)
+        for key, value in data.items():
+            self._column(key, value).set(row, value)
+
+
+    def _store_points(self, rows: list[tuple[datetime, dict[str, Value]]]) -> None:
+        for timestamp, data in rows:
+            self._store_point(timestamp, data)
+
+
+    def _find_row(self, us: int) -> int:
+        row = bisect_left(self._timestamps, us)
+        if row == len(self._timestamps) or self._timestamps[row] != us:
+            raise KeyError(f"Point at {us} us no longer present in track.")
+        return row
+
+
+    def _row_for(self, timestamp: datetime) -> int:
+        if not self._timestamps:
+            self._tz = timestamp.tzinfo
+        elif (timestamp.tzinfo is None) != (self._tz is None):
+            raise TypeError("Cannot mix offset-naive and offset-aware timestamps in one track.")
+        elif not _keeps_offset(timestamp, self._tz):
+            raise ValueError(f"Cannot store timestamp with UTC offset {timestamp.utcoffset()} in a track with time zone {self._tz}.")
+
+        us = _to_us(timestamp)
+        n = len(self._timestamps)
+        if n == 0 or us > self._timestamps[-1]:
+            self._timestamps.append(us)
+            for column in self._columns.values():
+                column.append_empty()
+            return n
+
+        row = bisect_left(self._timestamps, us)
+        if self._timestamps[row] == us:
+            return row
+
+        self._timestamps.insert(row, us)
+        for column in self._columns.values():
+            column.insert_empty(row)
+        self._generation += 1
+        return row
+
+
+    def _column(self, key: str, value: Value) -> Column:
+        column = self._columns.get(key)
+        if column is None:
+            kind = Column.kind_for(key)
+            column = Column(kind, len(self._timestamps), self._tz)
+            if not column.accepts(value):
+                column = Column(None, len(self._timestamps), self._tz)
+            self._columns[key] = column
+        return column
+
+
+    def _set_columns(self, timestamps: array, tz: tzinfo | None, columns: dict[str, Column]) -> None:
+        """Replace all points with prepared timestamps and columns of the same length."""
+        self._timestamps = timestamps
+        self._tz = tz
+        self._columns = columns
+        self._generation += 1
@@ -0,0 +1,54 @@
+"""Transparent compression of track files, selected by the last suffix of the path.
+
+Files are compressed and decompressed as streams - '.gz' with gzip, '.zst' with zstd (standard
+library on Python 3.14+, the zstandard package otherwise).
+"""
+import gzip
+import importlib
+
+from pathlib import Path
+from typing import Any, BinaryIO, Literal, cast
+
+
+COMPRESSION_SUFFIXES = ('.gz', '.zst')
+
+
+def track_suffix(path: Path) -> str:
+    """Suffix of the track format, e.g. '.gpx' for both 'track.gpx' and 'track.gpx.gz'."""
+    suffix = path.suffix.lower()
+    if suffix in COMPRESSION_SUFFIXES:
+        return Path(path.stem).suffix.lower()
+    return suffix
+
+
+def base_path(path: Path) -> Path:
+    """Path without track format and compression suffixes, e.g. 'track' for 'track.gpx.gz'."""
+    if path.suffix.lower() in COMPRESSION_SUFFIXES:
+        path = path.with_suffix('')
+    return path.with_suffix('')
+
+
+def is_compressed(path: Path) -> bool:
+    return path.suffix.lower() in COMPRESSION_SUFFIXES
+
+
+def open_file(path: Path, mode: Literal['rb', 'wb']) -> BinaryIO:
+    """Open binary file, compressing or decompressing on the fly for compressed suffixes."""
+    match path.suffix.lower():
+        case '.gz':
+            return cast(BinaryIO, gzip.open(path, mode, compresslevel=6))
+        case '.zst':
+            return _zstd().open(path, mode) # type: ignore[no-any-return]
+        case _:
+            return open(path, mode)
+
+
+def _zstd() -> Any:
+    try:
+        return importlib.import_module("compression.zstd")
+    except ImportError:
+        pass
+    try:
+        return importlib.import_module("zstandard")
+    except ImportError:
+        raise ImportError("zstd compression requires Python 3.14 or the zstandard package") from None
@@ -0,0 +1,91 @@
+"""Binary columnar track format (.gpst) shared by GPST reader and writer.
+
+Layout, numbers little-endian:
+    MAGIC, uint32 header length, UTF-8 JSON header,
+    int64 point timestamps (epoch microseconds),
+    per typed column: uint8 validity mask and int64/double values of all points.
+
+The header holds point count, UTC offset of the timestamps, metadata, segments, curves and the column list,
+values of untyped columns are stored in the header. Arrays follow each other at offsets
+known from the header, so they are copied straight into ColumnarTrack columns. Only naive
+timestamps and timestamps with one fixed UTC offset can be stored.
+"""
+import sys
+
+from array import array
+from datetime import datetime, timedelta, timezone, tzinfo
+from typing import Any
+
+from .columnar_track import ColumnarTrack, _keeps_offset
+from .track import SegmentType, Track, Value
+
+
+MAGIC = b"GPST"
+VERSION = 3
+
+TYPED_KINDS = ('d', 'q', 't') # Column kinds stored as binary arrays
+
+
+def to_little_endian(values: array) -> array:
+    if sys.byteorder == 'little':
+        return values
+    swapped = array(values.typecode, values)
+    swapped.byteswap()
+    return swapped
+
+
+def from_little_endian(values: array) -> array:
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def encode_tz(tz: tzinfo | None) -> float | None:
+    """UTC offset in seconds stored for time zone of the timestamps, None for naive timestamps.
+
+    Raises ValueError for time zones other than a plain fixed offset, e.g. zoneinfo or named zones.
+    """
+    if tz is None:
+        return None
+    offset = tz.utcoffset(None)
+    if not isinstance(tz, timezone) or offset is None or tz.tzname(None) != timezone(offset).tzname(None):
+        raise ValueError(f"Time zone {tz} cannot be stored, only timestamps with a plain fixed UTC offset can.")
+    return offset.total_seconds()
+
+
+def decode_tz(offset: float | None) -> tzinfo | None:
+    return None if offset is None else timezone(timedelta(seconds=offset))
+
+
+def representable(track: Track) -> bool:
+    """Whether timestamps of track are read back from a GPST file exactly as they are, see encode_tz."""
+    if isinstance(track, ColumnarTrack):
+        timestamps = []
+        tz = track.tz
+    else:
+        timestamps = [ts for ts, _ in track.points_iter]
+        tz = timestamps[0].tzinfo if timestamps else None
+    try:
+        encode_tz(tz)
+    except ValueError:
+        return False
+    return all(_keeps_offset(ts, tz) for ts in timestamps)
+
+
+def encode_value(value: Value) -> Any:
+    """JSON representation of a value, datetimes and segment types are wrapped in an object."""
+    if isinstance(value, datetime):
+        return {'datetime': value.isoformat()}
+    if isinstance(value, SegmentType):
+        return {'segment_type': value.value}
+    return value
+
+
+def decode_value(value: Any) -> Value:
+    if isinstance(value, dict):
+        if 'datetime' in value:
+            return datetime.fromisoformat(value['datetime'])
+        if 'segment_type' in value:
+            return SegmentType(value['segment_type'])
+        raise ValueError(f"Unknown value encoding: {value}")
+    return value
@@ -0,0 +1,53 @@
+"""Track point fields of GPX extensions shared by GPX reader and writer.
+
+Tables map extension element tag to point field and its type, in the order of the
+extension schema sequence - the order in which the writer emits them.
+"""
+from collections.abc import Callable
+
+from .track import Value
+
+
+FieldTable = dict[str, tuple[str, Callable[[str], Value]]]
+
+
+TPX_V2_FIELDS: FieldTable = {
+    "atemp": ("temperature", float),
+    "hr": ("heart_rate", float),
+    "cad": ("cadence", int),
+    "speed": ("speed", float),
+}
+
+ADX_V11_FIELDS: FieldTable = {
+    "timer": ("timer", float),
+    "smoothele": ("smooth_elevation", float),
+    "dist": ("distance", float),
+    "kcal": ("calories", float),
+    "rr": ("respiration_rate", float),
+    "ctemp": ("core_temperature", float),
+    "power": ("power", float),
+    "power3s": ("power3s", float),
+    "power10s": ("power10s", float),
+    "power30s": ("power30s", float),
+    "accpower": ("accumulated_power", float),
+    "grade": ("grade", float),
+    "asc": ("cumulative_ascent", float),
+    "desc": ("cumulative_descent", float),
+    "vspeed": ("vertical_speed", float),
+    "ltrqeff": ("left_torque_effectiveness", float),
+    "rtrqeff": ("right_torque_effectiveness", float),
+    "lpdlsmooth": ("left_pedal_smoothness", float),
+    "rpdlsmooth": ("right_pedal_smoothness", float),
+    "cpdlsmooth": ("combined_pedal_smoothness", float),
+    "grit": ("grit", float),
+    "flow": ("flow", float),
+    "climb": ("active_climb", int),
+    "fgearnum": ("front_gear_num", int),
+    "fgear": ("front_gear", int),
+    "rgearnum": ("rear_gear_num", int),
+    "rgear": ("rear_gear", int),
+    "jumpdist": ("jump_distance", float),
+    "jumpheight": ("jump_height", float),
+    "jumptime": ("jump_hang_time", float),
+    "jumpscore": ("jump_score", float),
+}
@@ -1,17 +1,51 @@
 from pathlib import Path
 
+from ..utils.logger import logger
+from .compression import track_suffix
 from .track import Track
-from .reader import Reader, FitReader, GpxReader
+from .columnar_track import ColumnarTrack
+from .reader import Reader, FitReader, GpxReader, GpstReader
+from .track_cache import track_cache
 
 
 _readers = {
     '.fit': FitReader(),
-    '.gpx': GpxReader()
+    '.gpx': GpxReader(),
+    '.gpst': GpstReader(),
 }
 
+_cached = ('.fit', '.gpx') # formats worth caching, GPST files load as fast as the cache
 
-def load_track(path: Path) -> Track|None:
-    reader: Reader|None = _readers.get(path.suffix.lower())
+
+def load_track(path: Path, columnar: bool = False, points: bool = True) -> Track|None:
+    """Load track from file, points=False reads only metadata (and segments and curves stored apart from points) for fast scanning."""
+    suffix = track_suffix(path)
+    reader: Reader|None = _readers.get(suffix)
     if reader is None:
-        raise ValueError(f"Unsupported file extension '{path.suffix}'")
-    return reader.read(path)
+        raise ValueError(f"Unsupported file extension '{''.join(path.suffixes)}'")
+    track_type = ColumnarTrack if columnar else Track
+
+    if not points:
+        return reader.read(path, track_type, points=False) # faster than hashing the file for the cache
+
+    cache = track_cache() if suffix in _cached else None
+    if cache is None:
+        return reader.read(path, track_type)
+
+    try:
+        key = cache.key(path)
+        track = cache.get(key, track_type)
+    except OSError as e:
+        logger.warning(f"Track cache lookup for '{path}' failed: {e}")
+        return reader.read(path, track_type)
+    if track is not None:
+        logger.debug(f"Loaded '{path}' from track cache.")
+        return track
+
+    track = reader.read(path, track_type)
+    if track is not None:
+        try:
+            cache.put(key, track)
+        except OSError as e:
+            logger.warning(f"Failed to store '{path}' in track cache: {e}")
+    return track
@@ -1,2 +1,3 @@
-from .calculator import calculate_additional_data
+from .calculator import calculate_additional_data, Engine
+from .curves import calculate_curves
 from .fix_elevation import fix_elevation
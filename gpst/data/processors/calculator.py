@@ -1,15 +1,94 @@
+import heapq
 import math
-import statistics
+from collections import deque
+from dataclasses import dataclass, field, replace
 from datetime import datetime, timedelta
+from enum import StrEnum
+from typing import Iterable, Mapping
 
 from ...utils.helpers import to_string, geo_distance
-from ..track import Track, Value, latitude_t, longitude_t
+from ..track import Track, Value, latitude_t, longitude_t, point_fields, _exact, _finite, _EXACT_SHIFT
 
 from ...utils.logger import logger
 
 
 MIN_GRADE_WINDOW = 0.4 # 40% grade window
 
+POWER_AVERAGE_WINDOWS: Mapping[str, float] = {'power3s': 3, 'power10s': 10, 'power30s': 30} # point field: window in seconds
+
+
+class Engine(StrEnum):
+    PYTHON = 'python'
+    NUMPY = 'numpy' # vectorized stages, requires numpy (gpst[fast])
+
+
+class Span(StrEnum):
+    """Points whose stage results can change when an input of a given point changes."""
+    POINT = 'point' # the point itself
+    PREVIOUS = 'previous' # the point and the next sample (deltas to the previous sample)
+    TIME = 'time' # points up to the stage window (seconds) later
+    DISTANCE = 'distance' # points within half of the stage window (meters) of distance
+    CUMULATIVE = 'cumulative' # the point and all later points
+
+
+@dataclass(frozen=True)
+class Stage:
+    """Calculation stage with the data it reads and writes, used to find what a change invalidates."""
+    name: str
+    reads: frozenset[str] # point fields and metadata the stage results depend on
+    span: Span = Span.POINT
+    fields: frozenset[str] = frozenset() # point fields written
+    metadata: frozenset[str] = frozenset() # metadata written
+    segment_fields: Mapping[str, frozenset[str]] = field(default_factory=dict) # segment field: point fields it is calculated from
+    param: str | None = None # calculation parameter the results depend on
+
+
+SEGMENT_FIELD_SOURCES: Mapping[str, frozenset[str]] = {key: frozenset(sources) for keys, sources in (
+    (('start_timer', 'end_timer', 'total_elapsed_time'), ('timer',)),
+    (('start_distance', 'end_distance', 'total_distance'), ('distance',)),
+    (('start_elevation', 'end_elevation', 'max_elevation', 'min_elevation'), ('elevation',)),
+    (('start_ascent', 'end_ascent'), ('cumulative_ascent',)),
+    (('start_descent', 'end_descent'), ('cumulative_descent',)),
+    (('start_latitude', 'start_longitude', 'end_latitude', 'end_longitude', 'minlat', 'minlon', 'maxlat', 'maxlon'), ('latitude', 'longitude')),
+    (('total_ascent', 'total_descent', 'avg_vam'), ('smooth_elevation', 'distance')),
+    (('max_grade', 'min_grade'), ('grade',)),
+    (('avg_grade',), ('distance', 'elevation')),
+    (('max_speed',), ('speed',)),
+    (('avg_speed',), ('distance', 'timer')),
+    (('avg_power', 'max_power'), ('power',)),
+    (('normalized_power',), ('power30s',)),
+    (('avg_heart_rate', 'max_heart_rate'), ('heart_rate',)),
+    (('avg_cadence', 'max_cadence'), ('cadence',)),
+) for key in keys}
+
+JUMP_FIELDS = ('jump_distance', 'jump_height', 'jump_rotations', 'jump_hang_time', 'jump_score')
+
+# calculation stages in pipeline order
+STAGES: tuple[Stage, ...] = (
+    Stage('times', frozenset(), Span.CUMULATIVE,
+          fields=frozenset({'timer'}), metadata=frozenset({'start_time', 'end_time', 'total_elapsed_time'})),
+    Stage('bounds', frozenset({'latitude', 'longitude'}),
+          metadata=frozenset({'minlat', 'minlon', 'maxlat', 'maxlon'})),
+    Stage('distances', frozenset({'latitude', 'longitude'}), Span.CUMULATIVE,
+          fields=frozenset({'distance', 'track_distance'}), metadata=frozenset({'total_distance', 'total_track_distance'})),
+    Stage('speeds', frozenset({'distance', 'timer', 'speed', 'total_elapsed_time', 'total_distance', 'total_track_distance'}), Span.PREVIOUS,
+          fields=frozenset({'speed', 'track_speed'}), metadata=frozenset({'max_speed', 'max_track_speed', 'avg_speed', 'avg_track_speed'})),
+    Stage('vspeeds', frozenset({'elevation', 'timer'}), Span.PREVIOUS,
+          fields=frozenset({'vertical_speed'})),
+    Stage('power_averages', frozenset({'power'}), Span.TIME,
+          fields=frozenset(POWER_AVERAGE_WINDOWS)),
+    Stage('elevation', frozenset({'elevation', 'distance'}), Span.DISTANCE,
+          fields=frozenset({'smooth_elevation'}), metadata=frozenset({'max_elevation', 'min_elevation'}), param='elevation_smoothing_window'),
+    Stage('grade', frozenset({'smooth_elevation', 'distance'}), Span.DISTANCE,
+          fields=frozenset({'grade'}), metadata=frozenset({'max_grade', 'min_grade'}), param='grade_calculation_window'),
+    Stage('ascent_descent', frozenset({'smooth_elevation', 'distance'}), Span.CUMULATIVE,
+          fields=frozenset({'cumulative_ascent', 'cumulative_descent'}), metadata=frozenset({'total_ascent', 'total_descent', 'avg_vam'})),
+    Stage('misc', frozenset(JUMP_FIELDS),
+          metadata=frozenset({'jump_count'})),
+    Stage('segments', frozenset().union(*SEGMENT_FIELD_SOURCES.values()),
+          segment_fields=SEGMENT_FIELD_SOURCES),
+)
+
 
 def _calculate_times(track: Track) -> Track:
     """Calculate start_time, end_time, total_elapsed_time metadata and timer point field."""
@@ -22,6 +101,7 @@ def _calculate_times(track: Track) -> Track:
 
     n: int = 0
 
+    trace = logger.trace_enabled()
     for ts, point in track.points_iter:
         if start_time is None:
             start_time = ts
@@ -30,7 +110,8 @@ def _calculate_times(track: Track) -> Track:
         total_time = (ts - start_time).total_seconds() if start_time and ts else 0.0
 
         if total_time is not None and 'timer' not in point:
-            logger.trace(f"Setting timer for point at {to_string(ts)} to {total_time} seconds")
+            if trace:
+                logger.trace(f"Setting timer for point at {to_string(ts)} to {total_time} seconds")
             point['timer'] = total_time
             n += 1
     
@@ -123,6 +204,7 @@ def _calculate_distances(track: Track) -> Track:
     n: int = 0
     n_t: int = 0
 
+    trace = logger.trace_enabled()
     for ts, point in track.points_iter:
         lat = point.get('latitude')
         lon = point.get('longitude')
@@ -136,11 +218,13 @@ def _calculate_distances(track: Track) -> Track:
 
             point['track_distance'] = total_distance
             n_t += 1
-            logger.trace(f"Setting track_distance for point at {to_string(ts)} to {total_distance} meters")
+            if trace:
+                logger.trace(f"Setting track_distance for point at {to_string(ts)} to {total_distance} meters")
             if 'distance' not in point:
                 point['distance'] = total_distance
                 n += 1
-                logger.trace(f"Setting distance for point at {to_string(ts)} to {total_distance} meters")
+                if trace:
+                    logger.trace(f"Setting distance for point at {to_string(ts)} to {total_distance} meters")
 
     logger.debug(f"Calculated distances for {n} points and track distances for {n_t} points.")
 
@@ -167,6 +251,7 @@ def _calculate_speeds(track: Track) -> Track:
 
     n: int = 0
     n_t: int = 0
+    trace = logger.trace_enabled()
     for ts, point in track.points_iter:
         distance = point.get('distance')
         timer = point.get('timer')
@@ -176,11 +261,13 @@ def _calculate_speeds(track: Track) -> Track:
 
             point['track_speed'] = speed
             n_t += 1
-            logger.trace(f"Setting track_speed for point at {to_string(ts)} to {speed} m/s")
+            if trace:
+                logger.trace(f"Setting track_speed for point at {to_string(ts)} to {speed} m/s")
             if 'speed' not in point:
                 point['speed'] = speed
                 n += 1
-                logger.trace(f"Setting speed for point at {to_string(ts)} to {speed} m/s")
+                if trace:
+                    logger.trace(f"Setting speed for point at {to_string(ts)} to {speed} m/s")
 
             if speed > max_track_speed:
                 max_track_speed = speed
@@ -237,64 +324,136 @@ def _calculate_vspeeds(track: Track) -> Track:
 
     n: int = 0
 
+    trace = logger.trace_enabled()
     for ts, point in track.points_iter:
-        if 'vertical_speed' not in point:
-            elevation = point.get('elevation')
-            timer = point.get('timer')
+        elevation = point.get('elevation')
+        timer = point.get('timer')
 
-            if (isinstance(elevation, (int, float)) and
-                isinstance(timer, (int, float))):
+        if (isinstance(elevation, (int, float)) and
+            isinstance(timer, (int, float))):
 
-                if last_elevation is not None and last_time is not None:
-                    v_speed = (elevation - last_elevation) / (timer - last_time) if (timer - last_time) > 0 else 0.0
-                    point['vertical_speed'] = v_speed
-                    n += 1
+            if last_elevation is not None and last_time is not None and 'vertical_speed' not in point:
+                v_speed = (elevation - last_elevation) / (timer - last_time) if (timer - last_time) > 0 else 0.0
+                point['vertical_speed'] = v_speed
+                n += 1
+                if trace:
                     logger.trace(f"Setting vertical_speed for point at {to_string(ts)} to {v_speed} m/s")
 
-                last_elevation = elevation
-                last_time = timer
+            last_elevation = elevation
+            last_time = timer
 
     logger.debug(f"Calculated vertical speeds for {n} points.")
     return track
 
 
-def _calculate_power_averages(track: Track) -> Track:
-    """Calculate power3s, power10s, power30s point fields using simple moving averages."""
+class _ExactMean:
+    """Running mean over an exact sum (see track._exact), same result as statistics.mean().
+
+    NaN and infinite values are not counted.
+    """
+
+    __slots__ = ('_total', '_count', '_floats')
+
+    def __init__(self) -> None:
+        self._total: int = 0
+        self._count: int = 0
+        self._floats: int = 0
+
+
+    def __len__(self) -> int:
+        return self._count
+
+
+    def add(self, value: int | float) -> int | None:
+        """Add value to the mean, returns its exact representation for a later remove()."""
+        if not _finite(value):
+            return None
+        exact = _exact(value)
+        self._total += exact
+        self._count += 1
+        self._floats += isinstance(value, float)
+        return exact
+
+
+    def remove(self, value: int | float, exact: int | None = None) -> None:
+        if not _finite(value):
+            return
+        self._total -= _exact(value) if exact is None else exact
+        self._count -= 1
+        self._floats -= isinstance(value, float)
+
+
+    def mean(self) -> int | float | None:
+        count = self._count
+        if count == 0:
+            return None
+        if self._floats == 0:
+            total = self._total >> _EXACT_SHIFT # ints only - integral mean stays int like statistics.mean()
+            return total // count if total % count == 0 else total / count
+        return self._total / (count << _EXACT_SHIFT)
+
+
+class _RollingMean:
+    """Mean of the values added within the last `window` before a given time.
+
+    Keeps a deque of (timestamp, value) and an _ExactMean, so adding and evicting
+    values is O(1) and the mean matches statistics.mean(). NaN and infinite values
+    are skipped.
+    """
+
+    def __init__(self, window: timedelta) -> None:
+        self.window = window
+        self._values: deque[tuple[datetime, int | float, int | None]] = deque()
+        self._mean = _ExactMean()
+
+
+    def add(self, timestamp: datetime, value: int | float) -> None:
+        if _finite(value):
+            self._values.append((timestamp, value, self._mean.add(value)))
+
+
+    def evict(self, timestamp: datetime) -> None:
+        """Drop values added at or before `timestamp - window`."""
+        cutoff = timestamp - self.window
+        values = self._values
+        while values and values[0][0] <= cutoff:
+            _, value, exact = values.popleft()
+            self._mean.remove(value, exact)
+
+
+    def mean(self) -> int | float | None:
+        return self._mean.mean()
+
+
+def _calculate_power_averages(track: Track, windows: Mapping[str, float] = POWER_AVERAGE_WINDOWS) -> Track:
+    """Calculate power3s, power10s, power30s (or other configured) point fields using simple moving averages."""
 
     logger.debug("Calculating power averages for track points...")
 
     n: int = 0
 
-    power: dict[datetime, float] = {}
+    averages = [(key, _RollingMean(timedelta(seconds=seconds))) for key, seconds in windows.items()]
+    trace = logger.trace_enabled()
     for timestamp, point in track.points_iter:
         pwr = point.get('power')
-        if isinstance(pwr, (int, float)):
-            power[timestamp] = pwr
+        numeric = isinstance(pwr, (int, float))
 
         calculated = False
-        if 'power3s' not in point:
-            power3s = [p for ts,p in power.items() if ts > timestamp - timedelta(seconds=3)]
-            if len(power3s) > 0:
-                point['power3s'] = statistics.mean(power3s)
-                calculated = True
-                logger.trace(f"Setting power3s for point at {to_string(timestamp)} to {point['power3s']} watts")
-        if 'power10s' not in point:
-            power10s = [p for ts,p in power.items() if ts > timestamp - timedelta(seconds=10)]
-            if len(power10s) > 0:
-                point['power10s'] = statistics.mean(power10s)
-                calculated = True
-                logger.trace(f"Setting power10s for point at {to_string(timestamp)} to {point['power10s']} watts")
-        if 'power30s' not in point:
-            power30s = [p for ts,p in power.items() if ts > timestamp - timedelta(seconds=30)]
-            if len(power30s) > 0:
-                point['power30s'] = statistics.mean(power30s)
-                calculated = True
-                logger.trace(f"Setting power30s for point at {to_string(timestamp)} to {point['power30s']} watts")
+        for key, average in averages:
+            if numeric:
+                average.add(timestamp, pwr) # type: ignore[arg-type]
+            average.evict(timestamp)
+
+            if key not in point:
+                mean = average.mean()
+                if mean is not None:
+                    point[key] = mean
+                    calculated = True
+                    if trace:
+                        logger.trace(f"Setting {key} for point at {to_string(timestamp)} to {mean} watts")
         if calculated:
             n += 1
 
-        power = {k: v for k, v in power.items() if k > timestamp - timedelta(seconds=30)}
-
     logger.debug(f"Calculated power averages for {n} points.")
     return track
 
@@ -308,7 +467,8 @@ def _calculate_elevation(track: Track, window_size: int) -> Track:
     max_elevation: float | None = None
     min_elevation: float | None = None
 
-    for ts, point, window in track.sliding_window_iter(key='distance', size=window_size):
+    trace = logger.trace_enabled()
+    for ts, point, window in track.sliding_window_iter(key='distance', size=window_size, sums=('elevation',)):
         elev = point.get('elevation')
         if isinstance(elev, (int, float)):
             if max_elevation is None or elev > max_elevation:
@@ -317,11 +477,12 @@ def _calculate_elevation(track: Track, window_size: int) -> Track:
                 min_elevation = elev
 
         if 'smooth_elevation' not in point:
-            elevs = [p['elevation'] for p in window if 'elevation' in p and isinstance(p['elevation'], (int, float))]
-            if len(elevs) > 0:
-                point['smooth_elevation'] = statistics.mean(elevs)
+            smooth_elevation = window.mean('elevation')
+            if smooth_elevation is not None:
+                point['smooth_elevation'] = smooth_elevation
                 n += 1
-                logger.trace(f"Setting smooth_elevation for point at {to_string(ts)} to {point['smooth_elevation']} meters")
+                if trace:
+                    logger.trace(f"Setting smooth_elevation for point at {to_string(ts)} to {point['smooth_elevation']} meters")
 
     if isinstance(max_elevation, (int, float)) and "max_elevation" not in track.metadata:
         track.set_metadata('max_elevation', max_elevation)
@@ -349,6 +510,7 @@ def _calculate_grade(track: Track, window_size: int) -> Track:
 
     n: int = 0
 
+    trace = logger.trace_enabled()
     for ts, point, window in track.sliding_window_iter(key=dist_key, size=window_size):
         grade = 0.0
 
@@ -359,13 +521,13 @@ def _calculate_grade(track: Track, window_size: int) -> Track:
             alt = point.get(alt_key)
 
             if dist is None or alt is None:
-                logger.trace(f"Point at {to_string(ts)} missing {dist_key} or {alt_key} for grade calculation. Skipping.")
+                if trace:
+                    logger.trace(f"Point at {to_string(ts)} missing {dist_key} or {alt_key} for grade calculation. Skipping.")
                 continue
 
             try:
-                altitudes = [(p[dist_key], p[alt_key]) for p in window if alt_key in p and dist_key in p]
-                z1,y1 = altitudes[0]
-                z2,y2 = altitudes[-1]
+                z1,y1 = next((p[dist_key], p[alt_key]) for p in window if alt_key in p and dist_key in p)
+                z2,y2 = next((p[dist_key], p[alt_key]) for p in reversed(window) if alt_key in p and dist_key in p)
 
                 if dist - z1 < min_grade_window/2:
                     continue # don't calculate grade if no points available at least half of min grade window - covers beginning of activity
@@ -380,7 +542,8 @@ def _calculate_grade(track: Track, window_size: int) -> Track:
                 grade = (y / x) * 100.0
                 point['grade'] = grade
                 n += 1
-                logger.trace(f"Setting grade for point at {to_string(ts)} to {grade} %")
+                if trace:
+                    logger.trace(f"Setting grade for point at {to_string(ts)} to {grade} %")
             except Exception as e:
                 logger.warning(f"Failed to calculate grade for point at {to_string(ts)}: {e}")
                 continue
@@ -458,9 +621,11 @@ def _calculate_misc(track: Track) -> Track:
 
     jump_count: int = 0
 
+    trace = logger.trace_enabled()
     for ts, point in track.points_iter:
-        if any(f in point for f in ['jump_distance', 'jump_height', 'jump_rotations', 'jump_hang_time', 'jump_score']):
-            logger.trace(f"Jump detected at {to_string(ts)}")
+        if any(f in point for f in JUMP_FIELDS):
+            if trace:
+                logger.trace(f"Jump detected at {to_string(ts)}")
             jump_count += 1
 
     track.set_metadata('jump_count', jump_count)
@@ -469,337 +634,584 @@ def _calculate_misc(track: Track) -> Track:
     return track
 
 
+class _SegmentAggregate:
+    """Running aggregates of the points within a single segment, see _calculate_segments."""
+
+    __slots__ = ('start_ts', 'end_ts',
+                 'start_timer', 'end_timer', 'start_distance', 'end_distance', 'start_elevation', 'end_elevation',
+                 'start_ascent', 'end_ascent', 'start_descent', 'end_descent',
+                 'start_latitude', 'start_longitude', 'end_latitude', 'end_longitude', 'minlat', 'minlon', 'maxlat', 'maxlon',
+                 'total_ascent', 'total_descent', 'time_ascending', 'last_ts', 'last_elevation',
+                 'max_grade', 'min_grade', 'max_elevation', 'min_elevation', 'max_speed',
+                 'power_samples', 'total_power', 'total_power_time', 'max_power', 'power30s_4th',
+                 'heart_rate', 'max_heart_rate', 'cadence', 'max_cadence')
+
+    def __init__(self, start_ts: datetime, end_ts: datetime) -> None:
+        self.start_ts = start_ts
+        self.end_ts = end_ts
+
+        self.start_timer: float | None = None
+        self.end_timer: float | None = None
+        self.start_distance: float | None = None
+        self.end_distance: float | None = None
+        self.start_elevation: float | None = None
+        self.end_elevation: float | None = None
+        self.start_ascent: float | None = None
+        self.end_ascent: float | None = None
+        self.start_descent: float | None = None
+        self.end_descent: float | None = None
+
+        self.start_latitude: float | None = None
+        self.start_longitude: float | None = None
+        self.end_latitude: float | None = None
+        self.end_longitude: float | None = None
+        self.minlat: float | None = None
+        self.minlon: float | None = None
+        self.maxlat: float | None = None
+        self.maxlon: float | None = None
+
+        self.total_ascent: float = 0.0
+        self.total_descent: float = 0.0
+        self.time_ascending: timedelta = timedelta(0)
+        self.last_ts: datetime | None = None
+        self.last_elevation: float | None = None
+
+        self.max_grade: float | None = None
+        self.min_grade: float | None = None
+        self.max_elevation: float | None = None
+        self.min_elevation: float | None = None
+        self.max_speed: float | None = None
+
+        self.power_samples: int = 0
+        self.total_power: float = 0.0 # power integrated over time
+        self.total_power_time: float = 0.0
+        self.max_power: float | None = None
+        self.power30s_4th = _ExactMean() # 4th powers of power30s for normalized power
+
+        self.heart_rate = _ExactMean()
+        self.max_heart_rate: float | None = None
+        self.cadence = _ExactMean()
+        self.max_cadence: float | None = None
+
+
+    def add(self, ts: datetime, timer: Value | None, distance: Value | None, elevation: Value | None,
+            ascent: Value | None, descent: Value | None, latitude: Value | None, longitude: Value | None,
+            smooth_elevation: Value | None, grade: Value | None, speed: Value | None, power: Value | None,
+            power30s: Value | None, heart_rate: Value | None, cadence: Value | None) -> None:
+        if isinstance(timer, (int, float)):
+            if self.start_timer is None:
+                self.start_timer = timer
+            self.end_timer = timer
+
+        if isinstance(distance, (int, float)):
+            if self.start_distance is None:
+                self.start_distance = distance
+            self.end_distance = distance
+
+        if isinstance(elevation, (int, float)):
+            if self.start_elevation is None:
+                self.start_elevation = elevation
+            self.end_elevation = elevation
+
+            if self.max_elevation is None or elevation > self.max_elevation:
+                self.max_elevation = elevation
+            if self.min_elevation is None or elevation < self.min_elevation:
+                self.min_elevation = elevation
+
+        if isinstance(ascent, (int, float)):
+            if self.start_ascent is None:
+                self.start_ascent = ascent
+            self.end_ascent = ascent
+
+        if isinstance(descent, (int, float)):
+            if self.start_descent is None:
+                self.start_descent = descent
+            self.end_descent = descent
+
+        if isinstance(latitude, (int, float)) and isinstance(longitude, (int, float)):
+            if self.start_latitude is None and self.start_longitude is None:
+                self.start_latitude = latitude
+                self.start_longitude = longitude
+            self.end_latitude = latitude
+            self.end_longitude = longitude
+
+            if self.minlat is None or latitude < self.minlat:
+                self.minlat = latitude
+            if self.maxlat is None or latitude > self.maxlat:
+                self.maxlat = latitude
+            if self.minlon is None or longitude < self.minlon:
+                self.minlon = longitude
+            if self.maxlon is None or longitude > self.maxlon:
+                self.maxlon = longitude
+
+        last_ts = self.last_ts
+        if isinstance(smooth_elevation, (int, float)):
+            if isinstance(distance, (int, float)) and self.last_elevation is not None and last_ts is not None:
+                delta_elev = smooth_elevation - self.last_elevation
+
+                if delta_elev > 0:
+                    # ascending
+                    self.total_ascent += delta_elev
+                    self.time_ascending += ts - last_ts
+                elif delta_elev < 0:
+                    self.total_descent += abs(delta_elev)
+            self.last_elevation = smooth_elevation
+
+        if isinstance(grade, (int, float)):
+            if self.max_grade is None or grade > self.max_grade:
+                self.max_grade = grade
+            if self.min_grade is None or grade < self.min_grade:
+                self.min_grade = grade
+
+        if isinstance(speed, (int, float)):
+            if self.max_speed is None or speed > self.max_speed:
+                self.max_speed = speed
+
+        if _finite(power): # NaN and infinite samples are skipped in segment averages
+            dt = (ts - last_ts).total_seconds() if last_ts else timedelta(0).total_seconds()
+            self.power_samples += 1
+            self.total_power += power * dt
+            self.total_power_time += dt
+            if self.max_power is None or power > self.max_power:
+                self.max_power = power
+
+        if ts - self.start_ts >= timedelta(seconds=30) and _finite(power30s):
+            self.power30s_4th.add(power30s**4)
+
+        if _finite(heart_rate):
+            self.heart_rate.add(heart_rate)
+            if self.max_heart_rate is None or heart_rate > self.max_heart_rate:
+                self.max_heart_rate = heart_rate
+
+        if _finite(cadence):
+            self.cadence.add(cadence)
+            if self.max_cadence is None or cadence > self.max_cadence:
+                self.max_cadence = cadence
+
+        self.last_ts = ts
+
+
 def _calculate_segments(track: Track) -> Track:
-    """Calculate missing segments metadata"""
+    """Calculate missing segments metadata.
+
+    Points are walked once: segments are opened in start_time order and closed by
+    end_time with a heap, every point updates the aggregates of all segments open at
+    its timestamp (overlapping laps and climbs included), O(n + s) for non-overlapping
+    segments.
+    """
 
     logger.debug("Calculating segments")
 
+    segments: list[tuple[int, dict[str, Value], _SegmentAggregate]] = []
     for n,(_,segment) in enumerate(track.segments_iter):
-        logger.debug(f"Calculating segment {n}...")
-
         start_ts = segment.get('start_time')
         end_ts = segment.get('end_time')
         if not isinstance(start_ts, datetime) or not isinstance(end_ts, datetime):
             logger.warning(f"Segment {n} missing start_time or end_time. Skipping segment calculation.")
             continue
+        segments.append((n, segment, _SegmentAggregate(start_ts, end_ts)))
 
-        # Initialize calculated fields
-        start_timer: float | None = None
-        end_timer: float | None = None
-
-        start_distance: float | None = None
-        end_distance: float | None = None
-
-        start_elevation: float | None = None
-        end_elevation: float | None = None
-
-        start_ascent: float | None = None
-        end_ascent: float | None = None
-        start_descent: float | None = None
-        end_descent: float | None = None
-
-        start_latitude: float | None = None
-        start_longitude: float | None = None
-        end_latitude: float | None = None
-        end_longitude: float | None = None
-
-        minlat: float | None = None
-        minlon: float | None = None
-        maxlat: float | None = None
-        maxlon: float | None = None
+    pending = sorted(range(len(segments)), key=lambda i: segments[i][2].start_ts)
+    next_pending = 0
+    closing: list[tuple[datetime, int]] = [] # heap of (end_time, segment index)
+    active: dict[int, _SegmentAggregate] = {}
 
-        total_ascent: float = 0.0
-        total_descent: float = 0.0
-        time_ascending: timedelta = timedelta(0)
-
-        last_ts: datetime | None = None
-        last_elevation: float | None = None
-
-        max_grade = None
-        min_grade = None
+    if segments:
+        for ts, point in track.points_iter:
+            while next_pending < len(pending) and segments[pending[next_pending]][2].start_ts <= ts:
+                i = pending[next_pending]
+                heapq.heappush(closing, (segments[i][2].end_ts, i))
+                active[i] = segments[i][2]
+                next_pending += 1
+            while closing and closing[0][0] < ts:
+                del active[heapq.heappop(closing)[1]]
+
+            if not active:
+                if next_pending == len(pending):
+                    break
+                continue
 
-        max_elevation = None
-        min_elevation = None
+            fields = (point.get('timer'), point.get('distance'), point.get('elevation'),
+                      point.get('cumulative_ascent'), point.get('cumulative_descent'),
+                      point.get('latitude'), point.get('longitude'), point.get('smooth_elevation'),
+                      point.get('grade'), point.get('speed'), point.get('power'), point.get('power30s'),
+                      point.get('heart_rate'), point.get('cadence'))
+            for aggregate in active.values():
+                aggregate.add(ts, *fields)
 
-        max_speed = None
+    for n, segment, aggregate in segments:
+        logger.debug(f"Calculating segment {n}...")
+        _set_segment_fields(n, segment, aggregate)
 
-        power_time_lst: list[tuple[float, timedelta]] = []
-        max_power = None
-        power30s_lst = []
+    return track
 
-        cadences = []
-        heart_rates = []
 
-        for ts, point in track.points_iter:
-            if ts < start_ts:
-                continue
-            if ts > end_ts:
-                break
-
-            # Collect data for segment
-            timer = point.get('timer')
-            if isinstance(timer, (int, float)):
-                if start_timer is None:
-                    start_timer = timer
-                end_timer = timer
-
-            distance = point.get('distance')
-            if isinstance(distance, (int, float)):
-                if start_distance is None:
-                    start_distance = distance
-                end_distance = distance
-            
-            elevation = point.get('elevation')
-            if isinstance(elevation, (int, float)):
-                if start_elevation is None:
-                    start_elevation = elevation
-                end_elevation = elevation
-
-            ascent = point.get('cumulative_ascent')
-            if isinstance(ascent, (int, float)):
-                if start_ascent is None:
-                    start_ascent = ascent
-                end_ascent = ascent
-            
-            descent = point.get('cumulative_descent')
-            if isinstance(descent, (int, float)):
-                if start_descent is None:
-                    start_descent = descent
-                end_descent = descent
-
-            latitude = point.get('latitude')
-            longitude = point.get('longitude')
-            if isinstance(latitude, (int, float)) and isinstance(longitude, (int, float)):
-                if start_latitude is None and start_longitude is None:
-                    start_latitude = latitude
-                    start_longitude = longitude
-                end_latitude = latitude
-                end_longitude = longitude
-
-                if minlat is None or latitude < minlat:
-                    minlat = latitude
-                if maxlat is None or latitude > maxlat:
-                    maxlat = latitude
-                if minlon is None or longitude < minlon:
-                    minlon = longitude
-                if maxlon is None or longitude > maxlon:
-                    maxlon = longitude
-
-            smooth_elevation = point.get('smooth_elevation')
-            if isinstance(smooth_elevation, (int, float)) and isinstance(distance, (int, float)):
-                if last_elevation is not None and last_ts is not None:
-                    delta_elev = smooth_elevation - last_elevation
-
-                    if delta_elev > 0:
-                        # ascending
-                        total_ascent += delta_elev
-                        time_ascending += ((ts - last_ts) if last_ts else timedelta(0))
-                    elif delta_elev < 0:
-                        total_descent += abs(delta_elev)
-
-            grade = point.get('grade')
-            if isinstance(grade, (int, float)):
-                if max_grade is None or grade > max_grade:
-                    max_grade = grade
-                if min_grade is None or grade < min_grade:
-                    min_grade = grade
-
-            elevation = point.get('elevation')
-            if isinstance(elevation, (int, float)):
-                if max_elevation is None or elevation > max_elevation:
-                    max_elevation = elevation
-                if min_elevation is None or elevation < min_elevation:
-                    min_elevation = elevation
-
-            speed = point.get('speed')
-            if isinstance(speed, (int, float)):
-                if max_speed is None or speed > max_speed:
-                    max_speed = speed
-
-            power = point.get('power')
-            if isinstance(power, (int, float)):
-                power_time_lst.append((power, (ts-last_ts) if last_ts else timedelta(0)))
-                if max_power is None or power > max_power:
-                    max_power = power
-
-            power30s = point.get('power30s')
-            if ts-start_ts >= timedelta(seconds=30) and isinstance(power30s, (int, float)):
-                power30s_lst.append(power30s)
-
-            heart_rate = point.get('heart_rate')
-            if isinstance(heart_rate, (int, float)):
-                heart_rates.append(heart_rate)
-
-            cadence = point.get('cadence')
-            if isinstance(cadence, (int, float)):
-                cadences.append(cadence)
-
-            last_ts = ts
-            last_elevation = smooth_elevation if isinstance(smooth_elevation, (int, float)) else last_elevation
-
-        # Set calculated segment fields if not already present
-        if isinstance(start_timer, (int, float)) and 'start_timer' not in segment:
-            segment['start_timer'] = start_timer
-            logger.trace(f"Segment {n}: start_timer set to {start_timer} seconds")
-        if isinstance(end_timer, (int, float)) and 'end_timer' not in segment:
-            segment['end_timer'] = end_timer
-            logger.trace(f"Segment {n}: end_timer set to {end_timer} seconds")
-        if isinstance(start_timer, (int, float)) and isinstance(end_timer, (int,float)) and 'total_elapsed_time' not in segment:
-            segment['total_elapsed_time'] = end_timer - start_timer
-            logger.trace(f"Segment {n}: total_elapsed_time set to {segment['total_elapsed_time']} seconds")
-
-        if isinstance(start_distance, (int, float)) and 'start_distance' not in segment:
-            segment['start_distance'] = start_distance
-            logger.trace(f"Segment {n}: start_distance set to {start_distance} meters")
-        if isinstance(end_distance, (int, float)) and 'end_distance' not in segment:
-            segment['end_distance'] = end_distance
-            logger.trace(f"Segment {n}: end_distance set to {end_distance} meters")
-        if isinstance(start_distance, (int, float)) and isinstance(end_distance, (int, float)) and 'total_distance' not in segment:
-            segment['total_distance'] = end_distance - start_distance
-            logger.trace(f"Segment {n}: total_distance set to {segment['total_distance']} meters")
-
-        if isinstance(start_elevation, (int, float)) and 'start_elevation' not in segment:
-            segment['start_elevation'] = start_elevation
-            logger.trace(f"Segment {n}: start_elevation set to {start_elevation} meters")
-        if isinstance(end_elevation, (int, float)) and 'end_elevation' not in segment:
-            segment['end_elevation'] = end_elevation
-            logger.trace(f"Segment {n}: end_elevation set to {end_elevation} meters")
-
-        if isinstance(start_ascent, (int, float)) and 'start_ascent' not in segment:
-            segment['start_ascent'] = start_ascent
-            logger.trace(f"Segment {n}: start_ascent set to {start_ascent} meters")
-        if isinstance(end_ascent, (int, float)) and 'end_ascent' not in segment:
-            segment['end_ascent'] = end_ascent
-            logger.trace(f"Segment {n}: end_ascent set to {end_ascent} meters")
-        if isinstance(start_descent, (int, float)) and 'start_descent' not in segment:
-            segment['start_descent'] = start_descent
-            logger.trace(f"Segment {n}: start_descent set to {start_descent} meters")
-        if isinstance(end_descent, (int, float)) and 'end_descent' not in segment:
-            segment['end_descent'] = end_descent
-            logger.trace(f"Segment {n}: end_descent set to {end_descent} meters")
-
-        if (isinstance(start_latitude, (int, float)) and isinstance(start_longitude, (int, float)) and
-            'start_latitude' not in segment and 'start_longitude' not in segment):
-            segment['start_latitude'] = start_latitude
-            segment['start_longitude'] = start_longitude
-            logger.trace(f"Segment {n}: start_latitude set to {start_latitude}, start_longitude set to {start_longitude}")
-        if (isinstance(end_latitude, (int, float)) and isinstance(end_longitude, (int, float)) and
-            'end_latitude' not in segment and 'end_longitude' not in segment):
-            segment['end_latitude'] = end_latitude
-            segment['end_longitude'] = end_longitude
-            logger.trace(f"Segment {n}: end_latitude set to {end_latitude}, end_longitude set to {end_longitude}")
-
-        if (isinstance(minlat, (int, float)) and isinstance(minlon, (int, float)) and
-            isinstance(maxlat, (int, float)) and isinstance(maxlon, (int, float)) and
-            'minlat' not in segment and 'minlon' not in segment and
-            'maxlat' not in segment and 'maxlon' not in segment):
-            segment['minlat'] = minlat
-            segment['minlon'] = minlon
-            segment['maxlat'] = maxlat
-            segment['maxlon'] = maxlon
-            logger.trace(f"Segment {n}: minlat set to {minlat}, minlon set to {minlon}, maxlat set to {maxlat}, maxlon set to {maxlon}")
+def _set_segment_fields(n: int, segment: dict[str, Value], agg: _SegmentAggregate) -> None:
+    """Set calculated segment fields if not already present."""
+
+    if isinstance(agg.start_timer, (int, float)) and 'start_timer' not in segment:
+        segment['start_timer'] = agg.start_timer
+        logger.trace(f"Segment {n}: start_timer set to {agg.start_timer} seconds")
+    if isinstance(agg.end_timer, (int, float)) and 'end_timer' not in segment:
+        segment['end_timer'] = agg.end_timer
+        logger.trace(f"Segment {n}: end_timer set to {agg.end_timer} seconds")
+    if isinstance(agg.start_timer, (int, float)) and isinstance(agg.end_timer, (int,float)) and 'total_elapsed_time' not in segment:
+        segment['total_elapsed_time'] = agg.end_timer - agg.start_timer
+        logger.trace(f"Segment {n}: total_elapsed_time set to {segment['total_elapsed_time']} seconds")
+
+    if isinstance(agg.start_distance, (int, float)) and 'start_distance' not in segment:
+        segment['start_distance'] = agg.start_distance
+        logger.trace(f"Segment {n}: start_distance set to {agg.start_distance} meters")
+    if isinstance(agg.end_distance, (int, float)) and 'end_distance' not in segment:
+        segment['end_distance'] = agg.end_distance
+        logger.trace(f"Segment {n}: end_distance set to {agg.end_distance} meters")
+    if isinstance(agg.start_distance, (int, float)) and isinstance(agg.end_distance, (int, float)) and 'total_distance' not in segment:
+        segment['total_distance'] = agg.end_distance - agg.start_distance
+        logger.trace(f"Segment {n}: total_distance set to {segment['total_distance']} meters")
+
+    if isinstance(agg.start_elevation, (int, float)) and 'start_elevation' not in segment:
+        segment['start_elevation'] = agg.start_elevation
+        logger.trace(f"Segment {n}: start_elevation set to {agg.start_elevation} meters")
+    if isinstance(agg.end_elevation, (int, float)) and 'end_elevation' not in segment:
+        segment['end_elevation'] = agg.end_elevation
+        logger.trace(f"Segment {n}: end_elevation set to {agg.end_elevation} meters")
+
+    if isinstance(agg.start_ascent, (int, float)) and 'start_ascent' not in segment:
+        segment['start_ascent'] = agg.start_ascent
+        logger.trace(f"Segment {n}: start_ascent set to {agg.start_ascent} meters")
+    if isinstance(agg.end_ascent, (int, float)) and 'end_ascent' not in segment:
+        segment['end_ascent'] = agg.end_ascent
+        logger.trace(f"Segment {n}: end_ascent set to {agg.end_ascent} meters")
+    if isinstance(agg.start_descent, (int, float)) and 'start_descent' not in segment:
+        segment['start_descent'] = agg.start_descent
+        logger.trace(f"Segment {n}: start_descent set to {agg.start_descent} meters")
+    if isinstance(agg.end_descent, (int, float)) and 'end_descent' not in segment:
+        segment['end_descent'] = agg.end_descent
+        logger.trace(f"Segment {n}: end_descent set to {agg.end_descent} meters")
+
+    if (isinstance(agg.start_latitude, (int, float)) and isinstance(agg.start_longitude, (int, float)) and
+        'start_latitude' not in segment and 'start_longitude' not in segment):
+        segment['start_latitude'] = agg.start_latitude
+        segment['start_longitude'] = agg.start_longitude
+        logger.trace(f"Segment {n}: start_latitude set to {agg.start_latitude}, start_longitude set to {agg.start_longitude}")
+    if (isinstance(agg.end_latitude, (int, float)) and isinstance(agg.end_longitude, (int, float)) and
+        'end_latitude' not in segment and 'end_longitude' not in segment):
+        segment['end_latitude'] = agg.end_latitude
+        segment['end_longitude'] = agg.end_longitude
+        logger.trace(f"Segment {n}: end_latitude set to {agg.end_latitude}, end_longitude set to {agg.end_longitude}")
+
+    if (isinstance(agg.minlat, (int, float)) and isinstance(agg.minlon, (int, float)) and
+        isinstance(agg.maxlat, (int, float)) and isinstance(agg.maxlon, (int, float)) and
+        'minlat' not in segment and 'minlon' not in segment and
+        'maxlat' not in segment and 'maxlon' not in segment):
+        segment['minlat'] = agg.minlat
+        segment['minlon'] = agg.minlon
+        segment['maxlat'] = agg.maxlat
+        segment['maxlon'] = agg.maxlon
+        logger.trace(f"Segment {n}: minlat set to {agg.minlat}, minlon set to {agg.minlon}, maxlat set to {agg.maxlat}, maxlon set to {agg.maxlon}")
+    
+    if 'total_ascent' not in segment:
+        segment['total_ascent'] = agg.total_ascent
+        logger.trace(f"Segment {n}: total_ascent set to {agg.total_ascent} meters")
+    if 'total_descent' not in segment:
+        segment['total_descent'] = agg.total_descent
+        logger.trace(f"Segment {n}: total_descent set to {agg.total_descent} meters")
+
+    avg_vam = (agg.total_ascent / agg.time_ascending.total_seconds()) if agg.time_ascending.total_seconds() > 0 else None
+    if avg_vam is not None and 'avg_vam' not in segment:
+        segment['avg_vam'] = avg_vam
+        logger.trace(f"Segment {n}: avg_vam set to {avg_vam} m/s")
+
+    if isinstance(agg.max_grade, (int, float)) and 'max_grade' not in segment:
+        segment['max_grade'] = agg.max_grade
+        logger.trace(f"Segment {n}: max_grade set to {agg.max_grade} %")
+    if isinstance(agg.min_grade, (int, float)) and 'min_grade' not in segment:
+        segment['min_grade'] = agg.min_grade
+        logger.trace(f"Segment {n}: min_grade set to {agg.min_grade} %")
+
+    if isinstance(agg.max_elevation, (int, float)) and 'max_elevation' not in segment:
+        segment['max_elevation'] = agg.max_elevation
+        logger.trace(f"Segment {n}: max_elevation set to {agg.max_elevation} meters")
+    if isinstance(agg.min_elevation, (int, float)) and 'min_elevation' not in segment:
+        segment['min_elevation'] = agg.min_elevation
+        logger.trace(f"Segment {n}: min_elevation set to {agg.min_elevation} meters")
+
+    if isinstance(agg.start_distance, (int, float)) and isinstance(agg.end_distance, (int, float)) and \
+       isinstance(agg.start_elevation, (int, float)) and isinstance(agg.end_elevation, (int, float)) and \
+       'grade' not in segment:
+        dst = agg.end_distance - agg.start_distance
+        elev = agg.end_elevation - agg.start_elevation
+        x = math.sqrt(dst**2 - elev**2) # pythagoras (x**2 + y**2 = z**2 where z is distance delta and y is altitude delta)
         
-        if 'total_ascent' not in segment:
-            segment['total_ascent'] = total_ascent
-            logger.trace(f"Segment {n}: total_ascent set to {total_ascent} meters")
-        if 'total_descent' not in segment:
-            segment['total_descent'] = total_descent
-            logger.trace(f"Segment {n}: total_descent set to {total_descent} meters")
-
-        avg_vam = (total_ascent / time_ascending.total_seconds()) if time_ascending.total_seconds() > 0 else None
-        if avg_vam is not None and 'avg_vam' not in segment:
-            segment['avg_vam'] = avg_vam
-            logger.trace(f"Segment {n}: avg_vam set to {avg_vam} m/s")
-
-        if isinstance(max_grade, (int, float)) and 'max_grade' not in segment:
-            segment['max_grade'] = max_grade
-            logger.trace(f"Segment {n}: max_grade set to {max_grade} %")
-        if isinstance(min_grade, (int, float)) and 'min_grade' not in segment:
-            segment['min_grade'] = min_grade
-            logger.trace(f"Segment {n}: min_grade set to {min_grade} %")
-
-        if isinstance(max_elevation, (int, float)) and 'max_elevation' not in segment:
-            segment['max_elevation'] = max_elevation
-            logger.trace(f"Segment {n}: max_elevation set to {max_elevation} meters")
-        if isinstance(min_elevation, (int, float)) and 'min_elevation' not in segment:
-            segment['min_elevation'] = min_elevation
-            logger.trace(f"Segment {n}: min_elevation set to {min_elevation} meters")
-
-        if isinstance(start_distance, (int, float)) and isinstance(end_distance, (int, float)) and \
-           isinstance(start_elevation, (int, float)) and isinstance(end_elevation, (int, float)) and \
-           'grade' not in segment:
-            dst = end_distance - start_distance
-            elev = end_elevation - start_elevation
-            x = math.sqrt(dst**2 - elev**2) # pythagoras (x**2 + y**2 = z**2 where z is distance delta and y is altitude delta)
-            
-            grade = (elev / x) * 100.0 if x > 0 else 0.0
-            segment['avg_grade'] = grade
-            logger.trace(f"Segment {n}: avg_grade set to {grade} %")
-
-        if isinstance(max_speed, (int, float)) and 'max_speed' not in segment:
-            segment['max_speed'] = max_speed
-            logger.trace(f"Segment {n}: max_speed set to {max_speed} m/s")
-
-        if isinstance(start_timer, (int, float)) and isinstance(end_timer, (int, float)) and \
-           isinstance(start_distance, (int, float)) and isinstance(end_distance, (int, float)) and \
-           'avg_speed' not in segment:
-            time_delta = end_timer - start_timer
-            distance_delta = end_distance - start_distance
-            avg_speed = (distance_delta / time_delta) if time_delta > 0 else 0.0
-            segment['avg_speed'] = avg_speed
-            logger.trace(f"Segment {n}: avg_speed set to {avg_speed} m/s")
-
-        if power_time_lst and 'avg_power' not in segment:
-            total_power = sum(p * (dt.total_seconds()) for p,dt in power_time_lst)
-            total_time = sum(dt.total_seconds() for _,dt in power_time_lst)
-            avg_power = (total_power / total_time) if total_time > 0 else 0.0
-            segment['avg_power'] = avg_power
-            logger.trace(f"Segment {n}: avg_power set to {avg_power} watts")
-
-        if isinstance(max_power, (int, float)) and 'max_power' not in segment:
-            segment['max_power'] = max_power
-            logger.trace(f"Segment {n}: max_power set to {max_power} watts")
-
-        if power30s_lst and 'normalized_power' not in segment:
-            normalized_power = statistics.mean([p**4 for p in power30s_lst]) ** (1/4)
-            segment['normalized_power'] = normalized_power
-            logger.trace(f"Segment {n}: normalized_power set to {normalized_power} watts")
-
-        if heart_rates:
-            if 'avg_heart_rate' not in segment:
-                avg_heart_rate = statistics.mean(heart_rates)
-                segment['avg_heart_rate'] = avg_heart_rate
-                logger.trace(f"Segment {n}: avg_heart_rate set to {avg_heart_rate} bpm")
-            if 'max_heart_rate' not in segment:
-                max_heart_rate = max(heart_rates)
-                segment['max_heart_rate'] = max_heart_rate
-                logger.trace(f"Segment {n}: max_heart_rate set to {max_heart_rate} bpm")
-
-        if cadences:
-            if 'avg_cadence' not in segment:
-                avg_cadence = round(statistics.mean(cadences))
-                segment['avg_cadence'] = avg_cadence
-                logger.trace(f"Segment {n}: avg_cadence set to {avg_cadence} rpm")
-            if 'max_cadence' not in segment:
-                max_cadence = max(cadences)
-                segment['max_cadence'] = max_cadence
-                logger.trace(f"Segment {n}: max_cadence set to {max_cadence} rpm")
-
-    return track
+        grade = (elev / x) * 100.0 if x > 0 else 0.0
+        segment['avg_grade'] = grade
+        logger.trace(f"Segment {n}: avg_grade set to {grade} %")
+
+    if isinstance(agg.max_speed, (int, float)) and 'max_speed' not in segment:
+        segment['max_speed'] = agg.max_speed
+        logger.trace(f"Segment {n}: max_speed set to {agg.max_speed} m/s")
+
+    if isinstance(agg.start_timer, (int, float)) and isinstance(agg.end_timer, (int, float)) and \
+       isinstance(agg.start_distance, (int, float)) and isinstance(agg.end_distance, (int, float)) and \
+       'avg_speed' not in segment:
+        time_delta = agg.end_timer - agg.start_timer
+        distance_delta = agg.end_distance - agg.start_distance
+        avg_speed = (distance_delta / time_delta) if time_delta > 0 else 0.0
+        segment['avg_speed'] = avg_speed
+        logger.trace(f"Segment {n}: avg_speed set to {avg_speed} m/s")
+
+    if agg.power_samples and 'avg_power' not in segment:
+        total_power = agg.total_power
+        total_time = agg.total_power_time
+        avg_power = (total_power / total_time) if total_time > 0 else 0.0
+        segment['avg_power'] = avg_power
+        logger.trace(f"Segment {n}: avg_power set to {avg_power} watts")
+
+    if isinstance(agg.max_power, (int, float)) and 'max_power' not in segment:
+        segment['max_power'] = agg.max_power
+        logger.trace(f"Segment {n}: max_power set to {agg.max_power} watts")
+
+    mean_power_4th = agg.power30s_4th.mean()
+    if mean_power_4th is not None and 'normalized_power' not in segment:
+        normalized_power = mean_power_4th ** (1/4)
+        segment['normalized_power'] = normalized_power
+        logger.trace(f"Segment {n}: normalized_power set to {normalized_power} watts")
+
+    avg_heart_rate = agg.heart_rate.mean()
+    if avg_heart_rate is not None:
+        if 'avg_heart_rate' not in segment:
+            segment['avg_heart_rate'] = avg_heart_rate
+            logger.trace(f"Segment {n}: avg_heart_rate set to {avg_heart_rate} bpm")
+        if 'max_heart_rate' not in segment and agg.max_heart_rate is not None:
+            max_heart_rate = agg.max_heart_rate
+            segment['max_heart_rate'] = max_heart_rate
+            logger.trace(f"Segment {n}: max_heart_rate set to {max_heart_rate} bpm")
+
+    mean_cadence = agg.cadence.mean()
+    if mean_cadence is not None:
+        if 'avg_cadence' not in segment:
+            avg_cadence = round(mean_cadence)
+            segment['avg_cadence'] = avg_cadence
+            logger.trace(f"Segment {n}: avg_cadence set to {avg_cadence} rpm")
+        if 'max_cadence' not in segment and agg.max_cadence is not None:
+            max_cadence = agg.max_cadence
+            segment['max_cadence'] = max_cadence
+            logger.trace(f"Segment {n}: max_cadence set to {max_cadence} rpm")
+
+
+TimeRange = tuple[datetime | None, datetime | None] # inclusive, a missing bound is open
+
+
+def _union(ranges: list[TimeRange]) -> TimeRange:
+    starts = [start for start, _ in ranges]
+    ends = [end for _, end in ranges]
+    return (None if None in starts else min(starts), # type: ignore[type-var]
+            None if None in ends else max(ends)) # type: ignore[type-var]
+
+
+def _overlaps(time_range: TimeRange, start: datetime, end: datetime) -> bool:
+    return (time_range[0] is None or time_range[0] <= end) and (time_range[1] is None or time_range[1] >= start)
+
+
+def _expand_range(track: Track, stage: Stage, time_range: TimeRange, window: float | None,
+                  dirty_fields: Mapping[str, TimeRange]) -> TimeRange:
+    """Range of points whose `stage` results can change when its inputs changed within `time_range`."""
+    start, end = time_range
+    match stage.span:
+        case Span.CUMULATIVE:
+            return start, None
+        case Span.PREVIOUS:
+            if end is None:
+                return start, None
+            keys = [key for key in stage.reads if key in point_fields]
+            for ts, point in track.range_iter(end):
+                if ts > end and all(isinstance(point.get(key), (int, float)) for key in keys):
+                    return start, ts
+            return start, None
+        case Span.TIME:
+            return start, (end + timedelta(seconds=window or 0) if end is not None else None)
+        case Span.DISTANCE:
+            if 'distance' in dirty_fields or window is None:
+                return None, None # windows themselves moved
+            distances = [d for _, point in track.range_iter(start, end) if isinstance(d := point.get('distance'), (int, float))]
+            if not distances:
+                return start, end
+            lo = min(distances) - window / 2.0
+            hi = max(distances) + window / 2.0
+            affected = [ts for ts, point in track.points_iter if isinstance(d := point.get('distance'), (int, float)) and lo <= d <= hi]
+            return (None if start is None else min(start, affected[0]),
+                    None if end is None else max(end, affected[-1]))
+    return start, end
+
+
+def _invalidate(track: Track, stages: tuple[Stage, ...], params: set[str], windows: Mapping[str, float]) -> set[str]:
+    """Remove data derived from the dirty fields of the track and changed calculation `params`.
+
+    Dirty time ranges are propagated through the stages in pipeline order, every stage
+    widening the range by its span, and only the results of points within the range are
+    removed. Returns names of the stages that have to be recalculated.
+    """
+
+    dirty_fields: dict[str, TimeRange] = {key: r for key, r in track.dirty.items() if key in point_fields}
+    dirty_metadata: set[str] = {key for key in track.dirty if key not in point_fields}
+    changed = set(dirty_fields) # changed input values are kept, only derived values are removed
+
+    stale: set[str] = set()
+    for stage in stages:
+        ranges = [dirty_fields[key] for key in stage.reads if key in dirty_fields]
+        if stage.param is not None and stage.param in params:
+            ranges.append((None, None))
+        if not ranges and not stage.reads & dirty_metadata:
+            continue
 
+        stale.add(stage.name)
+        track.remove_metadata(list(stage.metadata))
+        dirty_metadata |= stage.metadata
+        if not ranges:
+            logger.debug(f"Invalidated {stage.name} metadata.")
+            continue # only metadata the stage depends on changed
+
+        start, end = _expand_range(track, stage, _union(ranges), windows.get(stage.name), dirty_fields)
+        logger.debug(f"Invalidated {stage.name} between {to_string(start) if start else 'track start'} and {to_string(end) if end else 'track end'}.")
+
+        fields = stage.fields - changed
+        for _, point in track.range_iter(start, end):
+            for key in fields:
+                if key in point:
+                    del point[key]
+        for key in fields:
+            dirty_fields[key] = _union([dirty_fields[key], (start, end)]) if key in dirty_fields else (start, end)
+
+        for _, segment in track.segments if stage.segment_fields else ():
+            seg_start = segment.get('start_time')
+            seg_end = segment.get('end_time')
+            if not isinstance(seg_start, datetime) or not isinstance(seg_end, datetime):
+                continue
+            for key, sources in stage.segment_fields.items():
+                if key in segment and any(src in dirty_fields and _overlaps(dirty_fields[src], seg_start, seg_end) for src in sources):
+                    del segment[key]
+
+    return stale
+
+
+def _required_stages(stages: tuple[Stage, ...], names: set[str]) -> set[str]:
+    """Names of the given stages together with all stages producing data they read."""
+    required = set(names)
+    for i in range(len(stages) - 1, -1, -1):
+        stage = stages[i]
+        if stage.name in required:
+            required.update(dep.name for dep in stages[:i] if stage.reads & (dep.fields | dep.metadata))
+    return required
+
+
+def _resolve_fields(stages: tuple[Stage, ...], fields: Iterable[str]) -> set[str]:
+    """Names of the stages calculating requested point fields or metadata ('segments' for segment data)."""
+    names: set[str] = set()
+    for key in fields:
+        producers = {stage.name for stage in stages if key in stage.fields or key in stage.metadata or key == stage.name == 'segments'}
+        if not producers:
+            logger.warning(f"Field '{key}' is not calculated. Skipping.")
+        names |= producers
+    return names
+
+
+def calculate_additional_data(track: Track, elevation_smoothing_window: int, grade_calculation_window: int,
+                              engine: Engine = Engine.PYTHON, power_windows: Mapping[str, float] | None = None,
+                              fields: Iterable[str] | None = None) -> Track:
+    """Calculate derived point fields, metadata and segment data.
+
+    Only stages needed for the requested `fields` (point fields, metadata or 'segments', all
+    by default) are run. Calculation windows are recorded in track metadata once every stage
+    has run - a track calculated before is only recalculated where its dirty fields (see
+    Track.mark_dirty) or changed windows have an effect, other stages are skipped.
+    """
+    power_windows = POWER_AVERAGE_WINDOWS if power_windows is None else {**POWER_AVERAGE_WINDOWS, **power_windows}
+
+    if engine == Engine.NUMPY:
+        try:
+            from . import vectorized
+        except ImportError:
+            logger.warning("NumPy is not available, falling back to python calculation engine.")
+            engine = Engine.PYTHON
+
+    stages = tuple(replace(stage, fields=frozenset(power_windows)) if stage.name == 'power_averages' else stage for stage in STAGES)
+    params: dict[str, float] = {'elevation_smoothing_window': elevation_smoothing_window,
+                                'grade_calculation_window': grade_calculation_window}
+    windows: dict[str, float] = {'elevation': elevation_smoothing_window, 'grade': grade_calculation_window,
+                                 'power_averages': max(power_windows.values(), default=0)}
+
+    recorded = {key: track.metadata.get(key) for key in params}
+    changed = {key for key, value in recorded.items() if value is not None and value != params[key]}
+    for key in changed:
+        logger.info(f"Calculation parameter {key} changed from {recorded[key]} to {params[key]}.")
+
+    stale = _invalidate(track, stages, changed, windows)
+    track.clear_dirty()
+
+    calculated = all(value is not None for value in recorded.values())
+    if calculated:
+        run = stale
+        if set(power_windows) - set(POWER_AVERAGE_WINDOWS):
+            run.add('power_averages') # not recorded, fills only missing fields
+        logger.info(f"Recalculating stages: {', '.join(stage.name for stage in stages if stage.name in run) or 'none'}.")
+    else:
+        requested = {stage.name for stage in stages} if fields is None else _resolve_fields(stages, fields)
+        run = _required_stages(stages, requested | stale) # invalidated data is always recalculated
+        logger.debug(f"Calculating stages: {', '.join(stage.name for stage in stages if stage.name in run) or 'none'}.")
+
+    if calculated or len(run) == len(stages):
+        for key, value in params.items():
+            track.set_metadata(key, value)
+
+    vectorized_stages = {'distances', 'speeds', 'vspeeds', 'elevation', 'grade', 'ascent_descent'}
+    arrays = None
+
+    if 'times' in run:
+        track = _calculate_times(track) # metadata: start_time, end_time, total_elapsed_time, fields: timer
+    if 'bounds' in run:
+        track = _calculate_bounds(track) # metadata: minlat, minlon, maxlat, maxlon
+
+    if engine == Engine.NUMPY and run & vectorized_stages:
+        arrays = vectorized.TrackArrays(track)
+
+    if 'distances' in run:
+        if arrays is not None:
+            vectorized.calculate_distances(arrays)
+        else:
+            track = _calculate_distances(track) # metadata: total_distance, total_track_distance, fields: distance, track_distance
+    if 'speeds' in run:
+        if arrays is not None:
+            vectorized.calculate_speeds(arrays)
+        else:
+            track = _calculate_speeds(track) # metadata: avg_speed, avg_track_speed, max_speed, max_track_speed, fields: speed, track_speed
+    if 'vspeeds' in run:
+        if arrays is not None:
+            vectorized.calculate_vspeeds(arrays)
+        else:
+            track = _calculate_vspeeds(track) # fields: vertical_speed
+    if 'power_averages' in run:
+        track = _calculate_power_averages(track, power_windows) # fields: power3s, power10s, power30s (+ power_windows)
+    if 'elevation' in run:
+        if arrays is not None:
+            vectorized.calculate_elevation(arrays, window_size=elevation_smoothing_window)
+        else:
+            track = _calculate_elevation(track, window_size=elevation_smoothing_window) # metadata: min_elevation, max_elevation, fields: smooth_elevation
+    if 'grade' in run:
+        if arrays is not None:
+            vectorized.calculate_grade(arrays, window_size=grade_calculation_window,
+                                       min_grade_window=MIN_GRADE_WINDOW * grade_calculation_window)
+        else:
+            track = _calculate_grade(track, window_size=grade_calculation_window) # metadata: max_grade, min_grade, fields: grade
+    if 'ascent_descent' in run:
+        if arrays is not None:
+            vectorized.calculate_ascent_descent(arrays)
+        else:
+            track = _calculate_ascent_descent(track) # metadata: total_ascent, total_descent, avg_vam, fields: cumulative_ascent, cumulative_descent
 
-def calculate_additional_data(track: Track, elevation_smoothing_window: int, grade_calculation_window: int) -> Track:
-    track = _calculate_times(track) # metadata: start_time, end_time, total_elapsed_time, fields: timer
-    track = _calculate_bounds(track) # metadata: minlat, minlon, maxlat, maxlon
-    track = _calculate_distances(track) # metadata: total_distance, total_track_distance, fields: distance, track_distance
-    track = _calculate_speeds(track) # metadata: avg_speed, avg_track_speed, max_speed, max_track_speed, fields: speed, track_speed
-    track = _calculate_vspeeds(track) # fields: vertical_speed
-    track = _calculate_power_averages(track) # fields: power3s, power10s, power30s
-    track = _calculate_elevation(track, window_size=elevation_smoothing_window) # fields: smooth_elevation, min_elevation, max_elevation
-    track = _calculate_grade(track, window_size=grade_calculation_window) # metadata: max_grade, min_grade, fields: grade
-    track = _calculate_ascent_descent(track) # metadata: total_ascent, total_descent, avg_vam
-    track = _calculate_misc(track) # metadata: jump_count
-    track = _calculate_segments(track) # segments
+    if 'misc' in run:
+        track = _calculate_misc(track) # metadata: jump_count
+    if 'segments' in run:
+        track = _calculate_segments(track) # segments
 
     return track
 
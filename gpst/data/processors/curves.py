@@ -0,0 +1,86 @@
+from itertools import accumulate
+from operator import sub
+
+from ..track import Track
+
+from ...utils.logger import logger
+
+
+CURVE_FIELDS = ('power', 'heart_rate', 'speed')
+CURVE_MAX_GAP = 10 # seconds a sample is held until the next one, longer gaps count as zero
+CURVE_DURATION_RATIO = 1.15 # spacing of the log-spaced duration grid
+
+
+def _durations(length: int) -> list[int]:
+    """Log-spaced durations from 1 s to `length` seconds (inclusive)."""
+    durations: list[int] = []
+    d = 1.0
+    while d < length:
+        if not durations or round(d) > durations[-1]:
+            durations.append(round(d))
+        d *= CURVE_DURATION_RATIO
+    if length > 0:
+        durations.append(length)
+    return durations
+
+
+def _resample(track: Track, key: str) -> list[float]:
+    """Resample numeric point field `key` to a 1 Hz series starting at the first track point."""
+    samples: list[tuple[int, float]] = []
+    start = None
+    for ts, point in track.points_iter:
+        if start is None:
+            start = ts
+        value = point.get(key)
+        if isinstance(value, (int, float)):
+            samples.append((int((ts - start).total_seconds()), float(value)))
+
+    if not samples:
+        return []
+
+    series = [0.0] * (samples[-1][0] + 1)
+    for (offset, value), (next_offset, _) in zip(samples, samples[1:]):
+        end = min(next_offset, offset + CURVE_MAX_GAP)
+        series[offset:end] = [value] * (end - offset)
+    offset, value = samples[-1]
+    series[offset] = value
+    return series
+
+
+def mean_maximal_curve(series: list[float], durations: list[int]) -> list[tuple[int, float]]:
+    """Best average of `series` over every duration, from one prefix-sum pass per duration."""
+    prefix = list(accumulate(series, initial=0.0))
+    curve: list[tuple[int, float]] = []
+    for d in durations:
+        if 0 < d <= len(series):
+            curve.append((d, max(map(sub, prefix[d:], prefix[:-d])) / d))
+    return curve
+
+
+def calculate_curves(track: Track, fields: tuple[str, ...] = CURVE_FIELDS, durations: list[int] | None = None) -> Track:
+    """Calculate mean-maximal curves (best average for each duration) of the given point fields.
+
+    Fields are resampled to 1 Hz and curves are computed over a log-spaced duration grid
+    from 1 s to the full track length (or the given durations), O(n log n) overall.
+    """
+
+    logger.debug("Calculating mean-maximal curves...")
+
+    for key in fields:
+        if key in track.curves:
+            logger.debug(f"Mean-maximal {key} curve already present. Skipping calculation.")
+            continue
+
+        series = _resample(track, key)
+        if not series:
+            logger.debug(f"No {key} data for mean-maximal curve.")
+            continue
+
+        curve = mean_maximal_curve(series, durations if durations is not None else _durations(len(series)))
+        if not curve:
+            logger.debug(f"Track too short for requested {key} curve durations.")
+            continue
+        track.set_curve(key, curve)
+        logger.info(f"Mean-maximal {key} curve calculated for {len(curve)} durations up to {curve[-1][0]} seconds.")
+
+    return track
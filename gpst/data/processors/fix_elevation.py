@@ -3,6 +3,7 @@ import matplotlib as mpl
 import matplotlib.pyplot as plt
 import rasterio # type: ignore[import-untyped]
 
+from datetime import datetime
 from matplotlib.typing import ColorType
 from pathlib import Path
 from rasterio.warp import transform # type: ignore[import-untyped]
@@ -22,6 +23,7 @@ class ElevationReference:
         self.known_crss.add(self.crs.to_string())
 
         self.dem_files = self._load_dem_files()
+        self._trace = logger.trace_enabled()
 
 
     def __del__(self) -> None:
@@ -50,17 +52,20 @@ class ElevationReference:
             x, y = coords[crs.to_string()]
             minx, miny, maxx, maxy = dem.bounds
             if not (minx <= x <= maxx and miny <= y <= maxy):
-                logger.trace(f"Coordinates ({x}, {y}) out of bounds for DEM file with bounds ({minx}, {miny}, {maxx}, {maxy}); skipping.")
+                if self._trace:
+                    logger.trace(f"Coordinates ({x}, {y}) out of bounds for DEM file with bounds ({minx}, {miny}, {maxx}, {maxy}); skipping.")
                 continue
 
             val = next(dem.sample([(x, y)]))[0]
 
             if dem.nodata is not None and val == dem.nodata:
-                logger.trace(f"Coordinates ({x}, {y}) in DEM file have no data value; skipping.")
+                if self._trace:
+                    logger.trace(f"Coordinates ({x}, {y}) in DEM file have no data value; skipping.")
                 continue
 
             elevation = float(val)
-            logger.trace(f"Found elevation {elevation} for coordinates ({lat}, {lon}) in DEM file.")
+            if self._trace:
+                logger.trace(f"Found elevation {elevation} for coordinates ({lat}, {lon}) in DEM file.")
             break
 
         # Return elevation for given latitude and longitude
@@ -155,8 +160,11 @@ def fix_elevation(track: Track, dem_files: list[Path], dem_crs: str|None, report
     correction_sum = 0.0
     correction_cnt = 0
     correction_max = 0.0
+    first_fixed: datetime | None = None
+    last_fixed: datetime | None = None
 
     logger.info("Correcting elevation points.")
+    trace = logger.trace_enabled()
     for dt,point in track.points_iter:
         lat = point.get('latitude')
         lon = point.get('longitude')
@@ -169,21 +177,16 @@ def fix_elevation(track: Track, dem_files: list[Path], dem_crs: str|None, report
         new_elevation = reference.get_elevation(lat, lon)
 
         if new_elevation is not None:
-            logger.trace(f"Fixing elevation at {to_string(dt)} from {to_string(old_elevation)} to {to_string(new_elevation)}.")
+            if trace:
+                logger.trace(f"Fixing elevation at {to_string(dt)} from {to_string(old_elevation)} to {to_string(new_elevation)}.")
             point['elevation'] = new_elevation
             cnt_fixed += 1
+            if first_fixed is None:
+                first_fixed = dt
+            last_fixed = dt
         else:
             cnt_not_fixed += 1
 
-        #cleanup elevation dependant data
-        if 'smooth_elevation' in point:
-            del point['smooth_elevation']
-        if 'grade' in point:
-            del point['grade']
-        if 'vertical_speed' in point:
-            del point['vertical_speed']
-
-
         correction = None
         if isinstance(new_elevation, (int, float)) and isinstance(old_elevation, (int, float)):
             correction = new_elevation - old_elevation
@@ -206,17 +209,9 @@ def fix_elevation(track: Track, dem_files: list[Path], dem_crs: str|None, report
     logger.info(f"Average elevation correction: {correction_sum / correction_cnt if correction_cnt > 0 else 0.0} m over {correction_cnt} points.")
     logger.info(f"Maximal elevation correction: {correction_max} m.")
 
-    logger.info("Removing metadata dependant on elevation.")
-    if 'total_ascent' in track.metadata:
-        del track.metadata['total_ascent']
-    if 'total_descent' in track.metadata:
-        del track.metadata['total_descent']
-    if 'max_grade' in track.metadata:
-        del track.metadata['max_grade']
-    if 'min_grade' in track.metadata:
-        del track.metadata['min_grade']
-    if 'avg_vam' in track.metadata:
-        del track.metadata['avg_vam']
+    if first_fixed is not None:
+        logger.info("Marking elevation dependant data for recalculation.")
+        track.mark_dirty('elevation', first_fixed, last_fixed)
 
     if report_basepath is not None:
         _generate_report_csv(report, report_basepath.with_suffix('.elevation_fix.csv'))
@@ -0,0 +1,472 @@
+import math
+
+from array import array
+from datetime import datetime, timedelta
+from typing import Any, Callable, MutableMapping, TypeAlias
+
+import numpy as np
+import numpy.typing as npt
+
+from ...utils.helpers import to_string, grados_radianes, radio_terrestre
+from ..columnar_track import ColumnarTrack
+from ..track import Track, _exact, _EXACT_SHIFT
+
+from ...utils.logger import logger
+
+
+FloatArray: TypeAlias = npt.NDArray[np.float64]
+BoolArray: TypeAlias = npt.NDArray[np.bool_]
+IndexArray: TypeAlias = npt.NDArray[np.intp]
+
+
+class TrackArrays:
+    """Point fields of a track extracted into NumPy arrays.
+
+    Every field is extracted once as a float64 array (NaN where the value is missing or
+    not numeric) together with `numeric` and `present` masks, so stages can mirror the
+    isinstance/`in` checks of the pure-Python calculator. Results are written to the
+    cached arrays and back to the track in bulk with write().
+    """
+
+    def __init__(self, track: Track) -> None:
+        self.track = track
+        self.n = len(track.points)
+        self._rows: list[tuple[datetime, MutableMapping]] | None = None
+        self._fields: dict[str, tuple[FloatArray, BoolArray, BoolArray]] = {}
+        self._timestamps_us: npt.NDArray[np.int64] | None = None
+
+
+    @property
+    def rows(self) -> list[tuple[datetime, MutableMapping]]:
+        if self._rows is None:
+            self._rows = list(self.track.points_iter)
+        return self._rows
+
+
+    @property
+    def timestamps_us(self) -> npt.NDArray[np.int64]:
+        """Point timestamps as int64 microseconds relative to the first point."""
+        if self._timestamps_us is None:
+            if isinstance(self.track, ColumnarTrack):
+                timestamps = np.frombuffer(self.track.timestamps_us, dtype=np.int64)
+                self._timestamps_us = timestamps - timestamps[0] if self.n else timestamps.copy()
+            else:
+                us = timedelta(microseconds=1)
+                start = self.rows[0][0] if self.rows else datetime.min
+                self._timestamps_us = np.fromiter(((ts - start) // us for ts, _ in self.rows), dtype=np.int64, count=self.n)
+        return self._timestamps_us
+
+
+    def field(self, key: str) -> tuple[FloatArray, BoolArray, BoolArray]:
+        """Return (values, numeric, present) arrays for the point field `key`."""
+        cached = self._fields.get(key)
+        if cached is None:
+            cached = self._extract(key)
+            self._fields[key] = cached
+        return cached
+
+
+    def _extract(self, key: str) -> tuple[FloatArray, BoolArray, BoolArray]:
+        if isinstance(self.track, ColumnarTrack):
+            column = self.track.column(key)
+            if column is None:
+                return np.full(self.n, np.nan), np.zeros(self.n, dtype=np.bool_), np.zeros(self.n, dtype=np.bool_)
+            if column.kind in ('d', 'q') and isinstance(column.values, array):
+                present = np.frombuffer(column.mask, dtype=np.uint8).astype(np.bool_)
+                dtype = np.float64 if column.kind == 'd' else np.int64
+                values = np.frombuffer(column.values, dtype=dtype).astype(np.float64)
+                values[~present] = np.nan
+                return values, present.copy(), present
+            raw = [column.get(row) for row in range(self.n)]
+        else:
+            raw = [point.get(key) for _, point in self.rows]
+
+        present = np.fromiter((v is not None for v in raw), dtype=np.bool_, count=self.n)
+        numeric = np.fromiter((isinstance(v, (int, float)) for v in raw), dtype=np.bool_, count=self.n)
+        values = np.fromiter((v if isinstance(v, (int, float)) else np.nan for v in raw), dtype=np.float64, count=self.n)
+        return values, numeric, present
+
+
+    def write(self, key: str, rows: IndexArray, values: FloatArray) -> None:
+        """Set float point field `key` of the given rows, in the track and in the cached arrays."""
+        if rows.size == 0:
+            return
+
+        cached = self._fields.get(key)
+        if cached is not None:
+            cached[0][rows] = values
+            cached[1][rows] = True
+            cached[2][rows] = True
+
+        if isinstance(self.track, ColumnarTrack):
+            column = self.track.column(key)
+            if column is None:
+                self.rows[int(rows[0])][1][key] = float(values[0])
+                column = self.track.column(key)
+            if column is not None and column.kind == 'd' and isinstance(column.values, array):
+                np.frombuffer(column.values, dtype=np.float64)[rows] = values
+                np.frombuffer(column.mask, dtype=np.uint8)[rows] = 1
+                return
+
+        for row, value in zip(rows.tolist(), values.tolist()):
+            self.rows[row][1][key] = value
+
+
+def _window_bounds(arrays: TrackArrays, key: str, size: float) -> tuple[IndexArray, IndexArray, IndexArray]:
+    """Return (rows, lo, hi) for the windows Track.sliding_window_iter() yields for `key`.
+
+    rows are the points with numeric `key`; window of rows[k] spans points [lo[k], hi[k]).
+    """
+    half = size / 2.0
+    values, numeric, _ = arrays.field(key)
+
+    rows = np.flatnonzero(numeric)
+    lo = rows.copy() # NaN or infinite key - the window is the point itself
+    hi = rows + 1
+
+    # runs of consecutive points with finite numeric key [a, b)
+    finite = np.isfinite(values[rows])
+    breaks = np.flatnonzero((np.diff(rows) != 1) | (finite[1:] != finite[:-1])) + 1
+    starts = np.concatenate(([0], breaks))
+    ends = np.concatenate((breaks, [rows.size]))
+    for s, e in zip(starts.tolist(), ends.tolist()):
+        if s == e or not finite[s]:
+            continue
+        a = int(rows[s])
+        x = values[a:a + e - s]
+        if np.all(x[1:] >= x[:-1]):
+            run_lo, run_hi = _window_bounds_sorted(x, half)
+        else:
+            run_lo, run_hi = _window_bounds_scan(x, half)
+        lo[s:e] = run_lo + a
+        hi[s:e] = run_hi + a
+
+    return rows, lo, hi
+
+
+def _window_bounds_sorted(x: FloatArray, half: float) -> tuple[IndexArray, IndexArray]:
+    # searchsorted compares against x +/- half, the window predicate compares differences;
+    # rounding may disagree at the bounds so step bounds over equal values until they agree
+    hi = np.searchsorted(x, x + half, side='right')
+    lo = np.searchsorted(x, x - half, side='left')
+    m = x.size
+
+    while True:
+        grow = hi < m
+        grow[grow] = x[hi[grow]] - x[grow] <= half
+        if not grow.any():
+            break
+        hi[grow] = np.searchsorted(x, x[hi[grow]], side='right')
+    while True:
+        shrink = x[hi - 1] - x > half
+        if not shrink.any():
+            break
+        hi[shrink] = np.searchsorted(x, x[hi[shrink] - 1], side='left')
+
+    while True:
+        shrink = x - x[lo] > half
+        if not shrink.any():
+            break
+        lo[shrink] = np.searchsorted(x, x[lo[shrink]], side='right')
+    while True:
+        grow = lo > 0
+        grow[grow] = x[grow] - x[lo[grow] - 1] <= half
+        if not grow.any():
+            break
+        lo[grow] = np.searchsorted(x, x[lo[grow] - 1], side='left')
+
+    return lo, hi
+
+
+def _window_bounds_scan(x: FloatArray, half: float) -> tuple[IndexArray, IndexArray]:
+    values = x.tolist()
+    m = len(values)
+    lo = np.empty(m, dtype=np.intp)
+    hi = np.empty(m, dtype=np.intp)
+    for i, value in enumerate(values):
+        j = i
+        while j > 0 and abs(values[j-1] - value) <= half:
+            j -= 1
+        k = i + 1
+        while k < m and abs(values[k] - value) <= half:
+            k += 1
+        lo[i] = j
+        hi[i] = k
+    return lo, hi
+
+
+def _running_extreme(values: FloatArray, extreme: Callable[[FloatArray], Any]) -> Any:
+    """Extreme of values in point order as a running `v > m` comparison finds it - NaN wins only as the first value."""
+    return values[0] if np.isnan(values[0]) else extreme(values)
+
+
+def _squares(values: FloatArray) -> FloatArray:
+    """Squares computed like the Python engine's `v**2` (libm pow), which may differ from `v*v` in the last bit.
+
+    Squares overflowing a float are NaN, where `v**2` raises OverflowError.
+    """
+    def square(v: float) -> float:
+        try:
+            return v**2
+        except OverflowError:
+            return math.nan
+    return np.fromiter(map(square, values.tolist()), dtype=np.float64, count=values.size)
+
+
+def calculate_distances(arrays: TrackArrays) -> None:
+    """Calculate distance, track_distance point fields and total_distance metadata."""
+
+    logger.debug("Calculating distances for track points...")
+
+    lat, lat_ok, _ = arrays.field('latitude')
+    lon, lon_ok, _ = arrays.field('longitude')
+    _, _, distance_present = arrays.field('distance')
+
+    rows = np.flatnonzero(lat_ok & lon_ok)
+    la = lat[rows] * grados_radianes
+    lo = lon[rows] * grados_radianes
+
+    haversine = (np.sin((la[1:] - la[:-1])/2.0) ** 2) + (np.cos(la[:-1]) * np.cos(la[1:]) * (np.sin((lo[1:] - lo[:-1])/2.0) ** 2))
+    steps = 2 * np.arcsin(np.minimum(1.0, np.sqrt(haversine))) * radio_terrestre
+    track_distance = np.concatenate(([0.0], np.cumsum(steps))) if rows.size else np.empty(0)
+
+    missing = ~distance_present[rows]
+    arrays.write('track_distance', rows, track_distance)
+    arrays.write('distance', rows[missing], track_distance[missing])
+
+    logger.debug(f"Calculated distances for {int(missing.sum())} points and track distances for {rows.size} points.")
+
+    total_distance = float(track_distance[-1]) if rows.size else 0.0
+    track = arrays.track
+    track.set_metadata('total_track_distance', total_distance)
+    logger.info(f"Total track distance set to {total_distance} meters")
+
+    if 'total_distance' not in track.metadata:
+        track.set_metadata('total_distance', total_distance)
+        logger.info(f"Total distance set to {total_distance} meters")
+
+
+def calculate_speeds(arrays: TrackArrays) -> None:
+    """Calculate speed, track_speed point fields and avg_speed, max_speed metadata."""
+
+    logger.debug("Calculating speeds for track points...")
+
+    distance, distance_ok, _ = arrays.field('distance')
+    timer, timer_ok, _ = arrays.field('timer')
+    speed_in, speed_ok, speed_present = arrays.field('speed')
+
+    rows = np.flatnonzero(distance_ok & timer_ok)
+    d = distance[rows]
+    t = timer[rows]
+    dd = d - np.concatenate(([0.0], d[:-1]))
+    dt = t - np.concatenate(([0.0], t[:-1]))
+
+    speed = np.zeros(rows.size)
+    moving = dt > 0
+    speed[moving] = dd[moving] / dt[moving]
+
+    missing = ~speed_present[rows]
+    existing = np.where(speed_ok[rows], speed_in[rows], np.nan)
+    arrays.write('track_speed', rows, speed)
+    arrays.write('speed', rows[missing], speed[missing])
+
+    logger.debug(f"Calculated speeds for {int(missing.sum())} points and track speeds for {rows.size} points.")
+
+    positive = speed[speed > 0.0]
+    max_track_speed = float(positive.max()) if positive.size else 0.0
+    speeds = np.where(missing, speed, existing)
+    positive = speeds[speeds > 0.0]
+    max_speed = float(positive.max()) if positive.size else 0.0
+
+    track = arrays.track
+    track.set_metadata('max_track_speed', max_track_speed)
+    logger.info(f"Max track speed set to {max_track_speed} m/s")
+
+    if 'max_speed' not in track.metadata:
+        track.set_metadata('max_speed', max_speed)
+        logger.info(f"Max speed set to {max_speed} m/s")
+
+
+    if 'avg_speed' not in track.metadata:
+        total_time = track.metadata.get('total_elapsed_time')
+        total_distance = track.metadata.get('total_distance')
+
+        if (isinstance(total_distance, (int, float)) and
+            isinstance(total_time, (int, float)) and total_time > 0):
+
+            avg_speed = total_distance / total_time
+            track.set_metadata('avg_speed', avg_speed)
+            logger.info(f"Avg speed set to {avg_speed} m/s")
+
+
+    total_time = track.metadata.get('total_elapsed_time')
+    total_track_distance = track.metadata.get('total_track_distance')
+
+    if (isinstance(total_track_distance, (int, float)) and
+        isinstance(total_time, (int, float)) and total_time > 0):
+
+        avg_track_speed = total_track_distance / total_time
+        track.set_metadata('avg_track_speed', avg_track_speed)
+        logger.info(f"Avg track speed set to {avg_track_speed} m/s")
+
+
+def calculate_vspeeds(arrays: TrackArrays) -> None:
+    """Calculate vertical_speed point field."""
+
+    logger.debug("Calculating vertical speeds for track points...")
+
+    elevation, elevation_ok, _ = arrays.field('elevation')
+    timer, timer_ok, _ = arrays.field('timer')
+    _, _, vspeed_present = arrays.field('vertical_speed')
+
+    rows = np.flatnonzero(elevation_ok & timer_ok)
+    e = elevation[rows]
+    t = timer[rows]
+    de = e[1:] - e[:-1]
+    dt = t[1:] - t[:-1]
+
+    missing = ~vspeed_present[rows[1:]]
+    de, dt = de[missing], dt[missing]
+    vspeed = np.zeros(de.size)
+    moving = dt > 0
+    vspeed[moving] = de[moving] / dt[moving]
+    arrays.write('vertical_speed', rows[1:][missing], vspeed)
+
+    logger.debug(f"Calculated vertical speeds for {vspeed.size} points.")
+
+
+def calculate_elevation(arrays: TrackArrays, window_size: int) -> None:
+    """Calculate smooth_elevation point field using a simple moving average."""
+
+    logger.debug("Calculating smooth elevation for track points...")
+
+    elevation, elevation_ok, _ = arrays.field('elevation')
+    _, _, smooth_present = arrays.field('smooth_elevation')
+    rows, lo, hi = _window_bounds(arrays, 'distance', window_size)
+
+    # exact window sums - means are correctly rounded, same as Window.mean(), non-finite values count as missing
+    finite = elevation_ok & np.isfinite(elevation)
+    exact = np.array([_exact(v) if ok else 0 for v, ok in zip(elevation.tolist(), finite.tolist())], dtype=object)
+    sums = np.concatenate(([0], np.cumsum(exact)))
+    counts = np.concatenate(([0], np.cumsum(finite, dtype=np.int64)))
+
+    missing = ~smooth_present[rows]
+    count = counts[hi] - counts[lo]
+    calc = missing & (count > 0)
+    total = sums[hi[calc]] - sums[lo[calc]]
+    smooth = (total / (count[calc].astype(object) << _EXACT_SHIFT)).astype(np.float64)
+    arrays.write('smooth_elevation', rows[calc], smooth)
+
+    in_window = elevation[rows[elevation_ok[rows]]]
+    track = arrays.track
+    if in_window.size and "max_elevation" not in track.metadata:
+        max_elevation = float(in_window.max())
+        track.set_metadata('max_elevation', max_elevation)
+        logger.info(f"Max elevation set to {max_elevation} meters")
+    if in_window.size and "min_elevation" not in track.metadata:
+        min_elevation = float(in_window.min())
+        track.set_metadata('min_elevation', min_elevation)
+        logger.info(f"Min elevation set to {min_elevation} meters")
+
+    logger.debug(f"Calculated smooth_elevation for {smooth.size} points.")
+
+
+def calculate_grade(arrays: TrackArrays, window_size: int, min_grade_window: float) -> None:
+    """Calculate grade point field."""
+
+    logger.debug("Calculating grade...")
+
+    distance, _, _ = arrays.field('distance')
+    altitude, altitude_ok, _ = arrays.field('smooth_elevation')
+    grade_in, grade_ok, _ = arrays.field('grade')
+    rows, lo, hi = _window_bounds(arrays, 'distance', window_size)
+
+    existing = rows[grade_ok[rows]]
+    rows_calc = np.flatnonzero(~grade_ok[rows] & altitude_ok[rows])
+    candidates = rows[rows_calc]
+    lo = lo[rows_calc]
+    hi = hi[rows_calc]
+
+    # first and last point with altitude in each window, the current point always has one
+    with_altitude = np.flatnonzero(altitude_ok)
+    first = with_altitude[np.searchsorted(with_altitude, lo, side='left')]
+    last = with_altitude[np.searchsorted(with_altitude, hi, side='left') - 1]
+
+    dist = distance[candidates]
+    z1, y1 = distance[first], altitude[first]
+    z2, y2 = distance[last], altitude[last]
+
+    with np.errstate(invalid='ignore'): # non-finite distances give NaN grades like in the Python engine
+        keep = ~(dist - z1 < min_grade_window/2) & ~(z2 - dist < min_grade_window/2)
+        candidates, z1, y1, z2, y2 = candidates[keep], z1[keep], y1[keep], z2[keep], y2[keep]
+
+        z = z2 - z1
+        y = y2 - y1
+        z_squared, y_squared = _squares(z), _squares(y)
+        overflow = (np.isnan(z_squared) & ~np.isnan(z)) | (np.isnan(y_squared) & ~np.isnan(y))
+        x2 = z_squared - y_squared
+
+    domain_error = ~overflow & (x2 < 0)
+    x = np.sqrt(np.where(domain_error, 0.0, x2))
+    zero_division = ~overflow & ~domain_error & (x == 0)
+    for rows_failed, message in ((candidates[overflow], "(34, 'Numerical result out of range')"),
+                                 (candidates[domain_error], "math domain error"), (candidates[zero_division], "float division by zero")):
+        for row in rows_failed.tolist():
+            logger.warning(f"Failed to calculate grade for point at {to_string(arrays.rows[row][0])}: {message}")
+
+    ok = ~overflow & ~domain_error & ~zero_division
+    grade = (y[ok] / x[ok]) * 100.0
+    arrays.write('grade', candidates[ok], grade)
+
+    logger.debug(f"Calculated grade for {grade.size} points.")
+
+    grades = np.concatenate((grade_in[existing], grade))[np.argsort(np.concatenate((existing, candidates[ok])), kind='stable')]
+    track = arrays.track
+    if grades.size and "max_grade" not in track.metadata:
+        max_grade = float(_running_extreme(grades, np.nanmax))
+        track.set_metadata('max_grade', max_grade)
+        logger.info(f"Max grade set to {max_grade} %")
+    if grades.size and "min_grade" not in track.metadata:
+        min_grade = float(_running_extreme(grades, np.nanmin))
+        track.set_metadata('min_grade', min_grade)
+        logger.info(f"Min grade set to {min_grade} %")
+
+
+def calculate_ascent_descent(arrays: TrackArrays) -> None:
+    """Calculate cumulative ascent point field and total_ascent, total_descent, avg_vam metadata."""
+
+    logger.debug("Calculating total ascent, total descent and avg_vam...")
+
+    elevation, elevation_ok, _ = arrays.field('smooth_elevation')
+    _, distance_ok, _ = arrays.field('distance')
+
+    invalid = np.flatnonzero(~(elevation_ok & distance_ok))
+    end = int(invalid[0]) if invalid.size else arrays.n
+
+    delta = np.diff(elevation[:end])
+    ascending = delta > 0
+    ascent = np.concatenate(([0.0], np.cumsum(np.where(ascending, delta, 0.0))))[:end]
+    descent = np.concatenate(([0.0], np.cumsum(np.where(delta < 0, -delta, 0.0))))[:end]
+
+    rows = np.arange(end)
+    arrays.write('cumulative_ascent', rows, ascent)
+    arrays.write('cumulative_descent', rows, descent)
+
+    if invalid.size:
+        logger.error(f"Point at {to_string(arrays.rows[end][0])} missing elevation or distance cancelling ascent/descent calculation.")
+        return
+
+    total_ascent = float(ascent[-1]) if end else 0.0
+    total_descent = float(descent[-1]) if end else 0.0
+    time_ascending = int(np.diff(arrays.timestamps_us)[ascending].sum()) / 10**6
+
+    avg_vam = (total_ascent / time_ascending) if time_ascending > 0 else 0.0
+
+    logger.info(f"Total ascent calculated: {total_ascent} meters.")
+    logger.info(f"Total descent calculated: {total_descent} meters.")
+    logger.info(f"Average VAM calculated: {avg_vam} m/s.")
+
+    track = arrays.track
+    track.set_metadata('total_ascent', total_ascent)
+    track.set_metadata('total_descent', total_descent)
+    track.set_metadata('avg_vam', avg_vam)
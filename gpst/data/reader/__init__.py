@@ -1,3 +1,4 @@
 from .reader import Reader
 from .fit_reader import FitReader
 from .gpx_reader import GpxReader
+from .gpst_reader import GpstReader
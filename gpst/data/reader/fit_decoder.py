@@ -0,0 +1,282 @@
+"""Fast FIT decoder for RECORD messages.
+
+Parses FIT headers, definition messages and compressed timestamp headers itself and decodes
+RECORD messages with precompiled struct formats into the same dictionaries the Garmin FIT SDK
+produces, limited to the requested fields. Other handled messages are passed, in file order, to
+the SDK decoder. Files using features it does not implement raise UnsupportedFit so the caller
+can decode them with the SDK instead. Set GPST_FIT_DECODER=sdk to always use the SDK.
+"""
+import os
+import struct
+
+from collections.abc import Callable, Collection
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from garmin_fit_sdk import Decoder, Profile, Stream
+from garmin_fit_sdk.decoder import DecodeMode
+from garmin_fit_sdk.fit import BASE_TYPE_DEFINITIONS, NUMERIC_FIELD_TYPES
+from garmin_fit_sdk.util import FIT_EPOCH_S
+
+
+ENABLED = os.getenv("GPST_FIT_DECODER", "fast") != "sdk"
+
+RECORD = Profile['mesg_num']['RECORD'] # type: ignore[index]
+TIMESTAMP_FIELD = 253
+
+_FIT_EPOCH = datetime.fromtimestamp(FIT_EPOCH_S, timezone.utc)
+_STRING = 7 # base type
+_COMPRESSED_HEADER = 0x80
+_DEFINITION_HEADER = 0x40
+_DEVELOPER_DATA = 0x20
+
+_CRC_TABLE = [0] * 256
+for _byte in range(256):
+    _crc = _byte
+    for _ in range(8):
+        _crc = (_crc >> 1) ^ 0xA001 if _crc & 1 else _crc >> 1
+    _CRC_TABLE[_byte] = _crc
+
+
+class UnsupportedFit(Exception):
+    """File uses FIT features the fast decoder does not implement."""
+
+
+Converter = Callable[[Any], Any]
+Handlers = dict[int, Callable[[dict], None]]
+
+
+def crc(data: Any, start: int, end: int) -> int:
+    """FIT CRC-16 of data[start:end]."""
+    value = 0
+    table = _CRC_TABLE
+    for byte in bytes(data[start:end]):
+        value = (value >> 8) ^ table[(value ^ byte) & 0xFF]
+    return value
+
+
+def _timestamp(raw: int) -> datetime:
+    return _FIT_EPOCH + timedelta(seconds=raw)
+
+
+def _converter(profile: dict) -> Converter | None:
+    """Raw value to the value the SDK reports for a field, None for identity."""
+    field_type = profile['type']
+    if field_type == 'date_time':
+        return _timestamp
+    names = Profile['types'].get(field_type) # type: ignore[attr-defined]
+    if names is not None:
+        return lambda raw: names.get(raw, raw)
+    if field_type not in NUMERIC_FIELD_TYPES or len(profile['scale']) > 1:
+        return None
+    scale = profile['scale'][0] if profile['scale'] else 1
+    offset = profile['offset'][0] if profile['offset'] else 0
+    if scale != 1:
+        return lambda raw: raw / scale - offset
+    if offset != 0:
+        return lambda raw: raw - offset
+    return None
+
+
+class _Definition:
+    __slots__ = ('mesg_num', 'raw', 'struct', 'size', 'timestamp', 'fields', 'components')
+
+    def __init__(self, mesg_num: int, raw: bytes, endian: str, field_defs: list[tuple[int, int, int]],
+                 developer_size: int, record_fields: Collection[str]) -> None:
+        self.mesg_num = mesg_num
+        self.raw = raw # definition message as read, passed on with delegated messages
+        self.timestamp: int | None = None # index of timestamp value
+        self.fields: list[tuple[int, str, Any, Converter | None]] = [] # value index, name, invalid value, converter
+        self.components: list[tuple[int, Any, str, int, float, float]] = [] # value index, invalid, target name, mask, scale, offset
+
+        profile_fields = Profile['messages'].get(mesg_num, {}).get('fields', {}) if mesg_num == RECORD else {} # type: ignore[attr-defined]
+        parts = [endian]
+        index = 0
+        size = 0
+        for num, field_size, base_type in field_defs:
+            if base_type not in BASE_TYPE_DEFINITIONS:
+                raise UnsupportedFit(f"invalid base type {base_type}")
+            base = BASE_TYPE_DEFINITIONS[base_type]
+            if field_size % base['size'] != 0:
+                base_type = 0x02 # uint8 like the SDK
+                base = BASE_TYPE_DEFINITIONS[base_type]
+            count = field_size // base['size']
+            parts.append(f"{count}{base['type_code']}" if count > 1 else base['type_code'])
+
+            if num == TIMESTAMP_FIELD and count == 1 and base_type != _STRING:
+                self.timestamp = index
+            profile = profile_fields.get(num)
+            if profile is not None:
+                self._add_field(profile, index, count, base['invalid'], profile_fields, record_fields)
+
+            index += 1 if base_type == _STRING else count
+            size += field_size
+
+        self.struct = struct.Struct("".join(parts))
+        self.size = size + developer_size
+
+
+    def _add_field(self, profile: dict, index: int, count: int, invalid: Any,
+                   profile_fields: dict, record_fields: Collection[str]) -> None:
+        targets = [profile_fields[num] for num in profile['components'] if num in profile_fields]
+        used = profile['name'] in record_fields or any(target['name'] in record_fields for target in targets)
+        if not used:
+            return
+        if count > 1 or profile['sub_fields']:
+            raise UnsupportedFit(f"record field '{profile['name']}' with {count} values or sub fields")
+
+        if profile['name'] in record_fields:
+            self.fields.append((index, profile['name'], invalid, _converter(profile)))
+
+        if targets:
+            target = targets[0]
+            if len(targets) > 1 or target['is_accumulated'] or target['has_components']:
+                raise UnsupportedFit(f"record field '{profile['name']}' expands into accumulated or several fields")
+            if target['name'] in record_fields:
+                self.components.append((index, invalid, target['name'], (1 << profile['bits'][0]) - 1,
+                                        profile['scale'][0], profile['offset'][0]))
+
+
+    def decode(self, data: Any, offset: int) -> tuple[dict, int | None]:
+        """Decode message at offset, returns requested fields and raw timestamp."""
+        values = self.struct.unpack_from(data, offset)
+        message = {}
+        for index, name, invalid, convert in self.fields:
+            raw = values[index]
+            if raw != invalid:
+                message[name] = convert(raw) if convert is not None else raw
+        for index, invalid, name, mask, scale, shift in self.components: # expanded fields replace read ones like in the SDK
+            raw = values[index]
+            if raw != invalid:
+                value = (raw & mask) / scale - shift
+                message[name] = int(value) if value.is_integer() else value
+
+        timestamp = values[self.timestamp] if self.timestamp is not None else None
+        return message, timestamp if timestamp != 0xFFFFFFFF else None
+
+
+    def timestamp_of(self, data: Any, offset: int) -> int | None:
+        if self.timestamp is None:
+            return None
+        timestamp = self.struct.unpack_from(data, offset)[self.timestamp]
+        return timestamp if timestamp != 0xFFFFFFFF else None
+
+
+class FitDecoder:
+    def __init__(self, record_fields: Collection[str]) -> None:
+        self.record_fields = frozenset(record_fields) | {'timestamp'}
+
+
+    def decode(self, data: Any, handlers: Handlers, check_crc: bool = True) -> list[Exception]:
+        """Decode FIT data (bytes-like), calling handlers[mesg_num](message) in file order.
+
+        Messages without handler are skipped by their definition sizes. Returns errors reported
+        by the SDK for delegated messages, raises UnsupportedFit when the file has to be decoded
+        by the SDK instead.
+        """
+        errors: list[Exception] = []
+        pos = 0
+        while pos < len(data):
+            if len(data) - pos < 14 or data[pos] not in (12, 14) or bytes(data[pos + 8:pos + 12]) != b".FIT":
+                raise UnsupportedFit("not a FIT file")
+            header_size = data[pos]
+            (data_size,) = struct.unpack_from("<I", data, pos + 4)
+            start = pos + header_size
+            end = start + data_size
+            if end + 2 > len(data):
+                raise UnsupportedFit("file is truncated")
+            if check_crc and struct.unpack_from("<H", data, end)[0] != crc(data, pos, end):
+                raise UnsupportedFit("CRC error")
+
+            errors += self._decode_records(data, start, end, handlers)
+            pos = end + 2
+        return errors
+
+
+    def _decode_records(self, data: Any, pos: int, end: int, handlers: Handlers) -> list[Exception]:
+        errors: list[Exception] = []
+        definitions: dict[int, _Definition] = {}
+        record = handlers.get(RECORD)
+        delegated = bytearray() # handled messages for the SDK, with their definitions
+        last_timestamp: int | None = None
+
+        def flush() -> None:
+            if delegated:
+                stream = Stream.from_byte_array(delegated + b"\x00\x00") # CRC is not checked in DATA_ONLY mode
+                _, sdk_errors = Decoder(stream).read(mesg_listener=lambda num, message: handlers[num](message),
+                                                     decode_mode=DecodeMode.DATA_ONLY)
+                errors.extend(sdk_errors)
+                delegated.clear()
+
+        while pos < end:
+            header = data[pos]
+            pos += 1
+
+            if header & _COMPRESSED_HEADER:
+                definition = definitions.get((header >> 5) & 0x03)
+                if definition is None:
+                    raise UnsupportedFit("data message without definition")
+                if record is not None:
+                    if last_timestamp is None:
+                        raise UnsupportedFit("compressed timestamp header without reference timestamp")
+                    time_offset = header & 0x1F
+                    timestamp = (last_timestamp & ~0x1F) + time_offset
+                    if time_offset < last_timestamp & 0x1F:
+                        timestamp += 0x20
+                    last_timestamp = timestamp
+                compressed = True
+            elif header & _DEFINITION_HEADER:
+                definition, size = self._read_definition(data, pos - 1, header, self.record_fields if record is not None else ())
+                definitions[header & 0x0F] = definition
+                pos += size
+                continue
+            else:
+                definition = definitions.get(header & 0x0F)
+                if definition is None:
+                    raise UnsupportedFit("data message without definition")
+                compressed = False
+
+            if pos + definition.size > end:
+                raise UnsupportedFit("message past end of data")
+
+            if definition.mesg_num == RECORD and record is not None:
+                flush()
+                message, timestamp = definition.decode(data, pos)
+                if compressed and 'timestamp' not in message:
+                    message['timestamp'] = _timestamp(last_timestamp) # type: ignore[arg-type]
+                elif timestamp is not None:
+                    last_timestamp = timestamp
+                record(message)
+            else:
+                if record is not None: # reference for compressed timestamps of later records
+                    timestamp = definition.timestamp_of(data, pos)
+                    if timestamp is not None:
+                        last_timestamp = timestamp
+                if definition.mesg_num in handlers:
+                    if compressed:
+                        raise UnsupportedFit("compressed timestamp header in non-record message")
+                    delegated += definition.raw
+                    delegated += data[pos - 1:pos + definition.size]
+            pos += definition.size
+
+        flush()
+        return errors
+
+
+    @staticmethod
+    def _read_definition(data: Any, pos: int, header: int, record_fields: Collection[str]) -> tuple[_Definition, int]:
+        """Read definition message starting with its header at pos, returns definition and size after header."""
+        endian = ">" if data[pos + 2] == 1 else "<"
+        (mesg_num,) = struct.unpack_from(f"{endian}H", data, pos + 3)
+        num_fields = data[pos + 5]
+        field_defs = [(data[i], data[i + 1], data[i + 2] & 0x1F) for i in range(pos + 6, pos + 6 + 3 * num_fields, 3)]
+        size = 5 + 3 * num_fields
+
+        developer_size = 0
+        if header & _DEVELOPER_DATA:
+            num_developer_fields = data[pos + 1 + size]
+            developer_size = sum(data[i + 1] for i in range(pos + 2 + size, pos + 2 + size + 3 * num_developer_fields, 3))
+            size += 1 + 3 * num_developer_fields
+
+        raw = bytes(data[pos:pos + 1 + size])
+        return _Definition(mesg_num, raw, endian, field_defs, developer_size, record_fields), size
@@ -1,64 +1,152 @@
 import datetime
 import math
+import mmap
 
+from collections.abc import Callable
+from functools import partial
 from garmin_fit_sdk import Decoder, Stream, Profile
 from pathlib import Path
 
 from ...utils.helpers import to_string
 from ...utils.logger import logger
+from ..compression import is_compressed, open_file
 from ..track import Track, Value, SegmentType
+from . import fit_decoder
+from .fit_decoder import FitDecoder, Handlers
 from .reader import Reader
 
 
-class FitReader(Reader):
-    semicircles_factor = 180.0 / 2**31
+SEMICIRCLES_FACTOR = 180.0 / 2**31
+
+_mesg_num: dict[str, int] = Profile['mesg_num'] # type: ignore
+
+# RECORD message field: point field and scale, enhanced_* fields take precedence over their plain variants
+RECORD_FIELDS: dict[str, tuple[str, float | None]] = {
+    'position_lat':                 ('latitude', SEMICIRCLES_FACTOR),
+    'position_long':                ('longitude', SEMICIRCLES_FACTOR),
+    'enhanced_altitude':            ('elevation', None),
+    'altitude':                     ('elevation', None),
+    'vertical_speed':               ('vertical_speed', None),
+    'enhanced_speed':               ('speed', None),
+    'speed':                        ('speed', None),
+    'distance':                     ('distance', None),
+    'heart_rate':                   ('heart_rate', None),
+    'cadence':                      ('cadence', None),
+    'enhanced_respiration_rate':    ('respiration_rate', None),
+    'respiration_rate':             ('respiration_rate', None),
+    'core_temperature':             ('core_temperature', None),
+    'power':                        ('power', None),
+    'accumulated_power':            ('accumulated_power', None),
+    'grade':                        ('grade', None),
+    'temperature':                  ('temperature', None),
+    'gps_accuracy':                 ('gps_accuracy', None),
+    'calories':                     ('calories', None),
+    'left_right_balance':           ('left_right_balance', None),
+    'left_torque_effectiveness':    ('left_torque_effectiveness', None),
+    'right_torque_effectiveness':   ('right_torque_effectiveness', None),
+    'left_pedal_smoothness':        ('left_pedal_smoothness', None),
+    'right_pedal_smoothness':       ('right_pedal_smoothness', None),
+    'combined_pedal_smoothness':    ('combined_pedal_smoothness', None),
+    'grit':                         ('grit', None),
+    'flow':                         ('flow', None),
+}
+
+# message field: point field, scale, fallback - set only when the enhanced_* variant is missing
+_record_fields: dict[str, tuple[str, float | None, bool]] = {
+    key: (name, scale, f"enhanced_{key}" in RECORD_FIELDS) for key, (name, scale) in RECORD_FIELDS.items()
+}
+
+METADATA_MESSAGES = (_mesg_num['FILE_ID'], _mesg_num['SPORT'], _mesg_num['SESSION']) # decoded without points
+
+_fast_decoder = FitDecoder(RECORD_FIELDS)
+
+Rows = list[tuple[datetime.datetime, dict[str, Value]]] # point data collected for Track.extend_points
 
-    def read(self, path: Path) -> Track|None:
-        cache: dict[str, Value] = {}
-        metacache: dict[str, Value] = {}
 
-        def mesg_listener(mesg_num: int, message: dict) -> None:
-            if mesg_num == Profile['mesg_num']['SESSION']: # type: ignore
-                self._handle_session_message(message, track)
-            elif mesg_num == Profile['mesg_num']['SPORT']: # type: ignore
-                self._handle_sport_message(message, track)
-            elif mesg_num == Profile['mesg_num']['FILE_ID']: # type: ignore
-                self._handle_file_id_message(message, track)
-            elif mesg_num == Profile['mesg_num']['RECORD']: # type: ignore
-                self._handle_record_message(message, cache, track)
-            elif mesg_num == Profile['mesg_num']['EVENT']: # type: ignore
-                self._handle_event_message(message, cache, track)
-            elif mesg_num == Profile['mesg_num']['CLIMB_PRO']: # type: ignore
-                self._handle_climb_message(message, cache, metacache, track)
-            elif mesg_num == Profile['mesg_num']['JUMP']: # type: ignore
-                self._handle_jump_message(message, track)
-            elif mesg_num == Profile['mesg_num']['SEGMENT_LAP']: # type: ignore
-                self._handle_segment_lap_message(message, track)
-            # TBD messages: hrv, time_in_zone, lap, split, split_summary, timestamp_correlation, device_info, device_aux_battery_info
+class FitReader(Reader):
+    semicircles_factor = SEMICIRCLES_FACTOR
+
+    def read(self, path: Path, track_type: type[Track] = Track, points: bool = True) -> Track|None:
+        """Read FIT file, RECORD messages are decoded by the fast decoder unless the file needs the SDK.
 
-        track = Track()
+        Without points only FILE_ID, SPORT and SESSION messages are decoded - all other messages
+        are skipped by their definition sizes and the file CRC is not checked.
+        """
         try:
-            stream = Stream.from_file(path)
-            decoder = Decoder(stream)
-            _, errors = decoder.read(mesg_listener=mesg_listener)
-
-            if errors:
-                logger.error(f"Errors decoding fit file:")
-                for error in errors:
-                    logger.error(f" - {error}")
-                return None
+            with open_file(path, "rb") as f:
+                if is_compressed(path):
+                    return self._read_data(f.read(), path, track_type, points)
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    return self._read_data(data, path, track_type, points)
         except Exception as e:
             logger.error(f"Failed to read fit file: {e}")
             return None
 
-        if isinstance(metacache.get('climb_start'), datetime.datetime) and isinstance(cache.get('active_climb'), int):
+
+    def _read_data(self, data: bytes | mmap.mmap, path: Path, track_type: type[Track], points: bool) -> Track|None:
+        if fit_decoder.ENABLED:
+            try:
+                return self._decode(data, track_type, partial(_fast_decoder.decode, check_crc=points), points)
+            except fit_decoder.UnsupportedFit as e:
+                logger.debug(f"Decoding '{path}' with Garmin FIT SDK: {e}.")
+        return self._decode(data, track_type, self._sdk_decode, points)
+
+
+    @staticmethod
+    def _sdk_decode(data: bytes | mmap.mmap, handlers: Handlers) -> list[Exception]:
+        def mesg_listener(mesg_num: int, message: dict) -> None:
+            handler = handlers.get(mesg_num)
+            if handler is not None:
+                handler(message)
+
+        _, errors = Decoder(Stream.from_byte_array(bytearray(data))).read(mesg_listener=mesg_listener)
+        return errors
+
+
+    def _decode(self, data: bytes | mmap.mmap, track_type: type[Track],
+                decode: Callable[[bytes | mmap.mmap, Handlers], list[Exception]], points: bool) -> Track|None:
+        cache: dict[str, Value] = {}
+        metacache: dict[str, Value] = {}
+        climb_fills: list[tuple[datetime.datetime|None, datetime.datetime, int]] = [] # (after, before, climb) back-filled once decoded
+        rows: Rows = [] # point data not yet added to the track
+
+        handlers: Handlers = {
+            _mesg_num['SESSION']: lambda message: self._handle_session_message(message, track),
+            _mesg_num['SPORT']: lambda message: self._handle_sport_message(message, track),
+            _mesg_num['FILE_ID']: lambda message: self._handle_file_id_message(message, track),
+            _mesg_num['RECORD']: lambda message: self._handle_record_message(message, cache, rows),
+            _mesg_num['EVENT']: lambda message: self._handle_event_message(message, cache, rows),
+            _mesg_num['CLIMB_PRO']: lambda message: self._handle_climb_message(message, cache, metacache, climb_fills, rows, track),
+            _mesg_num['JUMP']: lambda message: self._handle_jump_message(message, rows),
+            _mesg_num['SEGMENT_LAP']: lambda message: self._handle_segment_lap_message(message, track),
+            # TBD messages: hrv, time_in_zone, lap, split, split_summary, timestamp_correlation, device_info, device_aux_battery_info
+        }
+        if not points:
+            handlers = {num: handlers[num] for num in METADATA_MESSAGES}
+
+        track = track_type()
+        errors = decode(data, handlers)
+        if errors:
+            logger.error(f"Errors decoding fit file:")
+            for error in errors:
+                logger.error(f" - {error}")
+            return None
+
+        track.extend_points(rows)
+        self._fill_climbs(climb_fills, track)
+
+        climb_start = metacache.get('climb_start')
+        if isinstance(climb_start, datetime.datetime) and isinstance(cache.get('active_climb'), int):
             logger.info("Fit file ended while a ClimbPro climb was still active. Finalizing climb segment.")
+            end_time = climb_start
+            for end_time, _ in track.range_iter(start=climb_start):
+                pass
             track.add_segment({
                 'name': f"Climb {cache['active_climb']}",
                 'source': 'climbpro',
                 'type': SegmentType.CLIMB,
-                'start_time': metacache['climb_start'],
-                'end_time': max([t for t,_ in track.points_iter]),
+                'start_time': climb_start,
+                'end_time': end_time,
             })
 
         return track
@@ -249,7 +337,7 @@ class FitReader(Reader):
         track.set_metadata('device', device)
 
 
-    def _handle_record_message(self, message: dict, cache: dict[str, Value], track: Track) -> None:
+    def _handle_record_message(self, message: dict, cache: dict[str, Value], rows: Rows) -> None:
         if 'timestamp' not in message:
             logger.warning("RECORD message without timestamp field.")
             return
@@ -257,84 +345,22 @@ class FitReader(Reader):
         timestamp = message['timestamp']
         record_data = {'timestamp': timestamp}
         
-        if 'position_lat' in message:
-            record_data['latitude'] = message['position_lat'] * self.semicircles_factor
-        if 'position_long' in message:
-            record_data['longitude'] = message['position_long'] * self.semicircles_factor
-
-        if 'enhanced_altitude' in message:
-            record_data['elevation'] = message['enhanced_altitude']
-        elif 'altitude' in message:
-            record_data['elevation'] = message['altitude']
-
-        if 'vertical_speed' in message:
-            record_data['vertical_speed'] = message['vertical_speed']
-
-        if 'enhanced_speed' in message:
-            record_data['speed'] = message['enhanced_speed']
-        elif 'speed' in message:
-            record_data['speed'] = message['speed']
-
-        if 'distance' in message:
-            record_data['distance'] = message['distance']
-        if 'heart_rate' in message:
-            record_data['heart_rate'] = message['heart_rate']
-        if 'cadence' in message:
-            record_data['cadence'] = message['cadence']
-
-        if 'enhanced_respiration_rate' in message:
-            record_data['respiration_rate'] = message['enhanced_respiration_rate']
-        elif 'respiration_rate' in message:
-            record_data['respiration_rate'] = message['respiration_rate']
-
-        if 'core_temperature' in message:
-            record_data['core_temperature'] = message['core_temperature']
-
-        if 'power' in message:
-            record_data['power'] = message['power']
-        if 'accumulated_power' in message:
-            record_data['accumulated_power'] = message['accumulated_power']
-
-        if 'grade' in message:
-            record_data['grade'] = message['grade']
-        if 'temperature' in message:
-            record_data['temperature'] = message['temperature']
-
-        if 'gps_accuracy' in message:
-            record_data['gps_accuracy'] = message['gps_accuracy']
-        if 'calories' in message:
-            record_data['calories'] = message['calories']
-
-        if 'left_right_balance' in message:
-            record_data['left_right_balance'] = message['left_right_balance']
-        if 'left_torque_effectiveness' in message:
-            record_data['left_torque_effectiveness'] = message['left_torque_effectiveness']
-        if 'right_torque_effectiveness' in message:
-            record_data['right_torque_effectiveness'] = message['right_torque_effectiveness']
-        if 'left_pedal_smoothness' in message:
-            record_data['left_pedal_smoothness'] = message['left_pedal_smoothness']
-        if 'right_pedal_smoothness' in message:
-            record_data['right_pedal_smoothness'] = message['right_pedal_smoothness']
-        if 'combined_pedal_smoothness' in message:
-            record_data['combined_pedal_smoothness'] = message['combined_pedal_smoothness']
-
-        if 'grit' in message:
-            record_data['grit'] = message['grit']
-        if 'flow' in message:
-            record_data['flow'] = message['flow']
-
-        track.upsert_point(timestamp, record_data)
-
-        cached_data = {}
-        point = track.get_point(timestamp)
+        for key, value in message.items():
+            field = _record_fields.get(key)
+            if field is None:
+                continue
+            name, scale, fallback = field
+            if fallback and name in record_data:
+                continue # enhanced_* variant already read
+            record_data[name] = value * scale if scale is not None else value
+
         for key,value in cache.items():
-            if point is None or key not in point:
-                cached_data[key] = value
-        if len(cached_data) > 0:
-            track.upsert_point(timestamp, cached_data)
+            if key not in record_data:
+                record_data[key] = value
+        rows.append((timestamp, record_data))
 
 
-    def _handle_event_message(self, message: dict, cache: dict[str, Value], track: Track) -> None:
+    def _handle_event_message(self, message: dict, cache: dict[str, Value], rows: Rows) -> None:
         if 'timestamp' not in message:
             logger.warning("EVENT message without timestamp field.")
             return
@@ -366,11 +392,12 @@ class FitReader(Reader):
 
         if len(data) > 0:
             timestamp = message['timestamp']
-            track.upsert_point(timestamp, data)
+            rows.append((timestamp, data))
             cache.update(data)
 
 
-    def _handle_climb_message(self, message: dict, cache: dict[str, Value], metacache: dict[str, Value], track: Track) -> None:
+    def _handle_climb_message(self, message: dict, cache: dict[str, Value], metacache: dict[str, Value],
+                              climb_fills: list[tuple[datetime.datetime|None, datetime.datetime, int]], rows: Rows, track: Track) -> None:
         if 'timestamp' not in message:
             logger.warning("ClimbPro message without timestamp field.")
             return
@@ -386,28 +413,17 @@ class FitReader(Reader):
         if message['climb_pro_event'] == 'start':
             climb = message['climb_number']
 
-            track.upsert_point(timestamp, {'active_climb': climb})
+            rows.append((timestamp, {'active_climb': climb}))
             cache['active_climb'] = climb
             metacache['climb_start'] = timestamp
         elif message['climb_pro_event'] == 'complete':
             if 'active_climb' not in cache:
-                logger.info("ClimbPro 'complete' event without ClimbPro 'start' event. Setting climb active from start.")
-                climb = message['climb_number']
-
-                start_timestamp: datetime.datetime|None = None
-                for t,r in track.points_iter:
-                    # get first timestamp as start timestamp
-                    if start_timestamp is None:
-                        start_timestamp = t
-
-                    # set active_climb for all points from start to current timestamp
-                    if t < timestamp:
-                        r['active_climb'] = climb
-                    else:
-                        break
-
-                if start_timestamp is not None:
-                    metacache['climb_start'] = start_timestamp
+                # points since the previous climb are marked once decoding is done, see _fill_climbs
+                previous_end = metacache.get('climb_end')
+                fill_start = previous_end if isinstance(previous_end, datetime.datetime) else None
+                since = "from start of track" if fill_start is None else f"after previous climb 'complete' event at {fill_start}"
+                logger.info(f"ClimbPro 'complete' event without ClimbPro 'start' event. Setting climb active {since} up to this event.")
+                climb_fills.append((fill_start, timestamp, message['climb_number']))
 
             if isinstance(metacache.get('climb_start', None), datetime.datetime) and isinstance(cache.get('active_climb', None), int):
                 segment_start = metacache['climb_start']
@@ -420,6 +436,8 @@ class FitReader(Reader):
                     'end_time': segment_end,
                 })
 
+            track.extend_points(rows) # the point of the event has to be in the track
+            rows.clear()
             point = track.get_point(timestamp)
             if point is not None and 'active_climb' in point:
                 del point['active_climb']
@@ -427,9 +445,19 @@ class FitReader(Reader):
                 del cache['active_climb']
             if 'climb_start' in metacache:
                 del metacache['climb_start']
+            metacache['climb_end'] = timestamp
+
+
+    @staticmethod
+    def _fill_climbs(climb_fills: list[tuple[datetime.datetime|None, datetime.datetime, int]], track: Track) -> None:
+        """Set active_climb on points strictly between the bounds of each recorded range, in one pass per range."""
+        for after, before, climb in climb_fills:
+            for t, point in track.range_iter(after, before):
+                if t != after and t != before:
+                    point['active_climb'] = climb
 
 
-    def _handle_jump_message(self, message: dict, track: Track) -> None:
+    def _handle_jump_message(self, message: dict, rows: Rows) -> None:
         if 'timestamp' not in message:
             logger.warning("JUMP message without timestamp field.")
             return
@@ -448,7 +476,7 @@ class FitReader(Reader):
             data['jump_score'] = message['score']
 
         if len(data) > 0:
-            track.upsert_point(message['timestamp'], data)
+            rows.append((message['timestamp'], data))
 
 
     def _handle_segment_lap_message(self, message: dict, track: Track) -> None:
@@ -0,0 +1,102 @@
+import json
+import mmap
+import struct
+
+from array import array
+from itertools import compress
+from pathlib import Path
+
+from ...utils.logger import logger
+from ..columnar_track import Column, ColumnarTrack, _from_us
+from ..compression import is_compressed, open_file
+from ..gpst_format import MAGIC, TYPED_KINDS, VERSION, decode_tz, decode_value, from_little_endian
+from ..track import Track, Value
+from .reader import Reader
+
+
+class GpstReader(Reader):
+    def read(self, path: Path, track_type: type[Track] = Track, points: bool = True) -> Track|None:
+        """Read binary columnar GPST file.
+
+        Uncompressed files are memory-mapped and column arrays are copied straight into
+        ColumnarTrack columns, points are not parsed one by one. Without points only the
+        header is read.
+        """
+        logger.debug(f"Reading GPST file '{path}'...")
+
+        try:
+            with open_file(path, "rb") as f:
+                if is_compressed(path):
+                    return self._decode(memoryview(f.read()), path, track_type, points)
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as buffer:
+                    return self._decode(buffer, path, track_type, points)
+        except Exception as e:
+            logger.error(f"Failed to read GPST file '{path}': {e}")
+            return None
+
+
+    def _decode(self, buffer: memoryview, path: Path, track_type: type[Track], points: bool) -> Track|None:
+        if buffer[:len(MAGIC)] != MAGIC:
+            logger.error(f"File '{path}' is not a GPST file.")
+            return None
+
+        offset = len(MAGIC)
+        (header_size,) = struct.unpack_from("<I", buffer, offset)
+        offset += 4
+        header = json.loads(bytes(buffer[offset:offset + header_size]))
+        offset += header_size
+        if header.get('version') != VERSION:
+            logger.error(f"Unsupported GPST file version {header.get('version')} in '{path}'.")
+            return None
+
+        track = track_type()
+        if points:
+            self._read_points(buffer, offset, header, track)
+
+        for key, value in header['metadata'].items():
+            track.set_metadata(key, decode_value(value))
+        for segment in header['segments']:
+            track.add_segment({key: decode_value(value) for key, value in segment.items()})
+        for key, curve in header['curves'].items():
+            track.set_curve(key, [(d, v) for d, v in curve])
+
+        return track
+
+
+    @staticmethod
+    def _read_points(buffer: memoryview, offset: int, header: dict, track: Track) -> None:
+        n = header['points']
+        tz = decode_tz(header['tz'])
+
+        def take(typecode: str) -> array:
+            nonlocal offset
+            values = array(typecode)
+            if offset + n * values.itemsize > len(buffer):
+                raise ValueError("file is truncated")
+            values.frombytes(buffer[offset:offset + n * values.itemsize])
+            offset += n * values.itemsize
+            return from_little_endian(values) if values.itemsize > 1 else values
+
+        timestamps = take('q')
+        columns: dict[str, Column] = {}
+        for info in header['columns']:
+            kind = info['kind']
+            column = Column(kind, 0, tz)
+            column.mask = bytearray(take('B'))
+            if kind in TYPED_KINDS:
+                column.values = take('d' if kind == 'd' else 'q')
+            else:
+                values = iter(info['values'])
+                column.values = [decode_value(next(values)) if m else None for m in column.mask]
+            columns[info['name']] = column
+
+        if isinstance(track, ColumnarTrack):
+            track._set_columns(timestamps, tz, columns)
+        else:
+            rows: list[dict[str, Value]] = [{} for _ in range(n)]
+            for key, column in columns.items():
+                values = (_from_us(us, tz) for us in column.values) if column.kind == 't' else column.values
+                for row, value in compress(zip(rows, values), column.mask):
+                    row[key] = value
+            for us, row in zip(timestamps, rows):
+                track._store_point(_from_us(us, tz), row)
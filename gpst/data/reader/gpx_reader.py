@@ -1,18 +1,26 @@
-import re
-import xml.etree.ElementTree as ET
-
+from collections.abc import Callable
 from datetime import datetime
+from functools import cache
 from pathlib import Path
 from types import SimpleNamespace
 
+from ..compression import open_file
+from ..gpx_fields import FieldTable, ADX_V11_FIELDS, TPX_V2_FIELDS
 from ..track import Track, Value, SegmentType
+from ..xml_backend import ET
+from .. import xml_backend
 from .reader import Reader
 from ...utils.logger import logger
 from ...utils.helpers import timestamp_from_str
 
 
 
+FieldHandler = Callable[[dict[str, Value], dict[str, str], str|None], None]
+
+
 class BaseParser:
+    fields: FieldTable = {} # plain field tags: tag -> (point field, type)
+
     def __init__(self, name: str = "BaseParser", raw_parser: bool = False):
         self._name: str = name
         self._raw_parser: bool = raw_parser
@@ -37,11 +45,43 @@ class BaseParser:
         return {}
 
 
+    def field_handler(self, tag: str) -> FieldHandler:
+        """Return function adding data of field element with given tag to point data.
+
+        Plain fields are converted directly, anything else - including invalid values, so they
+        are reported the same way - goes through parse_field().
+        """
+        parse_field = self.parse_field
+
+        def parse(data: dict[str, Value], attrib: dict[str, str], text: str|None) -> None:
+            data.update(parse_field(tag, attrib, text))
+
+        if tag not in self.fields:
+            return parse
+
+        key, convert = self.fields[tag]
+        def convert_field(data: dict[str, Value], attrib: dict[str, str], text: str|None) -> None:
+            try:
+                if text is not None:
+                    data[key] = convert(text)
+                    return
+            except ValueError:
+                pass
+            parse(data, attrib, text)
+
+        return convert_field
+
+
     def parse_raw(self, element: ET.Element, track: Track) -> None:
         logger.warning(f"Parser {self._name} does not support raw metadata parsing - ignoring: {element.tag}")
 
 
 class Gpx11Parser(BaseParser):
+    fields = {
+        "ele": ("elevation", float),
+        "power": ("power", float), # for handling Strava "power" field without proper namespace
+    }
+
     def __init__(self):
         super().__init__(name="Gpx11Parser")
 
@@ -93,18 +133,19 @@ class Gpx11Parser(BaseParser):
             data: dict[str, Value] = {}
 
             match tag:
-                case "ele":
-                    data["elevation"] = float(text)
                 case "time":
                     ts = timestamp_from_str(text)
                     if ts is not None:
                         data["timestamp"] = ts
                     else:
                         logger.warning(f"Invalid time format: '{text}'")
-                case "power":# for handling Strava "power" field without proper namespace
-                    data["power"] = float(text)
                 case _:
-                    logger.debug(f"Ignored GPX 1.1 field tag: \"{tag}\"")
+                    handler = self.fields.get(tag)
+                    if handler is not None:
+                        key, convert = handler
+                        data[key] = convert(text)
+                    else:
+                        logger.debug(f"Ignored GPX 1.1 field tag: \"{tag}\"")
 
             return data
         except ValueError as e:
@@ -115,6 +156,8 @@ class Gpx11Parser(BaseParser):
 
 
 class TpxV2Parser(BaseParser):
+    fields = TPX_V2_FIELDS
+
     def __init__(self):
         super().__init__(name="TpxV2Parser")
 
@@ -127,17 +170,12 @@ class TpxV2Parser(BaseParser):
         try:
             data: dict[str, Value] = {}
 
-            match tag:
-                case "atemp":
-                    data["temperature"] = float(text)
-                case "hr":
-                    data["heart_rate"] = float(text)
-                case "cad":
-                    data["cadence"] = int(text)
-                case "speed":
-                    data["speed"] = float(text)
-                case _:
-                    logger.debug(f"Ignored TPX V2 field tag: \"{tag}\"")
+            handler = self.fields.get(tag)
+            if handler is not None:
+                key, convert = handler
+                data[key] = convert(text)
+            else:
+                logger.debug(f"Ignored TPX V2 field tag: \"{tag}\"")
 
             return data
         except ValueError as e:
@@ -148,6 +186,10 @@ class TpxV2Parser(BaseParser):
 
 
 class GpxxV3Parser(BaseParser):
+    fields = {
+        "Temperature": ("temperature", float),
+    }
+
     def __init__(self):
         super().__init__(name="GpxxV3Parser")
 
@@ -160,11 +202,12 @@ class GpxxV3Parser(BaseParser):
         try:
             data: dict[str, Value] = {}
 
-            match tag:
-                case "Temperature":
-                    data["temperature"] = float(text)
-                case _:
-                    logger.debug(f"Ignored GPXX V3 field tag: \"{tag}\"")
+            handler = self.fields.get(tag)
+            if handler is not None:
+                key, convert = handler
+                data[key] = convert(text)
+            else:
+                logger.debug(f"Ignored GPXX V3 field tag: \"{tag}\"")
 
             return data
         except ValueError as e:
@@ -175,6 +218,8 @@ class GpxxV3Parser(BaseParser):
 
 
 class AdxV11Parser( BaseParser):
+    fields = ADX_V11_FIELDS
+
     def __init__(self):
         super().__init__(name="AdxV11Parser")
 
@@ -251,6 +296,10 @@ class AdxV11Parser( BaseParser):
                     data["max_temperature"] = float(text)
                 case "minatemp":
                     data["min_temperature"] = float(text)
+                case "smoothwindow":
+                    data["elevation_smoothing_window"] = float(text)
+                case "gradewindow":
+                    data["grade_calculation_window"] = float(text)
                 case _:
                     logger.debug(f"Ignored ADX V11 metadata tag: \"{tag}\"")
 
@@ -270,71 +319,12 @@ class AdxV11Parser( BaseParser):
         try:
             data: dict[str, Value] = {}
 
-            match tag:
-                case "timer":
-                    data["timer"] = float(text)
-                case  "smoothele":
-                    data["smooth_elevation"] = float(text)
-                case "dist":
-                    data["distance"] = float(text)
-                case "kcal":
-                    data["calories"] = float(text) 
-                case "rr":
-                    data["respiration_rate"] = float(text)
-                case "ctemp":
-                    data["core_temperature"] = float(text)
-                case "power":
-                    data["power"] = float(text)
-                case "power3s":
-                    data["power3s"] = float(text)
-                case "power10s":
-                    data["power10s"] = float(text)
-                case "power30s":
-                    data["power30s"] = float(text)
-                case "accpower":
-                    data["accumulated_power"] = float(text)
-                case "grade":
-                    data["grade"] = float(text)
-                case "asc":
-                    data["cumulative_ascent"] = float(text)
-                case "desc":
-                    data["cumulative_descent"] = float(text)
-                case "vspeed":
-                    data["vertical_speed"] = float(text)
-                case "ltrqeff":
-                    data["left_torque_effectiveness"] = float(text)
-                case "rtrqeff":
-                    data["right_torque_effectiveness"] = float(text)
-                case "lpdlsmooth":
-                    data["left_pedal_smoothness"] = float(text)
-                case "rpdlsmooth":
-                    data["right_pedal_smoothness"] = float(text)
-                case "cpdlsmooth":
-                    data["combined_pedal_smoothness"] = float(text)
-                case "grit":
-                    data["grit"] = float(text)
-                case "flow":
-                    data["flow"] = float(text)
-                case "climb":
-                    data["active_climb"] = int(text)
-                case "fgearnum":
-                    data["front_gear_num"] = int(text)
-                case "fgear":
-                    data["front_gear"] = int(text)
-                case "rgearnum":
-                    data["rear_gear_num"] = int(text)
-                case "rgear":
-                    data["rear_gear"] = int(text)
-                case "jumpdist":
-                    data["jump_distance"] = float(text)
-                case "jumpheight":
-                    data["jump_height"] = float(text)
-                case "jumptime":
-                    data["jump_hang_time"] = float(text)
-                case "jumpscore":
-                    data["jump_score"] = float(text)
-                case _:
-                    logger.debug(f"Ignored ADX V11 field tag: \"{tag}\"")
+            handler = self.fields.get(tag)
+            if handler is not None:
+                key, convert = handler
+                data[key] = convert(text)
+            else:
+                logger.debug(f"Ignored ADX V11 field tag: \"{tag}\"")
 
             return data
         except ValueError as e:
@@ -489,6 +479,52 @@ class AsxV11Parser(BaseParser):
         return {}
 
 
+class AcxV1Parser(BaseParser):
+    def __init__(self):
+        super().__init__(name="AcxV1Parser", raw_parser=True)
+
+
+    def parse_raw(self, element: ET.Element, track: Track) -> None:
+        if not element.tag.endswith("ActivityCurvesExtension"):
+            logger.warning(f"{self.name} received unexpected element with tag {element.tag}")
+
+        logger.debug("Parsing ACX V1 activity curves...")
+        for curve in element:
+            if not curve.tag.endswith("curve"):
+                logger.warning(f"{self.name} encountered unexpected curve element with tag {curve.tag}")
+                continue
+
+            key: str|None = None
+            points: list[tuple[int, float]] = []
+            for child in curve:
+                _, tag = _parse_tag(child.tag)
+                try:
+                    match tag:
+                        case "field":
+                            key = child.text
+                        case "point":
+                            points.append((int(child.attrib["duration"]), float(child.attrib["value"])))
+                        case _:
+                            logger.debug(f"Ignored ACX V1 curve tag: \"{child.tag}\"")
+                except Exception as e:
+                    logger.warning(f"Error parsing ACX V1 curve element \"{child.tag}\": {e}")
+
+            if key is None:
+                logger.warning("ACX V1 curve without field name, ignoring.")
+                continue
+
+            logger.trace(f"{self.name} curve {key}: {points}")
+            try:
+                track.set_curve(key, points)
+            except ValueError as e:
+                logger.warning(f"Invalid ACX V1 curve {key}: {e}")
+
+
+    def parse_field(self, tag: str, attrib: dict[str, str], text: str|None) -> dict[str, Value]:
+        logger.debug(f"Ignored ACX V1 field tag: \"{tag}\"")
+        return {}
+
+
 class Namespace:
     _ignore_prefixes = [
         "http://www.",
@@ -568,10 +604,15 @@ _namespace = {
     "asxv11": Namespace("ActivitySegmentsExtnsions v1.1", AsxV11Parser(),
                        "http://www.n3r1.com/xmlschemas/ActivitySegmentsExtensions/v11",
                        "http://www.n3r1.com/xmlschemas/ActivitySegmentsExtensionsv11.xsd"),
+
+    "acxv1": Namespace("ActivityCurvesExtensions v1", AcxV1Parser(),
+                       "http://www.n3r1.com/xmlschemas/ActivityCurvesExtensions/v1",
+                       "http://www.n3r1.com/xmlschemas/ActivityCurvesExtensionsv1.xsd"),
 }
 
 namespace = SimpleNamespace(**_namespace)
 
+@cache
 def get_namespace_by_url(url: str|None) -> Namespace|None:
     for ns in _namespace.values():
         if ns.match(url):
@@ -579,38 +620,102 @@ def get_namespace_by_url(url: str|None) -> Namespace|None:
     return None
 
 
+@cache
 def _parse_tag(tag: str) -> tuple[str|None, str]:
-    m = re.match(r'^\{(?P<url>[^}]*)\}(?P<tag>.+)$', tag)
-    if m:
-        return m.group('url'), m.group('tag')
+    if tag.startswith("{") and "}" in tag:
+        url, _, name = tag[1:].partition("}")
+        if name:
+            return url, name
     return None, tag
 
 
+@cache
+def _gpx_tag(tag: str) -> str|None:
+    """Local name of GPX 1.1 element tag or None for other namespaces."""
+    url, name = _parse_tag(tag)
+    return name if namespace.gpx11.match(url) else None
+
+
+def _is_gpx(element: ET.Element, tag: str) -> bool:
+    return _gpx_tag(element.tag) == tag
+
+
+_field_handlers: dict[str, FieldHandler] = {} # resolved track point field tags in Clark notation: {url}tag
+
+def _field_handler(tag: str) -> FieldHandler:
+    handler = _field_handlers.get(tag)
+    if handler is None:
+        url, name = _parse_tag(tag)
+        ns = get_namespace_by_url(url)
+        if ns is None:
+            def handler(data: dict[str, Value], attrib: dict[str, str], text: str|None) -> None:
+                logger.warning(f"Unsupported track point tag: \"{tag}\"")
+        else:
+            handler = ns.parser.field_handler(name)
+        _field_handlers[tag] = handler
+    return handler
+
+
 class GpxReader(Reader):
-    def read(self, path: Path) -> Track|None:
-        track = Track()
+    _trace: bool = False # trace logging enabled, checked once per file
+
+    def read(self, path: Path, track_type: type[Track] = Track, points: bool = True) -> Track|None:
+        """Read GPX 1.1 file with a streaming parser.
+
+        Elements are handled as soon as they are complete and then dropped from the tree -
+        track point data is collected and added to the track in one batch, so memory use
+        follows the size of the track rather than the size of the XML document. Without
+        points track points are dropped unparsed.
+        """
+        track = track_type()
+        self._trace = logger.trace_enabled()
 
         try:
-            logger.debug(f"Parsing GPX file '{path}'...")
-            tree = ET.parse(path)
-            root = tree.getroot()
-
-            url, tag = _parse_tag(root.tag)
-            if not namespace.gpx11.match(url) or tag != "gpx":
-                logger.error(f"File '{path}' is not a GPX 1.1 file (root tag: {{{url}}}{tag} expected: {{{namespace.gpx11.url}}}gpx)")
-                return None  # not a GPX 1.1 file
-
-            for child in root:
-                url, tag = _parse_tag(child.tag)
-                if namespace.gpx11.match(url) and tag == "metadata":
-                    self._parse_metadata(child, track)
-                elif namespace.gpx11.match(url) and tag == "trk":
-                    self._parse_track(child, track)
+            logger.debug(f"Parsing GPX file '{path}' with {xml_backend.NAME} XML backend...")
+            stack: list[ET.Element] = [] # open elements: gpx, trk, trkseg, ...
+            rows: list[tuple[datetime, dict[str, Value]]] = [] # track point data for Track.extend_points
+
+            with open_file(path, "rb") as f:
+                for event, element in xml_backend.iterparse(f, events=("start", "end")):
+                    if event == "start":
+                        if not stack:
+                            url, tag = _parse_tag(element.tag)
+                            if not namespace.gpx11.match(url) or tag != "gpx":
+                                logger.error(f"File '{path}' is not a GPX 1.1 file (root tag: {{{url}}}{tag} expected: {{{namespace.gpx11.url}}}gpx)")
+                                return None  # not a GPX 1.1 file
+                        elif len(stack) == 1 and _is_gpx(element, "trk"):
+                            logger.debug("Parsing GPX track...")
+                        elif len(stack) == 2 and _is_gpx(stack[1], "trk") and _is_gpx(element, "trkseg"):
+                            logger.debug("Parsing GPX track segment...")
+                        stack.append(element)
+                        continue
 
+                    stack.pop()
+                    depth = len(stack)
+                    if depth == 1: # gpx child
+                        if _is_gpx(element, "metadata"):
+                            self._parse_metadata(element, track)
+                        stack[0].remove(element)
+                    elif depth == 2 and _is_gpx(stack[1], "trk"): # trk child
+                        if not _is_gpx(element, "trkseg"):
+                            self._parse_track_child(element, track)
+                        stack[1].remove(element)
+                    elif depth == 3 and _is_gpx(stack[1], "trk") and _is_gpx(stack[2], "trkseg"): # trkseg child
+                        if _is_gpx(element, "trkpt"):
+                            if points:
+                                self._parse_track_point(element, rows)
+                        else:
+                            logger.warning(f"Unsupported track segment tag: \"{element.tag}\"")
+                        stack[2].remove(element)
+
+            track.extend_points(rows)
             return track
         except ET.ParseError as e:
             logger.error(f"Failed to parse GPX file '{path}': {e}")
             return None
+        except (OSError, EOFError) as e:
+            logger.error(f"Failed to read GPX file '{path}': {e}")
+            return None
 
 
     def _parse_metadata(self, element: ET.Element, track: Track):
@@ -630,39 +735,24 @@ class GpxReader(Reader):
                 track.set_metadata(key, value)
 
 
-    def _parse_track(self, element: ET.Element, track: Track):
-        logger.debug("Parsing GPX track...")
-
-        for child in element:
-            url, tag = _parse_tag(child.tag)
-            if namespace.gpx11.match(url) and tag == "trkseg":
-                self._parse_track_segment(child, track)
-            elif namespace.gpx11.match(url) and tag == "extensions":
-                self._parse_track_extensions(child, track)
-            else:
-                ns = get_namespace_by_url(url)
-                if ns is None:
-                    logger.warning(f"Unsupported track tag: \"{child.tag}\"")
-                    continue
-                data = ns.parser.parse_metadata(tag, child.attrib, child.text)
-                logger.trace(f"Metadata from tag {{{url}}}{tag}: {data}")
-                for key, value in data.items():
-                    track.set_metadata(key, value)
-
-
-    def _parse_track_segment(self, element: ET.Element, track: Track):
-        logger.debug("Parsing GPX track segment...")
-
-        for child in element:
-            url, tag = _parse_tag(child.tag)
-            if namespace.gpx11.match(url) and tag == "trkpt":
-                self._parse_track_point(child, track)
-            else:
-                logger.warning(f"Unsupported track segment tag: \"{child.tag}\"")
+    def _parse_track_child(self, element: ET.Element, track: Track):
+        url, tag = _parse_tag(element.tag)
+        if namespace.gpx11.match(url) and tag == "extensions":
+            self._parse_track_extensions(element, track)
+        else:
+            ns = get_namespace_by_url(url)
+            if ns is None:
+                logger.warning(f"Unsupported track tag: \"{element.tag}\"")
+                return
+            data = ns.parser.parse_metadata(tag, element.attrib, element.text)
+            logger.trace(f"Metadata from tag {{{url}}}{tag}: {data}")
+            for key, value in data.items():
+                track.set_metadata(key, value)
 
 
-    def _parse_track_point(self, element: ET.Element, track: Track):
-        logger.trace("Parsing GPX track point...")
+    def _parse_track_point(self, element: ET.Element, rows: list[tuple[datetime, dict[str, Value]]]):
+        if self._trace:
+            logger.trace("Parsing GPX track point...")
 
         lat = element.get("lat")
         lon = element.get("lon")
@@ -679,51 +769,32 @@ class GpxReader(Reader):
             logger.warning(f"Invalid latitude or longitude values: lat='{lat}', lon='{lon}'")
             return
         
-        for child in element:
-            url, tag = _parse_tag(child.tag)
-            ns = get_namespace_by_url(url)
+        self._parse_track_point_fields(element, data)
 
-            if ns is None:
-                logger.warning(f"Unsupported track point tag: \"{child.tag}\"")
-                continue
-
-            if len(child) == 0:
-                field_data = ns.parser.parse_field(tag, child.attrib, child.text)
-                logger.trace(f"Field data from tag {{{url}}}{tag}: {field_data}")
-                data.update(field_data)
-            else:
-                d = self._parse_track_point_extensions(child)
-                data.update(d)
-        
         if "timestamp" not in data or not isinstance(data["timestamp"], datetime):
             logger.warning("Track point missing timestamp field.")
             return
         
-        track.upsert_point(data["timestamp"], data)
+        rows.append((data["timestamp"], data))
 
 
-    def _parse_track_point_extensions(self, element: ET.Element) -> dict[str, Value]:
-        logger.trace("Parsing GPX track point extensions...")
-
-        data: dict[str, Value] = {}
+    def _parse_track_point_fields(self, element: ET.Element, data: dict[str, Value]) -> None:
+        """Add fields of track point or its extension element to point data.
 
+        Every distinct tag is resolved once to a field handler, so a field costs a dict lookup.
+        """
+        handlers = _field_handlers
         for child in element:
-            url, tag = _parse_tag(child.tag)
-            ns = get_namespace_by_url(url)
-
-            if ns is None:
-                logger.warning(f"Unsupported track point extension tag: \"{child.tag}\"")
-                continue
-
             if len(child) == 0:
-                field_data = ns.parser.parse_field(tag, child.attrib, child.text)
-                logger.trace(f"Field data from tag {{{url}}}{tag}: {field_data}")
-                data.update(field_data)
+                (handlers.get(child.tag) or _field_handler(child.tag))(data, child.attrib, child.text)
+                if self._trace:
+                    logger.trace(f"Field from tag {child.tag}: \"{child.text}\"")
+            elif get_namespace_by_url(_parse_tag(child.tag)[0]) is None:
+                logger.warning(f"Unsupported track point extension tag: \"{child.tag}\"")
             else:
-                d = self._parse_track_point_extensions(child)
-                data.update(d)
-
-        return data
+                if self._trace:
+                    logger.trace("Parsing GPX track point extensions...")
+                self._parse_track_point_fields(child, data)
 
 
     def _parse_track_extensions(self, element: ET.Element, track: Track):
@@ -5,5 +5,6 @@ from ..track import Track
 
 class Reader(ABC):
     @abstractmethod
-    def read(self, path: Path) -> Track|None:
+    def read(self, path: Path, track_type: type[Track] = Track, points: bool = True) -> Track|None:
+        """Read track from file, without points only the data stored apart from track points is read."""
         pass
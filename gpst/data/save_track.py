@@ -1,17 +1,19 @@
 
 from pathlib import Path
 
+from .compression import track_suffix
 from .track import Track
-from .writer import Writer, GpxWriter
+from .writer import Writer, GpxWriter, GpstWriter, Precision
 
 
 _writers = {
-    '.gpx': GpxWriter()
+    '.gpx': GpxWriter(),
+    '.gpst': GpstWriter(),
 }
 
 
-def save_track(track: Track, path: Path) -> bool:
-    writer: Writer|None = _writers.get(path.suffix.lower())
+def save_track(track: Track, path: Path, precision: Precision = Precision.LOSSLESS) -> bool:
+    writer: Writer|None = _writers.get(track_suffix(path))
     if writer is None:
-        raise ValueError(f"Unsupported file extension '{path.suffix}'")
-    return writer.write(track, path)
+        raise ValueError(f"Unsupported file extension '{''.join(path.suffixes)}'")
+    return writer.write(track, path, precision)
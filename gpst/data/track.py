@@ -1,7 +1,10 @@
+import math
+
+from bisect import bisect_left, bisect_right, insort
 from dataclasses import dataclass
 from datetime import datetime
 from enum import StrEnum
-from typing import Iterable, TypeAlias
+from typing import Iterable, Iterator, Mapping, MutableMapping, TypeAlias, TypeGuard, cast
 
 from ..utils.helpers import to_string, timestamp_str
 from ..utils.logger import logger
@@ -156,6 +159,8 @@ metadata_fields = {
     'sub_sport':                        string_t,
     'name':                             string_t,
     'device':                           string_t,
+    'elevation_smoothing_window':       distance_t, # calculation parameters the derived data was calculated with
+    'grade_calculation_window':         distance_t,
 }
 
 
@@ -219,22 +224,99 @@ segment_fields = {
 }
 
 
+_EXACT_SHIFT = 1074 # any finite float is an integer multiple of 2**-1074
+
+
+def _finite(value: object) -> TypeGuard[int | float]:
+    """Numeric value usable in window sums, NaN and infinities count as missing."""
+    return isinstance(value, int) or (isinstance(value, float) and math.isfinite(value))
+
+
+def _exact(value: int | float) -> int:
+    """Scale value to an exact integer so window sums can be updated without rounding drift."""
+    n, d = value.as_integer_ratio()
+    return n << (_EXACT_SHIFT - d.bit_length() + 1)
+
+
+class Window:
+    """Lightweight view of points [start, end) of a sorted point sequence."""
+
+    __slots__ = ('_seq', 'start', 'end', '_sums')
+
+    def __init__(self, seq: list[tuple[datetime, MutableMapping]], start: int, end: int,
+                 sums: dict[str, tuple[int, int]]) -> None:
+        self._seq = seq
+        self.start = start
+        self.end = end
+        self._sums = sums
+
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+
+    def __iter__(self) -> Iterator[MutableMapping]:
+        for i in range(self.start, self.end):
+            yield self._seq[i][1]
+
+
+    def __reversed__(self) -> Iterator[MutableMapping]:
+        for i in range(self.end - 1, self.start - 1, -1):
+            yield self._seq[i][1]
+
+
+    def __getitem__(self, i: int) -> MutableMapping:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("window index out of range")
+        return self._seq[self.start + i][1]
+
+
+    def sum(self, key: str) -> float:
+        return self._sums[key][0] / (1 << _EXACT_SHIFT)
+
+
+    def count(self, key: str) -> int:
+        return self._sums[key][1]
+
+
+    def mean(self, key: str) -> float | None:
+        total, count = self._sums[key]
+        return total / (count << _EXACT_SHIFT) if count > 0 else None
+
+
 class Track:
     def __init__(self) -> None:
         self._points: dict[datetime, dict[str, Value]] = {}
+        self._index: list[datetime] = [] # sorted timestamps of _points
         self._metadata: dict[str, Value] = {}
         self._segments: list[tuple[datetime, dict[str, Value]]] = []
+        self._curves: dict[str, list[tuple[int, float]]] = {} # point field: [(duration in seconds, best average)]
+        self._dirty: dict[str, tuple[datetime | None, datetime | None]] = {} # changed field: (start, end) of the change
 
 
     @property
-    def points(self) -> dict[datetime, dict[str, Value]]:
+    def points(self) -> Mapping[datetime, MutableMapping[str, Value]]:
         return self._points
 
 
     @property
-    def points_iter(self) -> Iterable[tuple[datetime, dict[str, Value]]]:
-        for ts in sorted(self._points.keys()):
-            yield ts, self._points[ts]
+    def points_iter(self) -> Iterable[tuple[datetime, MutableMapping[str, Value]]]:
+        points = self._points
+        for ts in self._index:
+            yield ts, points[ts]
+
+
+    def range_iter(self, start: datetime | None = None, end: datetime | None = None) -> Iterable[tuple[datetime, MutableMapping[str, Value]]]:
+        """Iterate points with start <= timestamp <= end in timestamp order, a missing bound is open."""
+        lo = bisect_left(self._index, start) if start is not None else 0
+        hi = bisect_right(self._index, end) if end is not None else len(self._index)
+        points = self._points
+        index = self._index
+        for i in range(lo, hi):
+            ts = index[i]
+            yield ts, points[ts]
 
 
     @property
@@ -247,6 +329,17 @@ class Track:
         return self._segments
 
 
+    @property
+    def curves(self) -> dict[str, list[tuple[int, float]]]:
+        return self._curves
+
+
+    @property
+    def dirty(self) -> Mapping[str, tuple[datetime | None, datetime | None]]:
+        """Point fields and metadata keys changed since the last calculation, with the changed time range."""
+        return self._dirty
+
+
     @property
     def segments_iter(self) -> Iterable[tuple[datetime, dict[str, Value]]]:
         for ts, segment in sorted(self._segments, key=lambda x: x[0]):
@@ -261,50 +354,135 @@ class Track:
             data.append(f"start_time=\"{to_string(self._metadata.get('start_time'))}\"")
         if 'end_time' in self._metadata:
             data.append(f"end_time=\"{to_string(self._metadata.get('end_time'))}\"")
-        data.append(f"num_points={len(self._points)}")
+        data.append(f"num_points={len(self.points)}")
 
         return f"Track({', '.join(data)})"
 
-    def get_point(self, timestamp: datetime) -> dict[str, Value] | None:
+    def get_point(self, timestamp: datetime) -> MutableMapping[str, Value] | None:
         return self._points.get(timestamp)
 
 
-    def sliding_window_iter(self, key: str, size: float) -> Iterable[tuple[datetime, dict, list[dict]]]:
-        def in_window(point: dict, target: float) -> bool:
-            value = point.get(key)
-            if isinstance(value, (int, float)):
-                delta: float = abs(value - target)
-                return delta <= (size / 2.0)
-            return False
+    def slice(self, start: datetime | None = None, end: datetime | None = None) -> 'Track':
+        """Return a new track of the same type with copies of points between start and end (inclusive).
 
-        seq = [(ts, point) for ts, point in self.points_iter]
+        Only segments lying entirely within the range are carried over. Metadata is not copied
+        as totals and bounds of the original track do not apply to the slice.
+        """
+        track = type(self)()
+        for ts, point in self.range_iter(start, end):
+            track._store_point(ts, dict(point))
 
-        for i, (ts, cur) in enumerate(self.points_iter):
-            value = cur.get(key, None)
-            if value is None:
-                logger.trace(f"Point without {key} field in sliding window calculation. Skipping.")
+        for _, segment in self._segments:
+            seg_start = segment.get('start_time')
+            seg_end = segment.get('end_time')
+            if not isinstance(seg_start, datetime) or not isinstance(seg_end, datetime):
                 continue
+            if (start is None or seg_start >= start) and (end is None or seg_end <= end):
+                track.add_segment(dict(segment))
 
-            if not isinstance(value, (int, float)):
-                logger.trace(f"Point with non-numeric {key} field in sliding window calculation. Skipping.")
-                continue
+        return track
 
-            # backward until condition fails
-            left = []
-            j = i - 1
-            while j >= 0 and in_window(seq[j][1], value):
-                left.append(seq[j][1])
-                j -= 1
-            left.reverse()
 
-            # forward until condition fails
-            right = []
-            k = i + 1
-            while k < len(seq) and in_window(seq[k][1], value):
-                right.append(seq[k][1])
-                k += 1
+    def sliding_window_iter(self, key: str, size: float, sums: Iterable[str] = ()) -> Iterable[tuple[datetime, MutableMapping, Window]]:
+        """Yield every point with a numeric `key` together with the window of neighbouring points.
 
-            yield ts, cur, left + [cur] + right
+        The window is the contiguous run of points around the current one whose `key` differs
+        from the current value by at most size/2. Windows over non-decreasing runs of `key`
+        (e.g. distance) are found with two pointers and keep exact running sum/count
+        accumulators for the fields listed in `sums`, so Window.mean() is O(1).
+        """
+        half = size / 2.0
+        sum_keys = tuple(sums)
+        seq = list(self.points_iter)
+        values: list[float | None] = []
+        for _, point in seq:
+            value = point.get(key)
+            values.append(value if isinstance(value, (int, float)) else None)
+        finite = [_finite(value) for value in values]
+
+        n = len(seq)
+        i = 0
+        trace = logger.trace_enabled()
+        while i < n:
+            if values[i] is None:
+                if trace:
+                    logger.trace(f"Point without numeric {key} field in sliding window calculation. Skipping.")
+                i += 1
+                continue
+            if not finite[i]: # NaN or infinite key, the window is the point itself
+                ts, cur = seq[i]
+                own = {k: (_exact(v), 1) if _finite(v := cur.get(k)) else (0, 0) for k in sum_keys}
+                yield ts, cur, Window(seq, i, i + 1, own)
+                i += 1
+                continue
+
+            # points without finite numeric key break the window - process run of numeric values [a, b)
+            a = i
+            b = i
+            monotonic = True
+            while b < n and finite[b]:
+                if b > a and values[b] < values[b-1]: # type: ignore[operator]
+                    monotonic = False
+                b += 1
+
+            if monotonic:
+                yield from self._window_run_two_pointer(seq, values, a, b, half, sum_keys)
+            else:
+                yield from self._window_run_scan(seq, values, a, b, half, sum_keys)
+            i = b
+
+
+    @staticmethod
+    def _window_run_two_pointer(seq: list[tuple[datetime, MutableMapping]], values: list, a: int, b: int,
+                                half: float, sum_keys: tuple[str, ...]) -> Iterable[tuple[datetime, MutableMapping, Window]]:
+        acc = {k: [0, 0] for k in sum_keys} # exact sum, count
+        lo = a
+        hi = a
+        for i in range(a, b):
+            value = values[i]
+
+            while hi < b and values[hi] - value <= half:
+                point = seq[hi][1]
+                for k, kacc in acc.items():
+                    v = point.get(k)
+                    if _finite(v):
+                        kacc[0] += _exact(v)
+                        kacc[1] += 1
+                hi += 1
+
+            while value - values[lo] > half:
+                point = seq[lo][1]
+                for k, kacc in acc.items():
+                    v = point.get(k)
+                    if _finite(v):
+                        kacc[0] -= _exact(v)
+                        kacc[1] -= 1
+                lo += 1
+
+            ts, cur = seq[i]
+            yield ts, cur, Window(seq, lo, hi, {k: (kacc[0], kacc[1]) for k, kacc in acc.items()})
+
+
+    @staticmethod
+    def _window_run_scan(seq: list[tuple[datetime, MutableMapping]], values: list, a: int, b: int,
+                         half: float, sum_keys: tuple[str, ...]) -> Iterable[tuple[datetime, MutableMapping, Window]]:
+        for i in range(a, b):
+            value = values[i]
+
+            lo = i
+            while lo > a and abs(values[lo-1] - value) <= half:
+                lo -= 1
+            hi = i + 1
+            while hi < b and abs(values[hi] - value) <= half:
+                hi += 1
+
+            acc: dict[str, tuple[int, int]] = {}
+            for k in sum_keys:
+                numeric = [_exact(v) for _, p in seq[lo:hi] if _finite(v := p.get(k))]
+                acc[k] = (sum(numeric), len(numeric))
+
+            ts, cur = seq[i]
+            yield ts, cur, Window(seq, lo, hi, acc)
 
 
     def upsert_point(self, timestamp: datetime, data: dict[str, Value]) -> None:
@@ -322,9 +500,65 @@ class Track:
                 data[key] = float(data[key])  # type: ignore[arg-type]
 
             self._verify_type(key, data[key], point_fields.get(key), timestamp)
-        if timestamp not in self._points:
-            self._points[timestamp] = {}
-        self._points[timestamp].update(data)
+        self._store_point(timestamp, data)
+
+
+    def extend_points(self, rows: Iterable[tuple[datetime, dict[str, Value]]], strict: bool = False) -> None:
+        """Add or update many points at once, like upsert_point for each (timestamp, data) row.
+
+        Values are checked field by field over all rows and problems are logged once per field
+        with the number of points affected. With strict=True problems raise ValueError and no
+        point is stored and rows are left unchanged. Otherwise row dictionaries are taken over by
+        the track.
+        """
+        rows = rows if isinstance(rows, list) else list(rows)
+        if not rows:
+            return
+        if not all(issubclass(t, datetime) for t in {type(ts) for ts, _ in rows}):
+            raise TypeError("Timestamps must be datetime objects.")
+        datas = [data for _, data in rows]
+        if not all(issubclass(t, dict) for t in set(map(type, datas))):
+            raise TypeError("Point data must be dictionaries.")
+
+        keys = set().union(*datas)
+        problems: list[str] = []
+        for key in keys:
+            problems += self._verify_column(key, datas, point_fields.get(key))
+        if problems:
+            if strict:
+                raise ValueError(" ".join(problems))
+            for problem in problems:
+                logger.warning(problem)
+
+        for key in keys:
+            self._coerce_column(key, datas, point_fields.get(key))
+        self._store_points(rows)
+
+
+    def _store_point(self, timestamp: datetime, data: dict[str, Value]) -> None:
+        point = self._points.get(timestamp)
+        if point is None:
+            point = self._points[timestamp] = {}
+            if not self._index or timestamp > self._index[-1]:
+                self._index.append(timestamp) # readers insert in order - fast path
+            else:
+                insort(self._index, timestamp)
+        point.update(data)
+
+
+    def _store_points(self, rows: list[tuple[datetime, dict[str, Value]]]) -> None:
+        points = self._points
+        index = self._index
+        for timestamp, data in rows:
+            point = points.get(timestamp)
+            if point is not None:
+                point.update(data)
+                continue
+            points[timestamp] = data # new point keeps the row dictionary
+            if not index or timestamp > index[-1]:
+                index.append(timestamp)
+            else:
+                insort(index, timestamp)
 
 
     def remove_point_fields(self, fields: list[str]) -> None:
@@ -350,6 +584,27 @@ class Track:
                 del self._metadata[key]
 
 
+    def mark_dirty(self, keys: str | list[str], start: datetime | None = None, end: datetime | None = None) -> None:
+        """Record that `keys` changed between start and end (inclusive, a missing bound is open).
+
+        Data derived from dirty fields is invalidated and recalculated by the next
+        calculate_additional_data() call.
+        """
+        if isinstance(keys, str):
+            keys = [keys]
+        for key in keys:
+            key_start, key_end = start, end
+            if key in self._dirty:
+                old_start, old_end = self._dirty[key]
+                key_start = None if key_start is None or old_start is None else min(key_start, old_start)
+                key_end = None if key_end is None or old_end is None else max(key_end, old_end)
+            self._dirty[key] = (key_start, key_end)
+
+
+    def clear_dirty(self) -> None:
+        self._dirty.clear()
+
+
     def add_segment(self, data: dict[str, Value]) -> None:
         if not isinstance(data, dict):
             raise TypeError(f"Data must be a dictionary, got {type(data)}.")
@@ -370,21 +625,91 @@ class Track:
         self._segments.append((timestamp, data))
 
 
-    def _verify_type(self, key: str, value: Value, type_info: Type | None, timestamp: datetime|None = None) -> None:
-        tstr = f" at {timestamp_str(timestamp)}" if timestamp else ""
+    def set_curve(self, key: str, curve: list[tuple[int, float]]) -> None:
+        if key not in point_fields:
+            logger.warning(f"Curve for unknown point field '{key}'.")
+        if any(not isinstance(d, int) or d <= 0 for d, _ in curve):
+            raise ValueError(f"Curve '{key}' durations must be positive integers.")
+
+        self._curves[key] = [(d, float(v)) for d, v in curve]
+
 
+    def _verify_type(self, key: str, value: Value, type_info: Type | None, timestamp: datetime|None = None) -> None:
         if not type_info:
-            logger.warning(f"Unknown field '{key}'{tstr}.")
+            logger.warning(f"Unknown field '{key}'{self._at(timestamp)}.")
             return
 
         if type_info.pytype and (not isinstance(value, type_info.pytype)):
-            logger.warning(f"Incorrect type for '{key}'{tstr}: expected {type_info.pytype}, got {type(value)}.")
+            logger.warning(f"Incorrect type for '{key}'{self._at(timestamp)}: expected {type_info.pytype}, got {type(value)}.")
             return
         
         if isinstance(value, (int, float)) and type_info.min_value is not None and value < type_info.min_value:
-            logger.warning(f"Value for '{key}'{tstr} below minimum: {value} < {type_info.min_value}.")
+            logger.warning(f"Value for '{key}'{self._at(timestamp)} below minimum: {value} < {type_info.min_value}.")
             return
         
         if isinstance(value, (int, float)) and type_info.max_value is not None and value > type_info.max_value:
-            logger.warning(f"Value for '{key}'{tstr} above maximum: {value} > {type_info.max_value}.")
+            logger.warning(f"Value for '{key}'{self._at(timestamp)} above maximum: {value} > {type_info.max_value}.")
+            return
+
+
+    @staticmethod
+    def _verify_column(key: str, datas: list[dict[str, Value]], type_info: Type | None) -> list[str]:
+        """Check values of one field over many points, returns problems found.
+
+        Types are compared per distinct type and bounds against the column minimum and maximum,
+        values are only visited one by one to count the points with problems. Ints of float
+        fields are checked as the floats _coerce_column stores, without changing the points.
+        """
+        values = [data[key] for data in datas if key in data]
+        if not type_info:
+            return [f"Unknown field '{key}' in {len(values)} points."]
+        pytype = type_info.pytype
+        if not pytype:
+            return []
+
+        types = set(map(type, values))
+        if pytype == float and any(issubclass(t, int) for t in types):
+            values = [float(value) if isinstance(value, int) else value for value in values]
+            types = set(map(type, values))
+
+        problems: list[str] = []
+        wrong = sorted(t.__name__ for t in types if not issubclass(t, pytype))
+        if wrong:
+            count = len(values)
+            values = [value for value in values if isinstance(value, pytype)]
+            problems.append(f"Incorrect type for '{key}' in {count - len(values)} points: expected {pytype}, got {', '.join(wrong)}.")
+        min_value, max_value = type_info.min_value, type_info.max_value
+        if not values or (min_value is None and max_value is None):
+            return problems
+
+        numbers = cast(list[int | float], values) # bounds are only set for int and float fields
+        if min_value is not None:
+            lowest = min(numbers) # NaN may hide lower values, check one by one then
+            if lowest != lowest or lowest < min_value:
+                below = [value for value in numbers if value < min_value]
+                if below:
+                    problems.append(f"Values for '{key}' below minimum in {len(below)} points: {min(below)} < {min_value}.")
+        if max_value is not None:
+            highest = max(numbers)
+            if highest != highest or highest > max_value:
+                above = [value for value in numbers if value > max_value]
+                if above:
+                    problems.append(f"Values for '{key}' above maximum in {len(above)} points: {max(above)} > {max_value}.")
+        return problems
+
+
+    @staticmethod
+    def _coerce_column(key: str, datas: list[dict[str, Value]], type_info: Type | None) -> None:
+        """Convert ints of a float field to float in the points, as upsert_point does."""
+        if type_info is None or type_info.pytype != float:
             return
+        for data in datas:
+            value = data.get(key)
+            if isinstance(value, int):
+                data[key] = float(value)
+
+
+    @staticmethod
+    def _at(timestamp: datetime | None) -> str:
+        """Timestamp part of warnings, formatted only when a warning is logged."""
+        return f" at {timestamp_str(timestamp)}" if timestamp else ""
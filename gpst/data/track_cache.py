@@ -0,0 +1,96 @@
+"""Opt-in on-disk cache of decoded tracks.
+
+Enabled by setting GPST_CACHE_DIR (or the --cache-dir option of the gpst command). Tracks
+read from FIT and GPX files are stored in the binary GPST format under a key derived from
+the file content hash, size, modification time and gpst version, so later loads of the same
+file skip decoding. Tracks with timestamps the GPST format cannot store exactly (mixed UTC
+offsets, zoneinfo time zones) are not cached, so a cache hit always matches a fresh decode. Least
+recently used entries are removed once the cache grows over GPST_CACHE_SIZE_MB megabytes.
+"""
+import hashlib
+import os
+
+from pathlib import Path
+
+from .. import __version__
+from ..utils.logger import logger
+from .gpst_format import representable
+from .reader import GpstReader
+from .track import Track
+from .writer import GpstWriter
+
+
+DEFAULT_SIZE_MB = 512
+
+
+class TrackCache:
+    def __init__(self, directory: Path, max_size: int) -> None:
+        self.directory = directory
+        self.max_size = max_size # bytes
+        self._reader = GpstReader()
+        self._writer = GpstWriter()
+
+
+    def key(self, path: Path) -> str:
+        stat = path.stat()
+        with open(path, "rb") as f:
+            digest = hashlib.file_digest(f, "sha256").hexdigest()
+        return hashlib.sha256(f"{digest}:{stat.st_size}:{stat.st_mtime_ns}:{__version__}".encode()).hexdigest()
+
+
+    def get(self, key: str, track_type: type[Track]) -> Track | None:
+        entry = self.directory / f"{key}.gpst"
+        if not entry.exists():
+            return None
+        track = self._reader.read(entry, track_type)
+        if track is None:
+            entry.unlink(missing_ok=True)
+            return None
+        os.utime(entry) # mark as recently used
+        return track
+
+
+    def put(self, key: str, track: Track) -> None:
+        if not representable(track):
+            logger.debug("Not caching track with timestamps the GPST format cannot store exactly.")
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        entry = self.directory / f"{key}.gpst"
+        tmp = self.directory / f".{key}.{os.getpid()}.gpst" # written aside, so readers never see a partial entry
+        if not self._writer.write(track, tmp):
+            tmp.unlink(missing_ok=True)
+            return
+        os.replace(tmp, entry)
+        self._evict()
+
+
+    def _evict(self) -> None:
+        entries = []
+        for entry in self.directory.glob("*.gpst"):
+            if entry.name.startswith("."):
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_mtime_ns, stat.st_size, entry))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.max_size:
+                break
+            logger.debug(f"Evicting '{entry.name}' from track cache.")
+            entry.unlink(missing_ok=True)
+            total -= size
+
+
+def track_cache() -> TrackCache | None:
+    """Track cache configured by environment, None when caching is disabled."""
+    directory = os.getenv("GPST_CACHE_DIR")
+    if not directory:
+        return None
+
+    size = os.getenv("GPST_CACHE_SIZE_MB", str(DEFAULT_SIZE_MB))
+    try:
+        max_size = int(float(size) * 1024 * 1024)
+    except ValueError:
+        logger.warning(f"Invalid GPST_CACHE_SIZE_MB value '{size}', using {DEFAULT_SIZE_MB}.")
+        max_size = DEFAULT_SIZE_MB * 1024 * 1024
+    return TrackCache(Path(directory), max_size)
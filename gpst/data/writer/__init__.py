@@ -1,2 +1,3 @@
-from .writer import Writer
+from .writer import Writer, Precision
 from .gpx_writer import GpxWriter
+from .gpst_writer import GpstWriter
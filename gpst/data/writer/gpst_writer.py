@@ -0,0 +1,66 @@
+import json
+import os
+import struct
+
+from pathlib import Path
+
+from ..columnar_track import ColumnarTrack
+from ..compression import open_file
+from ..gpst_format import MAGIC, TYPED_KINDS, VERSION, encode_tz, encode_value, to_little_endian
+from ..track import Track
+from .writer import Writer, Precision, temp_path
+from ...utils.logger import logger
+
+
+class GpstWriter(Writer):
+    def write(self, track: Track, path: Path, precision: Precision = Precision.LOSSLESS) -> bool:
+        """Write track to binary columnar GPST file.
+
+        Values are stored as they are, precision is ignored. Tracks other than ColumnarTrack
+        are converted to columns first. Tracks with timestamps of mixed UTC offsets or in a
+        time zone other than a fixed offset are not written.
+        """
+        logger.debug(f"Writing GPST file to '{path}'...")
+
+        tmp = temp_path(path) # replaces path only once fully written
+        try:
+            columnar = track if isinstance(track, ColumnarTrack) else self._to_columnar(track)
+
+            header = {
+                'version': VERSION,
+                'points': len(columnar.timestamps_us),
+                'tz': encode_tz(columnar.tz),
+                'metadata': {key: encode_value(value) for key, value in track.metadata.items()},
+                'segments': [{key: encode_value(value) for key, value in segment.items()} for _, segment in track.segments],
+                'curves': track.curves,
+                'columns': [{'name': key, 'kind': column.kind} if column.kind in TYPED_KINDS else
+                            {'name': key, 'kind': None, 'values': [encode_value(v) for v, m in zip(column.values, column.mask) if m]}
+                            for key, column in columnar.columns.items()],
+            }
+            header_bytes = json.dumps(header, separators=(',', ':')).encode("utf-8")
+
+            with open_file(tmp, "wb") as f:
+                f.write(MAGIC)
+                f.write(struct.pack("<I", len(header_bytes)))
+                f.write(header_bytes)
+                f.write(to_little_endian(columnar.timestamps_us).tobytes())
+                for column in columnar.columns.values():
+                    f.write(column.mask)
+                    if column.kind in TYPED_KINDS:
+                        f.write(to_little_endian(column.values).tobytes()) # type: ignore[arg-type]
+            os.replace(tmp, path)
+        except Exception as e:
+            tmp.unlink(missing_ok=True)
+            logger.error(f"Error writing GPST file to '{path}': {e}")
+            return False
+
+        return True
+
+
+    @staticmethod
+    def _to_columnar(track: Track) -> ColumnarTrack:
+        columnar = ColumnarTrack()
+        for ts, point in track.points_iter:
+            columnar._store_point(ts, dict(point))
+        return columnar
+
@@ -1,12 +1,13 @@
-import xml.etree.ElementTree as ET
+import io
+import os
 
-from datetime import datetime
 from pathlib import Path
-from types import SimpleNamespace
-from xml.dom import minidom
+from typing import TextIO
 
-from ..track import Track
-from .writer import Writer
+from ..compression import open_file
+from ..gpx_fields import ADX_V11_FIELDS, TPX_V2_FIELDS
+from ..track import Track, Value
+from .writer import Writer, Precision, temp_path
 from ...utils.helpers import to_string
 from ...utils.logger import logger
 
@@ -16,448 +17,473 @@ namespace_urls = {
     'xsi': "http://www.w3.org/2001/XMLSchema-instance",
     'tpx': "http://www.garmin.com/xmlschemas/TrackPointExtension/v2",
     'adx': "http://www.n3r1.com/xmlschemas/ActivityDataExtensions/v11",
-    'asx': "http://www.n3r1.com/xmlschemas/ActivitySegmentsExtensions/v11"
+    'asx': "http://www.n3r1.com/xmlschemas/ActivitySegmentsExtensions/v11",
+    'acx': "http://www.n3r1.com/xmlschemas/ActivityCurvesExtensions/v1"
 }
 
 namespace_schemas = {
     '': "http://www.topografix.com/GPX/1/1/gpx.xsd",
     'tpx': "http://www.garmin.com/xmlschemas/TrackPointExtensionv2.xsd",
     'adx': "http://www.n3r1.com/xmlschemas/ActivityDataExtensionsv11.xsd",
-    'asx': "http://www.n3r1.com/xmlschemas/ActivitySegmentsExtensionsv11.xsd"
+    'asx': "http://www.n3r1.com/xmlschemas/ActivitySegmentsExtensionsv11.xsd",
+    'acx': "http://www.n3r1.com/xmlschemas/ActivityCurvesExtensionsv1.xsd"
 }
 
-tag = SimpleNamespace(
-    gpx="{" + namespace_urls[''] + "}",
-    tpx="{" + namespace_urls['tpx'] + "}",
-    adx="{" + namespace_urls['adx'] + "}",
-    asx="{" + namespace_urls['asx'] + "}",
-)
+INDENT = "  "
+
+TRKPT_FORMATS = { # format specs applied to int and float values only
+    'heart_rate': ".0f", # written as integer
+}
+
+COMPACT_DECIMALS = { # decimal places of numeric track point fields written with compact precision
+    'latitude': 7, # ~1 cm
+    'longitude': 7,
+    'elevation': 1,
+    'smooth_elevation': 1,
+    'temperature': 1,
+    'speed': 3,
+    'timer': 3,
+    'distance': 2,
+    'calories': 1,
+    'respiration_rate': 2,
+    'core_temperature': 2,
+    'power': 0,
+    'power3s': 0,
+    'power10s': 0,
+    'power30s': 0,
+    'accumulated_power': 0,
+    'grade': 1,
+    'cumulative_ascent': 1,
+    'cumulative_descent': 1,
+    'vertical_speed': 2,
+    'left_torque_effectiveness': 1,
+    'right_torque_effectiveness': 1,
+    'left_pedal_smoothness': 1,
+    'right_pedal_smoothness': 1,
+    'combined_pedal_smoothness': 1,
+    'grit': 2,
+    'flow': 2,
+    'jump_distance': 2,
+    'jump_height': 2,
+    'jump_hang_time': 3,
+    'jump_score': 1,
+}
+
+_formats = {
+    Precision.LOSSLESS: TRKPT_FORMATS,
+    Precision.COMPACT: {**{key: f".{decimals}f" for key, decimals in COMPACT_DECIMALS.items()}, **TRKPT_FORMATS},
+}
+
+
+Template = tuple[str, tuple[str, ...]] # trkpt format string, point fields it formats
+
+_NUMERIC_TYPES = frozenset((int, float))
+
+
+def _escape(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+
+
+class _Text(str):
+    """Escaped text of a non-numeric point value, written as it is whatever format spec its field uses."""
+    def __format__(self, spec: str) -> str:
+        return str(self)
+
+
+def _point_value(value: Value) -> Value:
+    """Point value ready for trkpt template, anything but a number is written as escaped text."""
+    return value if type(value) in _NUMERIC_TYPES else _Text(_escape(str(value)))
+
+
+def _element(indent: str, name: str, children: list[str]) -> str:
+    """Element with already indented child lines, written as empty element without children."""
+    if not children:
+        return f"{indent}<{name}/>\n"
+    return f"{indent}<{name}>\n{''.join(children)}{indent}</{name}>\n"
 
 
 class GpxWriter(Writer):
-    def write(self, track: Track, path: Path) -> bool:
-        logger.debug(f"Writing GPX file to '{path}'...")
+    def __init__(self) -> None:
+        self._templates: dict[Precision, dict[tuple[str, ...], Template | None]] = {precision: {} for precision in Precision} # point fields: trkpt template
 
-        self._register_namespaces()
-        gpx = self._create_gpx_element()
-        metadata = self._create_metadata_element(gpx, track)
-        #future: wpt
-        #future: rte
-        trk = self._create_trk_element(gpx, track)
-        trk_ext = self._create_trk_extensions(trk, track)
-        trkseg = self._create_trkseg_element(trk, track)
-        trkpts = self._create_trkpt_elements(trkseg, track)
 
-        return self._write_file(gpx, path)
+    def write(self, track: Track, path: Path, precision: Precision = Precision.LOSSLESS) -> bool:
+        """Write track to GPX file.
 
+        Elements are written straight to the file as text - track points one at a time, so no
+        document tree is built and memory use does not grow with the track. Compact precision
+        rounds track point fields to COMPACT_DECIMALS.
+        """
+        logger.debug(f"Writing GPX file to '{path}' with {precision} precision...")
 
-    def _register_namespaces(self) -> None:
-        for key, url in namespace_urls.items():
-            ET.register_namespace(key, url)
+        tmp = temp_path(path) # replaces path only once fully written
+        try:
+            with io.TextIOWrapper(open_file(tmp, "wb"), encoding="utf-8") as f:
+                f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+                f.write(self._gpx_start_tag(track))
+                f.write(self._metadata_element(track))
+                #future: wpt
+                #future: rte
+                self._write_trk(f, track, precision)
+                f.write("</gpx>\n")
+            os.replace(tmp, path)
+        except Exception as e:
+            tmp.unlink(missing_ok=True)
+            logger.error(f"Error writing GPX file to '{path}': {e}")
+            return False
 
+        return True
 
-    def _create_gpx_element(self) -> ET.Element:
-        gpx = ET.Element(f"{tag.gpx}gpx", {
-            'version': "1.1",
-            'creator': "fitt",
-            f"{tag.gpx}schemaLocation": " ".join([f"{namespace_urls[key]} {namespace_schemas[key]}" for key in namespace_schemas.keys()])
-        })
-        return gpx
-    
 
-    def _create_metadata_element(self, gpx: ET.Element, track: Track) -> ET.Element:
-        metadata = ET.SubElement(gpx, f"{tag.gpx}metadata")
-        ET.SubElement(metadata, f"{tag.gpx}link", {'href': "https://github.com/neri14/fitt"})
+    def _gpx_start_tag(self, track: Track) -> str:
+        used = {'', 'xsi', 'tpx', 'adx'}
+        if len(track.segments) > 0:
+            used.add('asx')
+        if len(track.curves) > 0:
+            used.add('acx')
+
+        xmlns = " ".join(f'xmlns="{url}"' if key == '' else f'xmlns:{key}="{url}"' for key, url in namespace_urls.items() if key in used)
+        schema_location = " ".join([f"{namespace_urls[key]} {namespace_schemas[key]}" for key in namespace_schemas.keys()])
+        return f'<gpx {xmlns} version="1.1" creator="fitt" xsi:schemaLocation="{schema_location}">\n'
+
+
+    def _metadata_element(self, track: Track) -> str:
+        indent = INDENT * 2
+        lines = [f'{indent}<link href="https://github.com/neri14/fitt"/>\n']
 
         if 'start_time' in track.metadata:
-            ET.SubElement(metadata, f"{tag.gpx}time").text = to_string(track.metadata['start_time'])
+            lines.append(f"{indent}<time>{to_string(track.metadata['start_time'])}</time>\n")
         if all(k in track.metadata for k in ('minlat', 'minlon', 'maxlat', 'maxlon')):
-            ET.SubElement(metadata, f"{tag.gpx}bounds", {
-                'minlat': str(track.metadata['minlat']),
-                'minlon':  str(track.metadata['minlon']),
-                'maxlat': str(track.metadata['maxlat']),
-                'maxlon': str(track.metadata['maxlon']),
-            })
-        return metadata
+            metadata = track.metadata
+            lines.append(f'{indent}<bounds minlat="{metadata["minlat"]}" minlon="{metadata["minlon"]}" '
+                         f'maxlat="{metadata["maxlat"]}" maxlon="{metadata["maxlon"]}"/>\n')
+        return _element(INDENT, "metadata", lines)
 
 
-    def _create_trk_element(self, gpx: ET.Element, track: Track) -> ET.Element:
-        trk = ET.SubElement(gpx, f"{tag.gpx}trk")
-        ET.SubElement(trk, f"{tag.gpx}name").text = str(track.metadata['name']) if 'name' in track.metadata else "Unnamed Activity"
+    def _write_trk(self, f: TextIO, track: Track, precision: Precision) -> None:
+        indent = INDENT * 2
+        f.write(f"{INDENT}<trk>\n")
+        name = _escape(str(track.metadata['name'])) if 'name' in track.metadata else "Unnamed Activity"
+        f.write(f"{indent}<name>{name}</name>\n")
 
         if 'device' in track.metadata:
-            ET.SubElement(trk, f"{tag.gpx}src").text = str(track.metadata['device'])
+            f.write(f"{indent}<src>{_escape(str(track.metadata['device']))}</src>\n")
 
         track_type = track.metadata['sport'] if 'sport' in track.metadata else "other"
         if 'sub_sport' in track.metadata:
             track_type = f"{track.metadata['sub_sport']}_{track_type}"
-        ET.SubElement(trk, f"{tag.gpx}type").text = str(track_type)
+        f.write(f"{indent}<type>{_escape(str(track_type))}</type>\n")
 
-        return trk
+        f.write(self._trk_extensions_element(track))
+        self._write_trkseg(f, track, precision)
+        f.write(f"{INDENT}</trk>\n")
 
 
-    def _create_trk_extensions(self, trk: ET.Element, track: Track) -> ET.Element:
-        trk_ext = ET.SubElement(trk, f"{tag.gpx}extensions")
-        trk_adx = self._create_trk_adx_extension(trk_ext, track)
+    def _trk_extensions_element(self, track: Track) -> str:
+        children = [self._trk_adx_extension_element(track)]
 
         if len(track.segments) > 0:
-            trk_asx = self._create_trk_asx_extension(trk_ext, track)
+            children.append(self._trk_asx_extension_element(track))
+
+        if len(track.curves) > 0:
+            children.append(self._trk_acx_extension_element(track))
+
+        return _element(INDENT * 2, "extensions", children)
 
-        return trk_ext
-    
 
-    def _create_trk_adx_extension(self, trk_ext: ET.Element, track: Track) -> ET.Element:
-        trk_adx = ET.SubElement(trk_ext, f"{tag.adx}ActivityTrackExtension")
- 
+    def _trk_adx_extension_element(self, track: Track) -> str:
+        indent = INDENT * 4
+        fields: list[str] = []
+
         if 'total_elapsed_time' in track.metadata:
-            ET.SubElement(trk_adx, f"{tag.adx}elapsedtime").text = str(track.metadata['total_elapsed_time'])
+            fields.append(f"{indent}<adx:elapsedtime>{track.metadata['total_elapsed_time']}</adx:elapsedtime>\n")
         if 'total_timer_time' in track.metadata:
-            ET.SubElement(trk_adx, f"{tag.adx}timertime").text = str(track.metadata['total_timer_time'])
+            fields.append(f"{indent}<adx:timertime>{track.metadata['total_timer_time']}</adx:timertime>\n")
         if 'total_distance' in track.metadata:
-            ET.SubElement(trk_adx, f"{tag.adx}distance").text = str(track.metadata['total_distance'])
+            fields.append(f"{indent}<adx:distance>{track.metadata['total_distance']}</adx:distance>\n")
         elif 'total_track_distance' in track.metadata:
-            ET.SubElement(trk_adx, f"{tag.adx}distance").text = str(track.metadata['total_track_distance'])
+            fields.append(f"{indent}<adx:distance>{track.metadata['total_track_distance']}</adx:distance>\n")
         if 'total_ascent' in track.metadata:
-            ET.SubElement(trk_adx, f"{tag.adx}ascent").text = str(track.metadata['total_ascent'])
+            fields.append(f"{indent}<adx:ascent>{track.metadata['total_ascent']}</adx:ascent>\n")
         if 'total_descent' in track.metadata:
-            ET.SubElement(trk_adx, f"{tag.adx}descent").text = str(track.metadata['total_descent'])
+            fields.append(f"{indent}<adx:descent>{track.metadata['total_descent']}</adx:descent>\n")
         if 'max_grade' in track.metadata:
-            ET.SubElement(trk_adx, f"{tag.adx}maxgrade").text = str(track.metadata['max_grade'])
+            fields.append(f"{indent}<adx:maxgrade>{track.metadata['max_grade']}</adx:maxgrade>\n")
         if 'min_grade' in track.metadata:
-            ET.SubElement(trk_adx, f"{tag.adx}mingrade").text = str(track.metadata['min_grade'])
+            fields.append(f"{indent}<adx:mingrade>{track.metadata['min_grade']}</adx:mingrade>\n")
         if 'max_elevation' in track.metadata:
-            ET.SubElement(trk_adx, f"{tag.adx}maxele").text = str(track.metadata['max_elevation'])
+            fields.append(f"{indent}<adx:maxele>{track.metadata['max_elevation']}</adx:maxele>\n")
         if 'min_elevation' in track.metadata:
-            ET.SubElement(trk_adx, f"{tag.adx}minele").text = str(track.metadata['min_elevation'])
+            fields.append(f"{indent}<adx:minele>{track.metadata['min_elevation']}</adx:minele>\n")
         if 'total_cycles' in track.metadata:
-            ET.SubElement(trk_adx, f"{tag.adx}cycles").text = str(track.metadata['total_cycles'])
+            fields.append(f"{indent}<adx:cycles>{track.metadata['total_cycles']}</adx:cycles>\n")
         if 'total_strokes' in track.metadata:
-            ET.SubElement(trk_adx, f"{tag.adx}strokes").text = str(track.metadata['total_strokes'])
+            fields.append(f"{indent}<adx:strokes>{track.metadata['total_strokes']}</adx:strokes>\n")
         if 'total_work' in track.metadata:
-            ET.SubElement(trk_adx, f"{tag.adx}work").text = str(track.metadata['total_work'])
+            fields.append(f"{indent}<adx:work>{track.metadata['total_work']}</adx:work>\n")
         if 'total_calories' in track.metadata:
-            ET.SubElement(trk_adx, f"{tag.adx}kcal").text = str(track.metadata['total_calories'])
+            fields.append(f"{indent}<adx:kcal>{track.metadata['total_calories']}</adx:kcal>\n")
 
         if 'total_grit' in track.metadata:
-            ET.SubElement(trk_adx, f"{tag.adx}grit").text = str(track.metadata['total_grit'])
+            fields.append(f"{indent}<adx:grit>{track.metadata['total_grit']}</adx:grit>\n")
         if 'avg_flow' in track.metadata:
-            ET.SubElement(trk_adx, f"{tag.adx}flow").text = str(track.metadata['avg_flow'])
+            fields.append(f"{indent}<adx:flow>{track.metadata['avg_flow']}</adx:flow>\n")
         
         if 'avg_speed' in track.metadata:
-            ET.SubElement(trk_adx, f"{tag.adx}avgspeed").text = str(track.metadata['avg_speed'])
+            fields.append(f"{indent}<adx:avgspeed>{track.metadata['avg_speed']}</adx:avgspeed>\n")
         elif 'avg_track_speed' in track.metadata:
-            ET.SubElement(trk_adx, f"{tag.adx}avgspeed").text = str(track.metadata['avg_track_speed'])
+            fields.append(f"{indent}<adx:avgspeed>{track.metadata['avg_track_speed']}</adx:avgspeed>\n")
         if 'max_speed' in track.metadata:
-            ET.SubElement(trk_adx, f"{tag.adx}maxspeed").text = str(track.metadata['max_speed'])
+            fields.append(f"{indent}<adx:maxspeed>{track.metadata['max_speed']}</adx:maxspeed>\n")
         elif 'max_track_speed' in track.metadata:
-            ET.SubElement(trk_adx, f"{tag.adx}maxspeed").text = str(track.metadata['max_track_speed'])
+            fields.append(f"{indent}<adx:maxspeed>{track.metadata['max_track_speed']}</adx:maxspeed>\n")
         
         if 'avg_power' in track.metadata:
-            ET.SubElement(trk_adx, f"{tag.adx}avgpower").text = str(track.metadata['avg_power'])
+            fields.append(f"{indent}<adx:avgpower>{track.metadata['avg_power']}</adx:avgpower>\n")
         if 'max_power' in track.metadata:
-            ET.SubElement(trk_adx, f"{tag.adx}maxpower").text = str(track.metadata['max_power'])
+            fields.append(f"{indent}<adx:maxpower>{track.metadata['max_power']}</adx:maxpower>\n")
         if 'normalized_power' in track.metadata:
-            ET.SubElement(trk_adx, f"{tag.adx}normpower").text = str(track.metadata['normalized_power'])
+            fields.append(f"{indent}<adx:normpower>{track.metadata['normalized_power']}</adx:normpower>\n")
 
         if 'avg_vam' in track.metadata:
-            ET.SubElement(trk_adx, f"{tag.adx}avgvam").text = str(track.metadata['avg_vam'])
+            fields.append(f"{indent}<adx:avgvam>{track.metadata['avg_vam']}</adx:avgvam>\n")
 
         if 'avg_respiration_rate' in track.metadata:
-            ET.SubElement(trk_adx, f"{tag.adx}avgrr").text = str(track.metadata['avg_respiration_rate'])
+            fields.append(f"{indent}<adx:avgrr>{track.metadata['avg_respiration_rate']}</adx:avgrr>\n")
         if 'max_respiration_rate' in track.metadata:
-            ET.SubElement(trk_adx, f"{tag.adx}maxrr").text = str(track.metadata['max_respiration_rate'])
+            fields.append(f"{indent}<adx:maxrr>{track.metadata['max_respiration_rate']}</adx:maxrr>\n")
         if 'min_respiration_rate' in track.metadata:
-            ET.SubElement(trk_adx, f"{tag.adx}minrr").text = str(track.metadata['min_respiration_rate'])
+            fields.append(f"{indent}<adx:minrr>{track.metadata['min_respiration_rate']}</adx:minrr>\n")
         
         if 'jump_count' in track.metadata:
-            ET.SubElement(trk_adx, f"{tag.adx}jumps").text = str(track.metadata['jump_count'])
+            fields.append(f"{indent}<adx:jumps>{track.metadata['jump_count']}</adx:jumps>\n")
 
         if 'avg_heart_rate' in track.metadata:
             val = track.metadata['avg_heart_rate']
             if isinstance(val, float):
                 val = round(val)
-            ET.SubElement(trk_adx, f"{tag.adx}avghr").text = str(val)
+            fields.append(f"{indent}<adx:avghr>{val}</adx:avghr>\n")
         if 'max_heart_rate' in track.metadata:
             val = track.metadata['max_heart_rate']
             if isinstance(val, float):
                 val = round(val)
-            ET.SubElement(trk_adx, f"{tag.adx}maxhr").text = str(val)
+            fields.append(f"{indent}<adx:maxhr>{val}</adx:maxhr>\n")
         if 'avg_cadence' in track.metadata:
-            ET.SubElement(trk_adx, f"{tag.adx}avgcad").text = str(track.metadata['avg_cadence'])
+            fields.append(f"{indent}<adx:avgcad>{track.metadata['avg_cadence']}</adx:avgcad>\n")
         if 'max_cadence' in track.metadata:
-            ET.SubElement(trk_adx, f"{tag.adx}maxcad").text = str(track.metadata['max_cadence'])
+            fields.append(f"{indent}<adx:maxcad>{track.metadata['max_cadence']}</adx:maxcad>\n")
 
         if 'avg_temperature' in track.metadata:
-            ET.SubElement(trk_adx, f"{tag.adx}avgatemp").text = str(track.metadata['avg_temperature'])
+            fields.append(f"{indent}<adx:avgatemp>{track.metadata['avg_temperature']}</adx:avgatemp>\n")
         if 'max_temperature' in track.metadata:
-            ET.SubElement(trk_adx, f"{tag.adx}maxatemp").text = str(track.metadata['max_temperature'])
+            fields.append(f"{indent}<adx:maxatemp>{track.metadata['max_temperature']}</adx:maxatemp>\n")
         if 'min_temperature' in track.metadata:
-            ET.SubElement(trk_adx, f"{tag.adx}minatemp").text = str(track.metadata['min_temperature'])
+            fields.append(f"{indent}<adx:minatemp>{track.metadata['min_temperature']}</adx:minatemp>\n")
+
+        if 'elevation_smoothing_window' in track.metadata:
+            fields.append(f"{indent}<adx:smoothwindow>{track.metadata['elevation_smoothing_window']}</adx:smoothwindow>\n")
+        if 'grade_calculation_window' in track.metadata:
+            fields.append(f"{indent}<adx:gradewindow>{track.metadata['grade_calculation_window']}</adx:gradewindow>\n")
 
-        return trk_adx
+        return _element(INDENT * 3, "adx:ActivityTrackExtension", fields)
 
 
-    def _create_trk_asx_extension(self, trk_ext: ET.Element, track: Track) -> ET.Element:
-        trk_asx = ET.SubElement(trk_ext, f"{tag.asx}ActivitySegmentsExtension")
+    def _trk_asx_extension_element(self, track: Track) -> str:
+        indent = INDENT * 5
+        segments: list[str] = []
 
         for ts, segment in track.segments_iter:
-            trk_seg = ET.SubElement(trk_asx, f"{tag.asx}segment")
+            fields: list[str] = []
 
             if 'name' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}name").text = str(segment['name'])
+                fields.append(f"{indent}<asx:name>{_escape(str(segment['name']))}</asx:name>\n")
             if 'type' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}type").text = str(segment['type'])
+                fields.append(f"{indent}<asx:type>{_escape(str(segment['type']))}</asx:type>\n")
             if 'source' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}source").text = str(segment['source'])
+                fields.append(f"{indent}<asx:source>{_escape(str(segment['source']))}</asx:source>\n")
             
             if 'start_time' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}starttime").text = to_string(segment['start_time'])
+                fields.append(f"{indent}<asx:starttime>{to_string(segment['start_time'])}</asx:starttime>\n")
             if 'end_time' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}endtime").text = to_string(segment['end_time'])
+                fields.append(f"{indent}<asx:endtime>{to_string(segment['end_time'])}</asx:endtime>\n")
 
             if 'start_timer' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}starttimer").text = str(segment['start_timer'])
+                fields.append(f"{indent}<asx:starttimer>{segment['start_timer']}</asx:starttimer>\n")
             if 'end_timer' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}endtimer").text = str(segment['end_timer'])
+                fields.append(f"{indent}<asx:endtimer>{segment['end_timer']}</asx:endtimer>\n")
 
             if 'start_distance' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}startdist").text = str(segment['start_distance'])
+                fields.append(f"{indent}<asx:startdist>{segment['start_distance']}</asx:startdist>\n")
             if 'end_distance' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}enddist").text = str(segment['end_distance'])
+                fields.append(f"{indent}<asx:enddist>{segment['end_distance']}</asx:enddist>\n")
 
             if 'start_elevation' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}startele").text = str(segment['start_elevation'])
+                fields.append(f"{indent}<asx:startele>{segment['start_elevation']}</asx:startele>\n")
             if 'end_elevation' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}endele").text = str(segment['end_elevation'])
+                fields.append(f"{indent}<asx:endele>{segment['end_elevation']}</asx:endele>\n")
 
             if 'start_ascent' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}startasc").text = str(segment['start_ascent'])
+                fields.append(f"{indent}<asx:startasc>{segment['start_ascent']}</asx:startasc>\n")
             if 'end_ascent' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}endasc").text = str(segment['end_ascent'])
+                fields.append(f"{indent}<asx:endasc>{segment['end_ascent']}</asx:endasc>\n")
             if 'start_descent' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}startdesc").text = str(segment['start_descent'])
+                fields.append(f"{indent}<asx:startdesc>{segment['start_descent']}</asx:startdesc>\n")
             if 'end_descent' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}enddesc").text = str(segment['end_descent'])
+                fields.append(f"{indent}<asx:enddesc>{segment['end_descent']}</asx:enddesc>\n")
 
             if 'start_latitude' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}startlat").text = str(segment['start_latitude'])
+                fields.append(f"{indent}<asx:startlat>{segment['start_latitude']}</asx:startlat>\n")
             if 'start_longitude' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}startlon").text = str(segment['start_longitude'])
+                fields.append(f"{indent}<asx:startlon>{segment['start_longitude']}</asx:startlon>\n")
             if 'end_latitude' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}endlat").text = str(segment['end_latitude'])
+                fields.append(f"{indent}<asx:endlat>{segment['end_latitude']}</asx:endlat>\n")
             if 'end_longitude' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}endlon").text = str(segment['end_longitude'])
+                fields.append(f"{indent}<asx:endlon>{segment['end_longitude']}</asx:endlon>\n")
 
             if 'minlat' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}minlat").text = str(segment['minlat'])
+                fields.append(f"{indent}<asx:minlat>{segment['minlat']}</asx:minlat>\n")
             if 'minlon' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}minlon").text = str(segment['minlon'])
+                fields.append(f"{indent}<asx:minlon>{segment['minlon']}</asx:minlon>\n")
             if 'maxlat' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}maxlat").text = str(segment['maxlat'])
+                fields.append(f"{indent}<asx:maxlat>{segment['maxlat']}</asx:maxlat>\n")
             if 'maxlon' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}maxlon").text = str(segment['maxlon'])
+                fields.append(f"{indent}<asx:maxlon>{segment['maxlon']}</asx:maxlon>\n")
 
             if 'total_elapsed_time' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}elapsedtime").text = str(segment['total_elapsed_time'])
+                fields.append(f"{indent}<asx:elapsedtime>{segment['total_elapsed_time']}</asx:elapsedtime>\n")
             if 'total_timer_time' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}timertime").text = str(segment['total_timer_time'])
+                fields.append(f"{indent}<asx:timertime>{segment['total_timer_time']}</asx:timertime>\n")
             if 'total_distance' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}distance").text = str(segment['total_distance'])
+                fields.append(f"{indent}<asx:distance>{segment['total_distance']}</asx:distance>\n")
             if 'total_ascent' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}ascent").text = str(segment['total_ascent'])
+                fields.append(f"{indent}<asx:ascent>{segment['total_ascent']}</asx:ascent>\n")
             if 'total_descent' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}descent").text = str(segment['total_descent'])
+                fields.append(f"{indent}<asx:descent>{segment['total_descent']}</asx:descent>\n")
 
             if 'avg_grade' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}avggrade").text = str(segment['avg_grade'])
+                fields.append(f"{indent}<asx:avggrade>{segment['avg_grade']}</asx:avggrade>\n")
             if 'max_grade' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}maxgrade").text = str(segment['max_grade'])
+                fields.append(f"{indent}<asx:maxgrade>{segment['max_grade']}</asx:maxgrade>\n")
             if 'min_grade' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}mingrade").text = str(segment['min_grade'])
+                fields.append(f"{indent}<asx:mingrade>{segment['min_grade']}</asx:mingrade>\n")
 
             if 'max_elevation' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}maxele").text = str(segment['max_elevation'])
+                fields.append(f"{indent}<asx:maxele>{segment['max_elevation']}</asx:maxele>\n")
             if 'min_elevation' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}minele").text = str(segment['min_elevation'])
+                fields.append(f"{indent}<asx:minele>{segment['min_elevation']}</asx:minele>\n")
 
             if 'avg_speed' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}avgspeed").text = str(segment['avg_speed'])
+                fields.append(f"{indent}<asx:avgspeed>{segment['avg_speed']}</asx:avgspeed>\n")
             if 'max_speed' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}maxspeed").text = str(segment['max_speed'])
+                fields.append(f"{indent}<asx:maxspeed>{segment['max_speed']}</asx:maxspeed>\n")
 
             if 'avg_vam' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}avgvam").text = str(segment['avg_vam'])
+                fields.append(f"{indent}<asx:avgvam>{segment['avg_vam']}</asx:avgvam>\n")
 
             if 'avg_power' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}avgpower").text = str(segment['avg_power'])
+                fields.append(f"{indent}<asx:avgpower>{segment['avg_power']}</asx:avgpower>\n")
             if 'max_power' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}maxpower").text = str(segment['max_power'])
+                fields.append(f"{indent}<asx:maxpower>{segment['max_power']}</asx:maxpower>\n")
             if 'normalized_power' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}normpower").text = str(segment['normalized_power'])
+                fields.append(f"{indent}<asx:normpower>{segment['normalized_power']}</asx:normpower>\n")
 
             if 'avg_heart_rate' in segment:
                 val = segment['avg_heart_rate']
                 if isinstance(val, float):
                     val = round(val)
-                ET.SubElement(trk_seg, f"{tag.asx}avghr").text = str(val)
+                fields.append(f"{indent}<asx:avghr>{val}</asx:avghr>\n")
             if 'max_heart_rate' in segment:
                 val = segment['max_heart_rate']
                 if isinstance(val, float):
                     val = round(val)
-                ET.SubElement(trk_seg, f"{tag.asx}maxhr").text = str(val)
+                fields.append(f"{indent}<asx:maxhr>{val}</asx:maxhr>\n")
 
             if 'avg_cadence' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}avgcad").text = str(segment['avg_cadence'])
+                fields.append(f"{indent}<asx:avgcad>{segment['avg_cadence']}</asx:avgcad>\n")
             if 'max_cadence' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}maxcad").text = str(segment['max_cadence'])
+                fields.append(f"{indent}<asx:maxcad>{segment['max_cadence']}</asx:maxcad>\n")
 
             if 'total_cycles' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}cycles").text = str(segment['total_cycles'])
+                fields.append(f"{indent}<asx:cycles>{segment['total_cycles']}</asx:cycles>\n")
             if 'total_strokes' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}strokes").text = str(segment['total_strokes'])
+                fields.append(f"{indent}<asx:strokes>{segment['total_strokes']}</asx:strokes>\n")
             if 'total_work' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}work").text = str(segment['total_work'])
+                fields.append(f"{indent}<asx:work>{segment['total_work']}</asx:work>\n")
             if 'total_calories' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}kcal").text = str(segment['total_calories'])
+                fields.append(f"{indent}<asx:kcal>{segment['total_calories']}</asx:kcal>\n")
 
             if 'total_grit' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}grit").text = str(segment['total_grit'])
+                fields.append(f"{indent}<asx:grit>{segment['total_grit']}</asx:grit>\n")
             if 'avg_flow' in segment:
-                ET.SubElement(trk_seg, f"{tag.asx}flow").text = str(segment['avg_flow'])
+                fields.append(f"{indent}<asx:flow>{segment['avg_flow']}</asx:flow>\n")
 
-        return trk_asx
+            segments.append(_element(INDENT * 4, "asx:segment", fields))
 
+        return _element(INDENT * 3, "asx:ActivitySegmentsExtension", segments)
 
-    def _create_trkseg_element(self, trk: ET.Element, track: Track) -> ET.Element:
-        trkseg = ET.SubElement(trk, f"{tag.gpx}trkseg")
-        return trkseg
 
+    def _trk_acx_extension_element(self, track: Track) -> str:
+        indent = INDENT * 5
+        curves: list[str] = []
 
-    def _create_trkpt_elements(self, trkseg: ET.Element, track: Track) -> list[ET.Element]:
-        trkpts = []
-        for timestamp, data in track.points_iter:
-            trkpt = self._create_trkpt_element(trkseg, timestamp, data)
-            if trkpt:
-                trkpts.append(trkpt)
-        logger.debug(f"Created {len(trkpts)} track points in GPX.")
-        return trkpts
+        for key, curve in track.curves.items():
+            lines = [f"{indent}<acx:field>{_escape(key)}</acx:field>\n"]
+            for duration, value in curve:
+                lines.append(f'{indent}<acx:point duration="{duration}" value="{value}"/>\n')
+            curves.append(_element(INDENT * 4, "acx:curve", lines))
 
+        return _element(INDENT * 3, "acx:ActivityCurvesExtension", curves)
 
-    def _create_trkpt_element(self, trkseg: ET.Element, timestamp: datetime, data: dict) -> ET.Element | None:
-        if 'latitude' not in data or 'longitude' not in data:
-            logger.warning("Skipping record without position when generating gpx file")
-            return None
 
-        trkpt = ET.SubElement(trkseg, f"{tag.gpx}trkpt",
-                              lat=str(data['latitude']),
-                              lon=str(data['longitude']))
-        
-        if 'elevation' in data:
-            ET.SubElement(trkpt, f"{tag.gpx}ele").text = str(data['elevation'])
+    def _write_trkseg(self, f: TextIO, track: Track, precision: Precision) -> None:
+        templates = self._templates[precision]
+        count = 0
+        for timestamp, data in track.points_iter:
+            fields = tuple(data)
+            if fields not in templates:
+                templates[fields] = self._trkpt_template(fields, _formats[precision])
 
-        ET.SubElement(trkpt, f"{tag.gpx}time").text = to_string(timestamp)
+            template = templates[fields]
+            if template is None:
+                logger.warning("Skipping record without position when generating gpx file")
+                continue
 
-        trkpt_ext = ET.SubElement(trkpt, f"{tag.gpx}extensions")
+            if count == 0:
+                f.write(f"{INDENT * 2}<trkseg>\n")
+            text, keys = template
+            f.write(text.format(to_string(timestamp), *[_point_value(data[key]) for key in keys]))
+            count += 1
 
-        trkpt_tpx = ET.SubElement(trkpt_ext, f"{tag.tpx}TrackPointExtension")
+        f.write(f"{INDENT * 2}</trkseg>\n" if count > 0 else f"{INDENT * 2}<trkseg/>\n")
+        logger.debug(f"Written {count} track points to GPX using {len(templates)} track point templates.")
 
-        if 'temperature' in data:
-            ET.SubElement(trkpt_tpx, f"{tag.tpx}atemp").text = str(data['temperature'])
-        if 'heart_rate' in data:
-            val = data['heart_rate']
-            if isinstance(val, float):
-                val = round(val)
-            ET.SubElement(trkpt_tpx, f"{tag.tpx}hr").text = str(val)
-        if 'cadence' in data:
-            ET.SubElement(trkpt_tpx, f"{tag.tpx}cad").text = str(data['cadence'])
-        if 'speed' in data:
-            ET.SubElement(trkpt_tpx, f"{tag.tpx}speed").text = str(data['speed'])
-
-        trkpt_adx = ET.SubElement(trkpt_ext, f"{tag.adx}ActivityTrackPointExtension")
-
-        if 'timer' in data:
-            ET.SubElement(trkpt_adx, f"{tag.adx}timer").text = str(data['timer'])
-        if 'smooth_elevation' in data:
-            ET.SubElement(trkpt_adx, f"{tag.adx}smoothele").text = str(data['smooth_elevation'])
-        if 'distance' in data:
-            ET.SubElement(trkpt_adx, f"{tag.adx}dist").text = str(data['distance'])
-        if 'calories' in data:
-            ET.SubElement(trkpt_adx, f"{tag.adx}kcal").text = str(data['calories'])
-
-        if 'respiration_rate' in data:
-            ET.SubElement(trkpt_adx, f"{tag.adx}rr").text = str(data['respiration_rate'])
-        if 'core_temperature' in data:
-            ET.SubElement(trkpt_adx, f"{tag.adx}ctemp").text = str(data['core_temperature'])
-
-        if 'power' in data:
-            ET.SubElement(trkpt_adx, f"{tag.adx}power").text = str(data['power'])
-        if 'power3s' in data:
-            ET.SubElement(trkpt_adx, f"{tag.adx}power3s").text = str(data['power3s'])
-        if 'power10s' in data:
-            ET.SubElement(trkpt_adx, f"{tag.adx}power10s").text = str(data['power10s'])
-        if 'power30s' in data:
-            ET.SubElement(trkpt_adx, f"{tag.adx}power30s").text = str(data['power30s'])
-        if 'accumulated_power' in data:
-            ET.SubElement(trkpt_adx, f"{tag.adx}accpower").text = str(data['accumulated_power'])
-
-        if 'grade' in data:
-            ET.SubElement(trkpt_adx, f"{tag.adx}grade").text = str(data['grade'])
-        if 'cumulative_ascent' in data:
-            ET.SubElement(trkpt_adx, f"{tag.adx}asc").text = str(data['cumulative_ascent'])
-        if 'cumulative_descent' in data:
-            ET.SubElement(trkpt_adx, f"{tag.adx}desc").text = str(data['cumulative_descent'])
-        if 'vertical_speed' in data:
-            ET.SubElement(trkpt_adx, f"{tag.adx}vspeed").text = str(data['vertical_speed'])
-
-        if 'left_torque_effectiveness' in data:
-            ET.SubElement(trkpt_adx, f"{tag.adx}ltrqeff").text = str(data['left_torque_effectiveness'])
-        if 'right_torque_effectiveness' in data:
-            ET.SubElement(trkpt_adx, f"{tag.adx}rtrqeff").text = str(data['right_torque_effectiveness'])
-        if 'left_pedal_smoothness' in data:
-            ET.SubElement(trkpt_adx, f"{tag.adx}lpdlsmooth").text = str(data['left_pedal_smoothness'])
-        if 'right_pedal_smoothness' in data:
-            ET.SubElement(trkpt_adx, f"{tag.adx}rpdlsmooth").text = str(data['right_pedal_smoothness'])
-        if 'combined_pedal_smoothness' in data:
-            ET.SubElement(trkpt_adx, f"{tag.adx}cpdlsmooth").text = str(data['combined_pedal_smoothness'])
-
-        if 'grit' in data:
-            ET.SubElement(trkpt_adx, f"{tag.adx}grit").text = str(data['grit'])
-        if 'flow' in data:
-            ET.SubElement(trkpt_adx, f"{tag.adx}flow").text = str(data['flow'])
-
-        if 'active_climb' in data:
-            ET.SubElement(trkpt_adx, f"{tag.adx}climb").text = str(data['active_climb'])
-
-        if 'front_gear_num' in data:
-            ET.SubElement(trkpt_adx, f"{tag.adx}fgearnum").text = str(data['front_gear_num'])
-        if 'front_gear' in data:
-            ET.SubElement(trkpt_adx, f"{tag.adx}fgear").text = str(data['front_gear'])
-        if 'rear_gear_num' in data:
-            ET.SubElement(trkpt_adx, f"{tag.adx}rgearnum").text = str(data['rear_gear_num'])
-        if 'rear_gear' in data:
-            ET.SubElement(trkpt_adx, f"{tag.adx}rgear").text = str(data['rear_gear'])
-
-        if 'jump_distance' in data:
-            ET.SubElement(trkpt_adx, f"{tag.adx}jumpdist").text = str(data['jump_distance'])
-        if 'jump_height' in data:
-            ET.SubElement(trkpt_adx, f"{tag.adx}jumpheight").text = str(data['jump_height'])
-        if 'jump_hang_time' in data:
-            ET.SubElement(trkpt_adx, f"{tag.adx}jumptime").text = str(data['jump_hang_time'])
-        if 'jump_score' in data:
-            ET.SubElement(trkpt_adx, f"{tag.adx}jumpscore").text = str(data['jump_score'])
-
-        return trkpt
-
-
-    def _write_file(self, gpx: ET.Element, path: Path) -> bool:
-        try:
-            rough = ET.tostring(gpx, 'utf-8')
-            pretty = minidom.parseString(rough).toprettyxml(indent="  ")
-            with open(path, "w", encoding="utf-8") as f:
-                f.write(pretty)
-        except Exception as e:
-            logger.error(f"Error writing GPX file to '{path}': {e}")
-            return False
 
-        return True
+    def _trkpt_template(self, fields: tuple[str, ...], formats: dict[str, str]) -> Template | None:
+        """Build trkpt element template for points with given fields.
+
+        Returns format string taking the timestamp followed by values of returned point fields,
+        or None for points without position.
+        """
+        present = set(fields)
+        if 'latitude' not in present or 'longitude' not in present:
+            return None
 
+        keys: list[str] = []
+        def value(key: str) -> str:
+            keys.append(key)
+            return f"{{{len(keys)}:{formats.get(key, '')}}}"
+
+        indent = INDENT * 4
+        lines = [f'{INDENT * 3}<trkpt lat="{value("latitude")}" lon="{value("longitude")}">\n']
+        if 'elevation' in present:
+            lines.append(f"{indent}<ele>{value('elevation')}</ele>\n")
+        lines.append(f"{indent}<time>{{0}}</time>\n")
+
+        indent = INDENT * 6
+        tpx = [f"{indent}<tpx:{tag}>{value(key)}</tpx:{tag}>\n" for tag, (key, _) in TPX_V2_FIELDS.items() if key in present]
+        adx = [f"{indent}<adx:{tag}>{value(key)}</adx:{tag}>\n" for tag, (key, _) in ADX_V11_FIELDS.items() if key in present]
+
+        lines.append(_element(INDENT * 4, "extensions", [_element(INDENT * 5, "tpx:TrackPointExtension", tpx),
+                                                         _element(INDENT * 5, "adx:ActivityTrackPointExtension", adx)]))
+        lines.append(f"{INDENT * 3}</trkpt>\n")
+        return "".join(lines), tuple(keys)
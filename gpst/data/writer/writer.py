@@ -1,9 +1,22 @@
+import os
+
 from abc import ABC, abstractmethod
+from enum import StrEnum
 from pathlib import Path
 from ..track import Track
 
 
+class Precision(StrEnum):
+    LOSSLESS = 'lossless' # values read back exactly as written
+    COMPACT = 'compact' # values rounded to the precision of each field, smaller and faster to write
+
+
+def temp_path(path: Path) -> Path:
+    """Sibling of path to write to before replacing it, with the same suffixes so the same compression applies."""
+    return path.with_name(f".{os.getpid()}.{path.name}")
+
+
 class Writer(ABC):
     @abstractmethod
-    def write(self, track: Track, path: Path) -> bool:
+    def write(self, track: Track, path: Path, precision: Precision = Precision.LOSSLESS) -> bool:
         pass
@@ -0,0 +1,36 @@
+"""XML backend of GPX reader.
+
+lxml is used when it is installed, xml.etree from the standard library otherwise - both give
+the same elements. Set GPST_XML_BACKEND=etree to use the standard library even with lxml
+installed.
+"""
+import importlib
+import os
+
+from collections.abc import Iterator
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, BinaryIO, Literal
+
+
+try:
+    if os.getenv("GPST_XML_BACKEND", "lxml") == "etree":
+        raise ImportError("standard library backend requested")
+    _lxml: Any = importlib.import_module("lxml.etree")
+except ImportError:
+    _lxml = None
+
+if TYPE_CHECKING or _lxml is None:
+    import xml.etree.ElementTree as ET
+else:
+    ET = _lxml
+
+NAME = "etree" if _lxml is None else "lxml"
+
+
+def iterparse(source: Path | BinaryIO, events: tuple[Literal["start", "end"], ...]) -> Iterator[tuple[str, ET.Element]]:
+    """Iterate parsing events, comments and processing instructions are skipped like in xml.etree."""
+    if _lxml is not None:
+        return _lxml.iterparse(source, events=events, remove_comments=True, remove_pis=True, # type: ignore[no-any-return]
+                               resolve_entities=False, no_network=True)
+    return ET.iterparse(source, events=events)
+
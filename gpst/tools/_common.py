@@ -1,4 +1,5 @@
 from pathlib import Path
+from ..data.compression import track_suffix
 from ..utils.logger import logger
 
 
@@ -7,16 +8,16 @@ def verify_in_path(in_path: Path) -> bool:
         logger.error(f"Input file '{in_path}' does not exist.")
         return False
     
-    if in_path.suffix.lower() not in ('.fit', '.gpx'):
-        logger.error(f"Input file '{in_path}' is not a FIT or GPX file.")
+    if track_suffix(in_path) not in ('.fit', '.gpx', '.gpst'):
+        logger.error(f"Input file '{in_path}' is not a FIT, GPX or GPST file.")
         return False
 
     return True
 
 
 def verify_out_path(out_path: Path, accept: bool) -> bool:
-    if out_path.suffix.lower() != '.gpx':
-        logger.error(f"Output file '{out_path}' is not a GPX file.")
+    if track_suffix(out_path) not in ('.gpx', '.gpst'):
+        logger.error(f"Output file '{out_path}' is not a GPX or GPST file.")
         return False
 
     if out_path.exists():
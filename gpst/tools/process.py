@@ -2,9 +2,11 @@ import argparse
 
 from pathlib import Path
 
-from ..data.processors import calculate_additional_data, fix_elevation
+from ..data.processors import calculate_additional_data, calculate_curves, fix_elevation, Engine
+from ..data.compression import base_path
 from ..data.load_track import load_track
 from ..data.save_track import save_track
+from ..data.writer import Precision
 from ._tool_descriptor import Tool
 from ._common import verify_in_path, verify_out_path
 from ..utils.logger import logger
@@ -12,7 +14,9 @@ from ..utils.logger import logger
 
 def main(in_path: Path, out_path: Path, accept: bool,
          dem_files: list[Path] | None, dem_crs: str | None,
-         elevation_smoothing_window: int, grade_calculation_window: int) -> bool:
+         elevation_smoothing_window: int, grade_calculation_window: int,
+         engine: Engine = Engine.PYTHON, calculate: list[str] | None = None,
+         precision: Precision = Precision.LOSSLESS) -> bool:
     if not verify_in_path(in_path):
         return False
     if not verify_out_path(out_path, accept):
@@ -27,15 +31,29 @@ def main(in_path: Path, out_path: Path, accept: bool,
 
     if dem_files is not None and len(dem_files) > 0:
         logger.info("Fixing elevation data...")
-        track = fix_elevation(track, dem_files, dem_crs, report_basepath=out_path.with_suffix(''))
+        track = fix_elevation(track, dem_files, dem_crs, report_basepath=base_path(out_path))
+
+    fields: list[str] | None = None # all
+    curves = True
+    if calculate is not None and 'all' not in calculate:
+        fields = [key for key in calculate if key != 'curves']
+        curves = 'curves' in calculate
+        if curves:
+            fields.append('speed') # speed curve is calculated from the speed point field
 
     logger.info("Calculating additional data...")
     track = calculate_additional_data(track,
                                       elevation_smoothing_window=elevation_smoothing_window,
-                                      grade_calculation_window=grade_calculation_window)
+                                      grade_calculation_window=grade_calculation_window,
+                                      engine=engine,
+                                      fields=fields)
+
+    if curves:
+        logger.info("Calculating mean-maximal curves...")
+        track = calculate_curves(track)
 
     logger.info(f"Storing '{out_path}'...")
-    ok = save_track(track, out_path)
+    ok = save_track(track, out_path, precision)
 
     if not ok:
         logger.error(f"Failed to save track to '{out_path}'.")
@@ -101,6 +119,30 @@ def add_argparser(subparsers: argparse._SubParsersAction) -> None:
         help="Window size for grade calculation in meters (default: 100).",
         default=100
     )
+    parser.add_argument(
+        "--calculate",
+        nargs="+",
+        dest="calculate",
+        type=str,
+        metavar="FIELD",
+        help="Calculate only given fields and data they depend on, e.g. 'distance total_ascent', 'segments' for segment data, 'curves' for mean-maximal curves (default: all).",
+    )
+    parser.add_argument(
+        "--engine",
+        dest="engine",
+        type=Engine,
+        choices=list(Engine),
+        help="Calculation engine, 'numpy' requires NumPy to be installed (default: python).",
+        default=Engine.PYTHON
+    )
+    parser.add_argument(
+        "--precision",
+        dest="precision",
+        type=Precision,
+        choices=list(Precision),
+        help="Output precision, 'compact' rounds point data to the precision of each field, e.g. 7 decimal places for coordinates (default: lossless).",
+        default=Precision.LOSSLESS
+    )
 
 
 tool = Tool(
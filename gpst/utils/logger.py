@@ -21,9 +21,14 @@ def setup_logger() -> None:
 
 
 class logger:
+    @staticmethod
+    def trace_enabled() -> bool:
+        """Check once before a hot loop and guard trace calls with it to skip building messages."""
+        return _logger.isEnabledFor(TRACE_LEVEL)
+
     @staticmethod
     def trace(message: str) -> None:
-        _logger.log(5, message)
+        _logger.log(TRACE_LEVEL, message)
 
     @staticmethod
     def debug(message: str) -> None:
@@ -0,0 +1,7 @@
+from gpst.data.track import Track
+
+
+def snapshot(track: Track) -> tuple:
+    """Points with UTC offsets of their timestamps, metadata, segments and curves of track, for comparing tracks."""
+    return ([(ts, ts.utcoffset(), dict(p)) for ts, p in track.points_iter], dict(track.metadata),
+            [s for _, s in track.segments], track.curves)
@@ -0,0 +1,233 @@
+import math
+import random
+import statistics
+import pytest
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from gpst.data.columnar_track import ColumnarTrack
+from gpst.data.load_track import load_track
+from gpst.data.processors import calculate_additional_data, Engine
+from gpst.data.track import Track
+
+from conftest import snapshot
+
+
+def build_track(track_type: type[Track]) -> Track:
+    track = track_type()
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    for n in range(600):
+        point: dict = {}
+        if not 200 <= n < 210: # gap in location data
+            point['latitude'] = 50.0 + n * 0.0001
+            point['longitude'] = 19.0 + math.sin(n / 50) * 0.001
+        if n % 37 != 0:
+            point['elevation'] = 300.0 + 40.0 * math.sin(n / 60) + (n % 7) * 0.3
+        if n % 11 == 0:
+            point['speed'] = 5.5
+        if n % 5 != 0:
+            point['power'] = 150 + n % 50
+        track.upsert_point(start + timedelta(seconds=n + (n // 100)), point)
+    return track
+
+
+@pytest.mark.parametrize("track_type", [Track, ColumnarTrack])
+def test_ok_numpy_engine_matches_python(track_type):
+    pytest.importorskip("numpy")
+
+    expected = calculate_additional_data(build_track(track_type), 100, 100, engine=Engine.PYTHON)
+    result = calculate_additional_data(build_track(track_type), 100, 100, engine=Engine.NUMPY)
+
+    assert snapshot(result) == snapshot(expected), "NumPy engine should produce the same points and metadata as the Python engine."
+
+
+@pytest.mark.parametrize("track_type", [Track, ColumnarTrack])
+def test_ok_numpy_engine_matches_python_non_finite(track_type):
+    pytest.importorskip("numpy")
+
+    def build() -> Track:
+        track = build_track(track_type)
+        for n, (_, point) in enumerate(track.points_iter):
+            if n % 13 == 0:
+                point['power'] = float('nan')
+            if n % 17 == 0:
+                point['elevation'] = float('nan')
+            if n % 29 == 0:
+                point['distance'] = float('inf')
+        return track
+
+    expected = calculate_additional_data(build(), 100, 100, engine=Engine.PYTHON)
+    result = calculate_additional_data(build(), 100, 100, engine=Engine.NUMPY)
+
+    assert repr(snapshot(result)) == repr(snapshot(expected)), "NumPy engine should treat NaN and infinite values like the Python engine."
+
+
+def build_random_track(track_type: type[Track], seed: int, n: int) -> Track:
+    rng = random.Random(seed)
+    track = track_type()
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    timestamp, latitude, longitude, elevation = start, 50.0, 19.0, 300.0
+    for _ in range(n):
+        timestamp += timedelta(seconds=1 if rng.random() < 0.99 else rng.randint(2, 60)) # pauses in recording
+        latitude += rng.uniform(0.0, 1.0) * 1e-4
+        longitude += rng.uniform(-0.5, 1.0) * 1e-4
+        elevation += rng.gauss(0.0, 0.2)
+        point: dict = {'latitude': latitude, 'longitude': longitude, 'elevation': elevation}
+        if rng.random() < 0.9:
+            point['power'] = float(rng.randint(0, 600))
+        if rng.random() < 0.05:
+            del point['elevation']
+        track.upsert_point(timestamp, point)
+    return track
+
+
+@pytest.mark.parametrize("track_type", [Track, ColumnarTrack])
+def test_ok_numpy_engine_matches_python_random(track_type):
+    pytest.importorskip("numpy")
+
+    expected = calculate_additional_data(build_random_track(track_type, 5, 20000), 50, 80, engine=Engine.PYTHON)
+    result = calculate_additional_data(build_random_track(track_type, 5, 20000), 50, 80, engine=Engine.NUMPY)
+
+    assert snapshot(result) == snapshot(expected), "NumPy engine should produce bit-identical points and metadata on a large random track."
+
+
+@pytest.mark.parametrize("columnar", [False, True])
+def test_ok_numpy_engine_matches_python_sample(columnar):
+    pytest.importorskip("numpy")
+    path = Path(__file__).parent / "data" / "sample.fit"
+
+    expected = load_track(path, columnar=columnar)
+    result = load_track(path, columnar=columnar)
+    assert expected is not None and result is not None, "Sample track should load."
+
+    expected = calculate_additional_data(expected, 50, 80, engine=Engine.PYTHON)
+    result = calculate_additional_data(result, 50, 80, engine=Engine.NUMPY)
+
+    assert snapshot(result) == snapshot(expected), "NumPy engine should produce the same points and metadata as the Python engine."
+
+
+def test_ok_power_averages_match_brute_force():
+    track = Track()
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    timestamps = [start + timedelta(seconds=n + 20 * (n // 50)) for n in range(200)] # pauses in recording
+    for n, ts in enumerate(timestamps):
+        track.upsert_point(ts, {'power': float(100 + (n * 37) % 90)} if n % 7 else {'cadence': 80})
+
+    track = calculate_additional_data(track, 100, 100, power_windows={'power60s': 60})
+
+    power = {ts: p['power'] for ts, p in track.points_iter if 'power' in p}
+    for ts, point in track.points_iter:
+        for key, seconds in (('power3s', 3), ('power10s', 10), ('power30s', 30), ('power60s', 60)):
+            in_window = [p for t, p in power.items() if ts - timedelta(seconds=seconds) < t <= ts]
+            if in_window:
+                assert point[key] == statistics.mean(in_window), f"{key} should be the mean of power within the window."
+            else:
+                assert key not in point, f"{key} should not be set without power in the window."
+
+
+def test_ok_power_averages_skip_non_finite():
+    track = Track()
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    powers = [100.0, float('nan'), 200.0, float('inf'), 300.0]
+    for n, power in enumerate(powers):
+        track.upsert_point(start + timedelta(seconds=n), {'power': power})
+
+    track = calculate_additional_data(track, 100, 100, engine=Engine.PYTHON)
+
+    point = track.get_point(start + timedelta(seconds=4))
+    assert point is not None and point['power3s'] == 250.0, "NaN and infinite power should be skipped in rolling averages."
+    assert point['power10s'] == 200.0, "NaN and infinite power should not be counted in rolling averages."
+
+
+def test_ok_segment_averages_skip_non_finite():
+    track = Track()
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    heart_rates = [100.0, float('nan'), 120.0, float('inf'), 140.0]
+    for n, heart_rate in enumerate(heart_rates):
+        track.upsert_point(start + timedelta(seconds=n), {'heart_rate': heart_rate, 'cadence': float('nan') if n == 2 else 80})
+    track.add_segment({'start_time': start, 'end_time': start + timedelta(seconds=4)})
+
+    track = calculate_additional_data(track, 100, 100, engine=Engine.PYTHON)
+
+    segment = track.segments[0][1]
+    assert segment['avg_heart_rate'] == 120.0, "NaN and infinite heart rate should be skipped in segment averages."
+    assert segment['max_heart_rate'] == 140.0, "Infinite heart rate should not be the segment maximum."
+    assert segment['avg_cadence'] == 80, "NaN cadence should be skipped in segment averages."
+
+
+def test_ok_overlapping_segments():
+    track = build_track(Track)
+    for n, (_, point) in enumerate(track.points_iter):
+        point['heart_rate'] = 100 + n % 23
+    timestamps = [ts for ts, _ in track.points_iter]
+    bounds = [(0, 599), (0, 299), (250, 450), (300, 599), (420, 430), (590, 599)] # laps and overlapping climbs
+    for a, b in bounds:
+        track.add_segment({'start_time': timestamps[a], 'end_time': timestamps[b]})
+
+    track = calculate_additional_data(track, 100, 100)
+
+    for _, segment in track.segments_iter:
+        points = [p for _, p in track.range_iter(segment['start_time'], segment['end_time'])] # type: ignore[arg-type]
+        assert segment['max_power'] == max(p['power'] for p in points if 'power' in p), "Segment max_power should cover points within the segment."
+        assert segment['avg_heart_rate'] == statistics.mean(p['heart_rate'] for p in points), "Segment avg_heart_rate should be the mean over the segment."
+        assert segment['start_timer'] == points[0]['timer'] and segment['end_timer'] == points[-1]['timer'], "Segment timers should come from its first and last point."
+
+
+def test_ok_changed_grade_window_recalculates_grade_only():
+    track = calculate_additional_data(build_track(Track), 100, 100)
+    ts, point = next(iter(track.points_iter))
+    point['track_distance'] = -1.0 # marks which stages run again
+    point['power3s'] = -1.0
+
+    track = calculate_additional_data(track, 100, 60)
+    expected = calculate_additional_data(build_track(Track), 100, 60)
+
+    assert [p.get('grade') for _, p in track.points_iter] == [p.get('grade') for _, p in expected.points_iter], \
+        "Grade should be recalculated with the new window."
+    assert track.metadata == expected.metadata, "Grade metadata should be recalculated with the new window."
+    assert point['track_distance'] == -1.0 and point['power3s'] == -1.0, "Stages not depending on the grade window should not run."
+
+
+def raise_elevation(track: Track, timestamps: list[datetime]) -> None:
+    for ts in timestamps:
+        point = track.get_point(ts)
+        if point is not None and 'elevation' in point:
+            point['elevation'] = point['elevation'] + 25.0 # type: ignore[operator]
+
+
+@pytest.mark.parametrize("engine", [Engine.PYTHON, Engine.NUMPY])
+def test_ok_dirty_elevation_matches_full_calculation(engine):
+    if engine == Engine.NUMPY:
+        pytest.importorskip("numpy")
+
+    tracks = [build_track(Track), build_track(Track)]
+    timestamps = [ts for ts, _ in tracks[0].points_iter]
+    for track in tracks:
+        for a, b in ((0, 599), (250, 320), (400, 450)):
+            track.add_segment({'start_time': timestamps[a], 'end_time': timestamps[b]})
+
+    track = calculate_additional_data(tracks[0], 100, 100, engine=engine)
+    raise_elevation(track, timestamps[300:350])
+    track.mark_dirty('elevation', timestamps[300], timestamps[349])
+    track = calculate_additional_data(track, 100, 100, engine=engine)
+
+    raise_elevation(tracks[1], timestamps[300:350])
+    expected = calculate_additional_data(tracks[1], 100, 100, engine=engine)
+
+    assert snapshot(track) == snapshot(expected), "Recalculating dirty elevation should match a full calculation."
+    assert [s for _, s in track.segments_iter] == [s for _, s in expected.segments_iter], "Segment data depending on elevation should be recalculated."
+    assert not track.dirty, "Dirty fields should be cleared after calculation."
+
+
+def test_ok_calculate_requested_fields_only():
+    expected = calculate_additional_data(build_track(Track), 100, 100)
+    track = calculate_additional_data(build_track(Track), 100, 100, fields={'grade', 'power30s'})
+
+    points = [p for _, p in track.points_iter]
+    assert [p.get('grade') for p in points] == [p.get('grade') for _, p in expected.points_iter], "Requested grade should be calculated."
+    assert [p.get('power30s') for p in points] == [p.get('power30s') for _, p in expected.points_iter], "Requested power30s should be calculated."
+    assert not any('track_speed' in p or 'cumulative_ascent' in p or 'timer' in p for p in points), "Stages not needed for requested fields should be skipped."
+    assert 'grade_calculation_window' not in track.metadata, "Calculation windows should be recorded only after all stages ran."
+
+    track = calculate_additional_data(track, 100, 100)
+    assert snapshot(track) == snapshot(expected), "Calculating remaining fields later should match a full calculation."
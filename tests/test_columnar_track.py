@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from gpst.data.columnar_track import ColumnarTrack
+
+
+def test_ok_upsert_multiple_points_sorted():
+    track = ColumnarTrack()
+
+    timestamps_in = [
+        datetime(2024, 1, 1, 12, 0, 0),
+        datetime(2024, 1, 1, 14, 0, 0),
+        datetime(2024, 1, 1, 13, 0, 0)
+    ]
+    for n, ts in enumerate(timestamps_in):
+        track.upsert_point(ts, {"timestamp": ts, "latitude": float(n), "cadence": n})
+
+    assert len(track.points) == 3, "Track should have three points after three upserts."
+
+    timestamps_out = [ts for ts, _ in track.points_iter]
+    assert timestamps_out == sorted(timestamps_in), "Iterator should yield points in timestamp order."
+
+    point = track.get_point(timestamps_in[2])
+    assert point is not None, "Point should exist after upsert."
+    assert dict(point) == {"timestamp": timestamps_in[2], "latitude": 2.0, "cadence": 2}, "Point should match upserted data."
+    assert isinstance(point["cadence"], int), "Int fields should be stored as ints."
+
+
+def test_ok_extend_points():
+    track = ColumnarTrack()
+    t0, t1 = datetime(2024, 1, 1, 12, 0, 0), datetime(2024, 1, 1, 12, 0, 1)
+    track.extend_points([(t1, {"heart_rate": 110}), (t0, {"heart_rate": 100, "cadence": 80}), (t1, {"cadence": 81})])
+
+    assert [ts for ts, _ in track.points_iter] == [t0, t1], "Points should be stored in timestamp order."
+    point = track.get_point(t1)
+    assert point is not None and dict(point) == {"heart_rate": 110.0, "cadence": 81}, "Rows for the same timestamp should be merged."
+
+
+def test_ok_point_view_survives_insert_before():
+    track = ColumnarTrack()
+    ts1 = datetime(2024, 1, 1, 12, 0, 10, tzinfo=timezone.utc)
+    ts0 = datetime(2024, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
+
+    track.upsert_point(ts1, {"speed": 1.0})
+    point = track.get_point(ts1)
+    assert point is not None, "Point should exist after upsert."
+
+    track.upsert_point(ts0, {"speed": 2.0})
+    point["distance"] = 10.0
+
+    assert point["speed"] == 1.0, "View should follow its row after an insert before it."
+    assert track.get_point(ts1) == {"speed": 1.0, "distance": 10.0}, "Write through the view should land in the right row."
+    assert track.get_point(ts0) == {"speed": 2.0}, "Inserted point should not be affected."
+    assert next(iter(track.points)) == ts0, "Aware timestamps should be returned as aware datetimes."
+
+
+def test_ok_point_update_and_remove_fields():
+    track = ColumnarTrack()
+    ts = datetime(2024, 1, 1, 12, 0, 0)
+
+    track.upsert_point(ts, {"speed": 30, "elevation": 100.0})
+    track.upsert_point(ts, {"speed": 60.0})
+
+    point = track.get_point(ts)
+    assert point is not None, "Point should exist after upsert."
+    assert point["speed"] == 60.0, "Speed should be updated."
+
+    del point["elevation"]
+    assert "elevation" not in point, "Deleted field should be missing from the point."
+
+    track.remove_point_fields(["speed"])
+    assert len(point) == 0, "Point should have no fields after removal."
+
+
+def test_ok_mismatched_value_type_kept():
+    track = ColumnarTrack()
+    ts = datetime(2024, 1, 1, 12, 0, 0)
+
+    track.upsert_point(ts, {"latitude": 1.0})
+    track.upsert_point(datetime(2024, 1, 1, 12, 0, 1), {"latitude": "not-a-float"})
+
+    assert track.get_point(ts) == {"latitude": 1.0}, "Existing values should survive column type change."
+    assert track.get_point(datetime(2024, 1, 1, 12, 0, 1)) == {"latitude": "not-a-float"}, "Value should be stored as provided."
+
+
+def test_ok_missing_point():
+    track = ColumnarTrack()
+    assert track.get_point(datetime(2024, 1, 1)) is None, "Getting a point from an empty track should return None."
+
+    track.upsert_point(datetime(2024, 1, 1, 12), {"speed": 1.0})
+    assert track.get_point(datetime(2024, 1, 1, 13)) is None, "Getting a missing point should return None."
+
+
+def test_ok_range_iter():
+    track = ColumnarTrack()
+    for n in range(10):
+        track.upsert_point(datetime(2024, 1, 1, 12, 0, n), {"distance": float(n)})
+
+    in_range = [point["distance"] for _, point in track.range_iter(datetime(2024, 1, 1, 12, 0, 2), datetime(2024, 1, 1, 12, 0, 4))]
+    assert in_range == [2.0, 3.0, 4.0], "Range iterator should yield points within inclusive bounds in order."
+
+    sliced = track.slice(start=datetime(2024, 1, 1, 12, 0, 8))
+    assert isinstance(sliced, ColumnarTrack), "Slice should keep the track type."
+    assert len(sliced.points) == 2, "Slice should accept an open end bound."
+
+
+def test_ok_timestamps_keep_offset_and_microseconds():
+    track = ColumnarTrack()
+    tz = timezone(timedelta(hours=2))
+    timestamps_in = [datetime(2024, 1, 1, 12, 0, 0, 100, tzinfo=tz), datetime(2024, 1, 1, 12, 0, 0, 200, tzinfo=tz)]
+    for ts in timestamps_in:
+        track.upsert_point(ts, {"timestamp": ts})
+
+    timestamps_out = [ts for ts, _ in track.points_iter]
+    assert timestamps_out == timestamps_in, "Sub-millisecond timestamps should stay distinct."
+    assert all(ts.utcoffset() == timedelta(hours=2) for ts in timestamps_out), "Timestamps should keep their UTC offset."
+    point = track.get_point(timestamps_in[0])
+    assert point is not None and point["timestamp"].utcoffset() == timedelta(hours=2), "Datetime fields should keep their UTC offset."
+
+
+def test_nok_mixed_offsets():
+    track = ColumnarTrack()
+    track.upsert_point(datetime(2024, 1, 1, 12, 0, 0, tzinfo=timezone.utc), {"speed": 1.0})
+    with pytest.raises(ValueError):
+        track.upsert_point(datetime(2024, 1, 1, 14, 0, 1, tzinfo=timezone(timedelta(hours=2))), {"speed": 2.0})
+
+    track.upsert_point(datetime(2024, 1, 1, 12, 0, 2, tzinfo=timezone.utc), {"timestamp": datetime(2024, 1, 1, tzinfo=timezone(timedelta(hours=2)))})
+    point = track.get_point(datetime(2024, 1, 1, 12, 0, 2, tzinfo=timezone.utc))
+    assert point is not None and point["timestamp"].utcoffset() == timedelta(hours=2), "Datetime values with other offsets should be kept as they are."
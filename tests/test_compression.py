@@ -0,0 +1,49 @@
+import gzip
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+from gpst.data.compression import base_path, track_suffix
+from gpst.data.load_track import load_track
+from gpst.data.save_track import save_track
+
+from conftest import snapshot
+
+
+SAMPLE = Path(__file__).parent / "data" / "sample.fit"
+
+
+def test_ok_track_suffix():
+    assert track_suffix(Path("a/track.gpx")) == ".gpx", "Plain suffix should be used."
+    assert track_suffix(Path("a/track.v2.FIT.GZ")) == ".fit", "Suffix before compression suffix should be used."
+    assert track_suffix(Path("a/track.zst")) == "", "Compressed file without format suffix has no track suffix."
+    assert base_path(Path("a/track.gpx.zst")) == Path("a/track"), "Both suffixes should be removed."
+
+
+def test_ok_read_compressed_fit(tmp_path):
+    path = tmp_path / "sample.fit.gz"
+    path.write_bytes(gzip.compress(SAMPLE.read_bytes()))
+
+    track = load_track(path)
+    expected = load_track(SAMPLE)
+
+    assert track is not None and expected is not None, "Tracks should be read."
+    assert snapshot(track) == snapshot(expected), "Compressed FIT file should read the same as uncompressed."
+
+
+@pytest.mark.parametrize("suffix", [".gz", ".zst"])
+def test_ok_compressed_gpx_round_trip(tmp_path, suffix):
+    if suffix == ".zst" and importlib.util.find_spec("zstandard") is None and importlib.util.find_spec("compression") is None:
+        pytest.skip("zstd is not available")
+    track = load_track(SAMPLE)
+    assert track is not None, "Sample track should be read."
+
+    assert save_track(track, tmp_path / "track.gpx"), "Plain track should be written."
+    assert save_track(track, tmp_path / f"track.gpx{suffix}"), "Compressed track should be written."
+    plain = load_track(tmp_path / "track.gpx")
+    compressed = load_track(tmp_path / f"track.gpx{suffix}")
+
+    assert plain is not None and compressed is not None, "Tracks should be read back."
+    assert snapshot(compressed) == snapshot(plain), "Compressed GPX file should read the same as uncompressed."
+    assert (tmp_path / f"track.gpx{suffix}").stat().st_size < (tmp_path / "track.gpx").stat().st_size / 5, "GPX file should be compressed."
@@ -0,0 +1,67 @@
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from gpst.data.processors import calculate_curves
+from gpst.data.processors.curves import mean_maximal_curve
+from gpst.data.reader.gpx_reader import GpxReader
+from gpst.data.track import Track
+from gpst.data.writer.gpx_writer import GpxWriter
+from gpst.tools import process
+
+
+def brute_force_curve(series: list[float], durations: list[int]) -> list[tuple[int, float]]:
+    return [(d, max(sum(series[i:i+d]) for i in range(len(series) - d + 1)) / d) for d in durations]
+
+
+def test_ok_mean_maximal_curve():
+    rng = random.Random(7)
+    series = [float(rng.randint(0, 600)) for _ in range(300)]
+    durations = [1, 2, 5, 17, 60, 299, 300]
+
+    curve = mean_maximal_curve(series, durations)
+    expected = brute_force_curve(series, durations)
+
+    assert [d for d, _ in curve] == durations, "Curve should contain every requested duration."
+    for (_, value), (_, best) in zip(curve, expected):
+        assert abs(value - best) < 1e-9, "Curve value should be the best average over the duration."
+
+
+def test_ok_calculate_curves():
+    track = Track()
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    for n in range(60):
+        track.upsert_point(start + timedelta(seconds=n), {'power': 100.0 if n < 30 else 300.0})
+    track.upsert_point(start + timedelta(seconds=120), {'power': 500.0}) # last sample before the gap is held for CURVE_MAX_GAP, rest counts as zero
+
+    track = calculate_curves(track, durations=[1, 2, 10, 30, 60, 121, 500])
+
+    assert 'heart_rate' not in track.curves, "No curve should be calculated without data."
+    assert track.curves['power'] == [(1, 500.0), (2, 300.0), (10, 300.0), (30, 300.0), (60, (21 * 100 + 39 * 300) / 60), (121, (30 * 100 + 39 * 300 + 500) / 121)], \
+        "Power curve should hold best averages, samples are held up to the max gap and durations longer than the track are skipped."
+
+
+def test_ok_curves_gpx_round_trip(tmp_path):
+    track = Track()
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    for n in range(3):
+        track.upsert_point(start + timedelta(seconds=n), {'timestamp': start + timedelta(seconds=n), 'latitude': 50.0, 'longitude': 19.0})
+    track.set_curve('power', [(1, 350.0), (5, 300.5)])
+
+    path = tmp_path / "curves.gpx"
+    assert GpxWriter().write(track, path), "Track should be written."
+
+    loaded = GpxReader().read(path)
+    assert loaded is not None, "Track should be read back."
+    assert loaded.curves == {'power': [(1, 350.0), (5, 300.5)]}, "Curves should survive a GPX round trip."
+
+
+def test_ok_process_calculates_curves_on_request(tmp_path):
+    sample = Path(__file__).parent / "data" / "sample.fit"
+
+    for calculate, expected in ((None, True), (['distance'], False), (['distance', 'curves'], True)):
+        out = tmp_path / f"out_{expected}_{len(calculate or [])}.gpx"
+        assert process.main(sample, out, False, None, None, 100, 100, calculate=calculate), "Processing should succeed."
+        track = GpxReader().read(out)
+        assert track is not None, "Output should be readable."
+        assert bool(track.curves) == expected, f"Curves should be calculated only when requested (calculate={calculate})."
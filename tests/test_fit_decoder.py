@@ -0,0 +1,87 @@
+import struct
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+from garmin_fit_sdk import CrcCalculator, Decoder, Stream
+
+from gpst.data.reader import FitReader, fit_decoder
+from gpst.data.reader.fit_decoder import RECORD, FitDecoder, UnsupportedFit, crc
+from gpst.data.reader.fit_reader import RECORD_FIELDS
+
+
+SAMPLE = Path(__file__).parent / "data" / "sample.fit"
+
+
+def fit_file(records: bytes) -> bytes:
+    header = struct.pack("<BBHI4s", 12, 0x20, 2100, len(records), b".FIT")
+    data = header + records
+    return data + struct.pack("<H", crc(data, 0, len(data)))
+
+
+def decode_fast(data: bytes, mesg_nums: list[int]) -> list[tuple[int, dict]]:
+    messages: list[tuple[int, dict]] = []
+    handlers = {num: (lambda message, num=num: messages.append((num, message))) for num in mesg_nums}
+    assert FitDecoder(RECORD_FIELDS).decode(data, handlers) == [], "Sample file should decode without errors."
+    return messages
+
+
+def test_ok_crc():
+    data = SAMPLE.read_bytes()
+
+    assert crc(data, 0, len(data) - 2) == CrcCalculator.calculate_crc(data, 0, len(data) - 2), "CRC should match the SDK."
+
+
+def test_ok_sample_matches_sdk():
+    data = SAMPLE.read_bytes()
+    mesg_nums = [RECORD, 18, 12, 0, 21, 317, 285, 142] # record, session, sport, file_id, event, climb_pro, jump, segment_lap
+    expected: list[tuple[int, dict]] = []
+    keys = set(RECORD_FIELDS) | {'timestamp'}
+
+    def listener(num: int, message: dict) -> None:
+        if num == RECORD:
+            expected.append((num, {k: v for k, v in message.items() if k in keys}))
+        elif num in mesg_nums:
+            expected.append((num, message))
+    _, errors = Decoder(Stream.from_byte_array(bytearray(data))).read(mesg_listener=listener)
+    assert errors == [], "SDK should decode sample file."
+
+    messages = decode_fast(data, mesg_nums)
+
+    assert [num for num, _ in messages] == [num for num, _ in expected], "Messages should be decoded in file order."
+    for (num, message), (_, sdk_message) in zip(messages, expected):
+        assert message == sdk_message, f"Message {num} should match the SDK field by field."
+        for key, value in message.items():
+            assert type(value) is type(sdk_message[key]), f"Field '{key}' of message {num} should have the SDK type."
+
+
+def test_ok_compressed_timestamps():
+    records = struct.pack("<BBBHB", 0x40, 0, 0, RECORD, 2) + bytes([253, 4, 0x86, 3, 1, 0x02]) # local 0: timestamp, heart_rate
+    records += struct.pack("<BBBHB", 0x41, 0, 0, RECORD, 1) + bytes([3, 1, 0x02]) # local 1: heart_rate
+    records += struct.pack("<BIB", 0x00, 1000, 100) # timestamp 1000, 1000 & 0x1F == 8
+    records += bytes([0x80 | 0x20 | 10, 101]) + bytes([0x80 | 0x20 | 2, 102]) # offset 10 -> 1002, offset 2 rolls over -> 1026
+
+    messages = decode_fast(fit_file(records), [RECORD])
+
+    start = datetime(1989, 12, 31, tzinfo=timezone.utc)
+    assert [m['timestamp'] - start for _, m in messages] == [timedelta(seconds=s) for s in (1000, 1002, 1026)], "Compressed timestamps should be resolved."
+    assert [m['heart_rate'] for _, m in messages] == [100, 101, 102], "Fields of compressed timestamp messages should be read."
+
+
+def test_nok_unsupported_record_field():
+    definition = struct.pack("<BBBHB", 0x40, 0, 0, RECORD, 2) + bytes([253, 4, 0x86, 8, 3, 0x0D]) # compressed_speed_distance
+    data = fit_file(definition + struct.pack("<BI3B", 0x00, 1000, 1, 2, 3))
+
+    with pytest.raises(UnsupportedFit):
+        FitDecoder(RECORD_FIELDS).decode(data, {RECORD: lambda message: None})
+
+
+def test_ok_reader_same_as_sdk(monkeypatch):
+    fast = FitReader().read(SAMPLE)
+    monkeypatch.setattr(fit_decoder, "ENABLED", False)
+    sdk = FitReader().read(SAMPLE)
+
+    assert fast is not None and sdk is not None, "Sample file should be read."
+    assert [(ts, dict(p)) for ts, p in fast.points_iter] == [(ts, dict(p)) for ts, p in sdk.points_iter], "Points should match SDK decoding."
+    assert fast.metadata == sdk.metadata and fast.segments == sdk.segments, "Metadata and segments should match SDK decoding."
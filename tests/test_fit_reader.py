@@ -0,0 +1,49 @@
+from datetime import datetime, timezone
+from pathlib import Path
+
+from gpst.data.reader.fit_reader import FitReader
+from gpst.data.track import Track
+
+
+def test_ok_record_fields():
+    track = Track()
+    rows: list = []
+    ts = datetime(2024, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
+    FitReader()._handle_record_message({'timestamp': ts, 'position_lat': 2**30, 'altitude': 100.0, 'enhanced_altitude': 101.5,
+                                        'speed': 5.0, 'heart_rate': 120, 'unknown_field': 1}, {}, rows)
+    FitReader()._handle_record_message({'timestamp': ts, 'enhanced_speed': 6.5, 'speed': 6.0}, {}, rows)
+    track.extend_points(rows)
+
+    point = track.get_point(ts)
+    assert point is not None, "Point should be added."
+    assert point['latitude'] == 90.0, "Position should be converted from semicircles."
+    assert point['elevation'] == 101.5 and point['speed'] == 6.5, "Enhanced fields should take precedence regardless of order."
+    assert point['heart_rate'] == 120.0 and 'unknown_field' not in point, "Only mapped fields should be stored."
+
+
+def test_ok_read_metadata_only():
+    path = Path(__file__).parent / "data" / "sample.fit"
+    full = FitReader().read(path)
+    track = FitReader().read(path, points=False)
+
+    assert full is not None and track is not None, "Sample file should be read."
+    assert len(track.points) == 0, "Points should not be read."
+    assert track.metadata == full.metadata, "FILE_ID, SPORT and SESSION data should be read."
+
+
+def test_ok_climb_without_start():
+    track = Track()
+    reader = FitReader()
+    cache: dict = {}
+    metacache: dict = {}
+    fills: list = []
+    rows: list = []
+    ts = [datetime(2024, 1, 1, 12, 0, i, tzinfo=timezone.utc) for i in range(8)]
+    for t in ts:
+        reader._handle_record_message({'timestamp': t, 'speed': 1.0}, cache, rows)
+    reader._handle_climb_message({'timestamp': ts[2], 'climb_pro_event': 'complete', 'climb_number': 1}, cache, metacache, fills, rows, track)
+    reader._handle_climb_message({'timestamp': ts[5], 'climb_pro_event': 'complete', 'climb_number': 2}, cache, metacache, fills, rows, track)
+    reader._fill_climbs(fills, track)
+
+    climbs = [point.get('active_climb') for _, point in track.points_iter]
+    assert climbs == [1, 1, None, 2, 2, None, None, None], "Climbs should be back-filled from the end of the previous climb."
@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from gpst.data.columnar_track import ColumnarTrack
+from gpst.data.reader.gpst_reader import GpstReader
+from gpst.data.track import SegmentType, Track
+from gpst.data.writer.gpst_writer import GpstWriter
+
+from conftest import snapshot
+
+
+def make_track(track_type: type[Track], tz: timezone | None = timezone.utc) -> Track:
+    track = track_type()
+    start = datetime(2024, 1, 1, 12, 0, 0, tzinfo=tz)
+    for i in range(50):
+        ts = start + timedelta(seconds=i)
+        point: dict = {'timestamp': ts, 'latitude': 50.0 + i * 1e-5, 'longitude': 19.0, 'cadence': 80 + i % 5}
+        if i % 3:
+            point['power'] = 200.0 + i / 7
+        if i == 10:
+            point['active_climb'] = "climb" # value not matching column type
+        track.upsert_point(ts, point)
+    track.set_metadata('name', "Binary")
+    track.set_metadata('start_time', start)
+    track.set_metadata('total_distance', 1234.5)
+    track.add_segment({'name': "Climb 1", 'type': SegmentType.CLIMB, 'start_time': start, 'end_time': start + timedelta(seconds=20)})
+    track.set_curve('power', [(1, 230.0), (5, 220.5)])
+    return track
+
+
+@pytest.mark.parametrize("source_type", [Track, ColumnarTrack])
+@pytest.mark.parametrize("track_type", [Track, ColumnarTrack])
+@pytest.mark.parametrize("name", ["track.gpst", "track.gpst.gz"])
+def test_ok_round_trip(tmp_path, source_type, track_type, name):
+    expected = make_track(source_type)
+
+    assert GpstWriter().write(expected, tmp_path / name), "Track should be written."
+    track = GpstReader().read(tmp_path / name, track_type)
+
+    assert isinstance(track, track_type), "Track of the requested type should be read."
+    assert snapshot(track) == snapshot(expected), "Points, metadata, segments and curves should be read back unchanged."
+    assert isinstance(track.segments[0][1]['type'], SegmentType), "Segment type should be restored."
+
+
+def test_ok_round_trip_naive_timestamps(tmp_path):
+    expected = make_track(Track, tz=None)
+
+    assert GpstWriter().write(expected, tmp_path / "track.gpst"), "Track should be written."
+    track = GpstReader().read(tmp_path / "track.gpst", ColumnarTrack)
+
+    assert track is not None, "Track should be read."
+    assert snapshot(track) == snapshot(expected), "Naive timestamps should stay naive."
+
+
+@pytest.mark.parametrize("track_type", [Track, ColumnarTrack])
+def test_ok_round_trip_utc_offset(tmp_path, track_type):
+    tz = timezone(timedelta(hours=2))
+    expected = make_track(track_type, tz=tz)
+
+    assert GpstWriter().write(expected, tmp_path / "track.gpst"), "Track should be written."
+    track = GpstReader().read(tmp_path / "track.gpst", track_type)
+
+    assert track is not None, "Track should be read."
+    assert snapshot(track) == snapshot(expected), "Points should be read back unchanged."
+    assert {ts.utcoffset() for ts, _ in track.points_iter} == {timedelta(hours=2)}, "UTC offset of timestamps should be kept."
+    assert {p['timestamp'].utcoffset() for _, p in track.points_iter} == {timedelta(hours=2)}, "UTC offset of datetime columns should be kept."
+
+
+def test_nok_write_mixed_utc_offsets(tmp_path):
+    expected = make_track(Track)
+    ts = datetime(2024, 1, 1, 15, 0, 0, tzinfo=timezone(timedelta(hours=2)))
+    expected.upsert_point(ts, {'latitude': 50.0, 'longitude': 19.0})
+
+    assert not GpstWriter().write(expected, tmp_path / "track.gpst"), "Track with mixed UTC offsets should not be written."
+    assert list(tmp_path.iterdir()) == [], "No file should be left behind."
+
+
+def test_nok_read_not_gpst(tmp_path):
+    path = tmp_path / "track.gpst"
+    path.write_bytes(b"<?xml version=\"1.0\"?><gpx/>")
+
+    assert GpstReader().read(path) is None, "File without GPST header should not be read."
+
+
+def test_nok_read_truncated(tmp_path):
+    path = tmp_path / "track.gpst"
+    assert GpstWriter().write(make_track(Track), path), "Track should be written."
+    path.write_bytes(path.read_bytes()[:-10])
+
+    assert GpstReader().read(path) is None, "Truncated GPST file should not be read."
+
+
+def test_ok_read_header_only(tmp_path):
+    expected = make_track(Track)
+    assert GpstWriter().write(expected, tmp_path / "track.gpst"), "Track should be written."
+
+    track = GpstReader().read(tmp_path / "track.gpst", points=False)
+
+    assert track is not None, "Track should be read."
+    assert len(track.points) == 0, "Points should not be read."
+    assert snapshot(track)[1:] == snapshot(expected)[1:], "Metadata, segments and curves should be read."
+
+
+def test_nok_write_keeps_existing_file(tmp_path, monkeypatch):
+    path = tmp_path / "track.gpst"
+    path.write_bytes(b"previous")
+    def fail(*args):
+        raise OSError("disk full")
+    monkeypatch.setattr("gpst.data.writer.gpst_writer.to_little_endian", fail)
+
+    assert not GpstWriter().write(make_track(ColumnarTrack), path), "Failed write should be reported."
+
+    assert path.read_bytes() == b"previous", "Existing file should not be replaced by partial output."
+    assert [p.name for p in tmp_path.iterdir()] == ["track.gpst"], "Temporary file should be removed."
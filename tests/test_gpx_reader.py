@@ -0,0 +1,81 @@
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+from gpst.data.reader.gpx_reader import GpxReader
+from gpst.data.track import Track
+from gpst.data.writer.gpx_writer import GpxWriter
+
+
+def write_track(path, n: int) -> Track:
+    track = Track()
+    start = datetime(2024, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
+    for i in range(n):
+        ts = start + timedelta(seconds=i)
+        track.upsert_point(ts, {'timestamp': ts, 'latitude': 50.0 + i * 0.0001, 'longitude': 19.0,
+                                'elevation': 300.0 + i % 17, 'heart_rate': 120 + i % 30, 'power': float(200 + i % 50)})
+    track.set_metadata('name', "Streaming")
+    track.add_segment({'start_time': start, 'end_time': start + timedelta(seconds=n - 1)})
+    assert GpxWriter().write(track, path), "Track should be written."
+    return track
+
+
+def test_ok_read_streams_points(tmp_path):
+    path = tmp_path / "track.gpx"
+    expected = write_track(path, 3000)
+
+    tracemalloc.start()
+    track = GpxReader().read(path)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert track is not None, "Track should be read."
+    assert [(ts, dict(p)) for ts, p in track.points_iter] == [(ts, dict(p)) for ts, p in expected.points_iter], "All points should be read."
+    assert track.metadata['name'] == "Streaming" and len(track.segments) == 1, "Metadata and segments should be read."
+    assert peak < 2 * current, "Peak memory should stay proportional to the track, not to the XML tree."
+
+
+def test_nok_read_not_gpx(tmp_path):
+    path = tmp_path / "not_gpx.gpx"
+    path.write_text('<?xml version="1.0"?><kml xmlns="http://www.opengis.net/kml/2.2"><Document/></kml>')
+
+    assert GpxReader().read(path) is None, "Non GPX document should not be read."
+
+
+def test_nok_read_truncated(tmp_path):
+    path = tmp_path / "truncated.gpx"
+    write_track(path, 10)
+    path.write_text(path.read_text()[:-200])
+
+    assert GpxReader().read(path) is None, "Truncated GPX file should not be read."
+
+
+def test_ok_read_field_dispatch(tmp_path):
+    path = tmp_path / "fields.gpx"
+    path.write_text('<?xml version="1.0"?>'
+                    '<gpx xmlns="http://www.topografix.com/GPX/1/1" xmlns:tpx="http://www.garmin.com/xmlschemas/TrackPointExtension/v2" version="1.1">'
+                    '<trk><trkseg>'
+                    '<trkpt lat="50.0" lon="19.0"><ele>abc</ele><time>2024-01-01T12:00:00Z</time>'
+                    '<extensions><tpx:TrackPointExtension><tpx:hr>120</tpx:hr><tpx:cad>8.5</tpx:cad></tpx:TrackPointExtension>'
+                    '<x:hr xmlns:x="http://example.com/unknown">99</x:hr></extensions></trkpt>'
+                    '<trkpt lat="50.1" lon="19.1"><ele>301.5</ele><time>2024-01-01T12:00:01Z</time>'
+                    '<extensions><tpx:TrackPointExtension><tpx:hr>121</tpx:hr><tpx:cad>85</tpx:cad></tpx:TrackPointExtension></extensions></trkpt>'
+                    '</trkseg></trk></gpx>')
+
+    track = GpxReader().read(path)
+
+    assert track is not None, "Track should be read."
+    points = [dict(p) for _, p in track.points_iter]
+    assert [p.get('elevation') for p in points] == [None, 301.5], "Invalid field values should be skipped."
+    assert [p.get('heart_rate') for p in points] == [120.0, 121.0], "Extension fields should be read and unknown namespaces ignored."
+    assert [p.get('cadence') for p in points] == [None, 85], "Fields should be converted to their type."
+
+
+def test_ok_read_metadata_only(tmp_path):
+    path = tmp_path / "track.gpx"
+    write_track(path, 100)
+
+    track = GpxReader().read(path, points=False)
+
+    assert track is not None, "Track should be read."
+    assert len(track.points) == 0, "Track points should be skipped."
+    assert track.metadata['name'] == "Streaming" and len(track.segments) == 1, "Metadata and segments should be read."
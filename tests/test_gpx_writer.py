@@ -0,0 +1,142 @@
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+from gpst.data.processors import calculate_additional_data, calculate_curves
+from gpst.data.reader.gpx_reader import GpxReader
+from gpst.data.track import Track
+from gpst.data.writer import Precision
+from gpst.data.writer.gpx_writer import COMPACT_DECIMALS, GpxWriter
+
+
+SCHEMAS = Path(__file__).parent.parent / "schemas"
+
+SCHEMA_FILES = {
+    "http://www.topografix.com/GPX/1/1": "gpx.xsd",
+    "http://www.garmin.com/xmlschemas/TrackPointExtension/v2": "TrackPointExtensionv2.xsd",
+    "http://www.n3r1.com/xmlschemas/ActivityDataExtensions/v11": "ActivityDataExtensionsv11.xsd",
+    "http://www.n3r1.com/xmlschemas/ActivitySegmentsExtensions/v11": "ActivitySegmentsExtensionsv11.xsd",
+    "http://www.n3r1.com/xmlschemas/ActivityCurvesExtensions/v1": "ActivityCurvesExtensionsv1.xsd",
+}
+
+
+def build_track() -> Track:
+    track = Track()
+    start = datetime(2024, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
+    for n in range(300):
+        track.upsert_point(start + timedelta(seconds=n), {'latitude': 50.0 + n * 0.0001, 'longitude': 19.0, 'elevation': 300.0 - n * 0.2,
+                                                         'heart_rate': 120 + n % 30, 'power': float(200 + n % 50)})
+    track.set_metadata('name', 'Ride & <"fun">')
+    track.add_segment({'start_time': start, 'end_time': start + timedelta(seconds=100), 'name': 'Climb & descent'})
+    track = calculate_additional_data(track, 100, 100)
+    return calculate_curves(track, durations=[1, 5, 60])
+
+
+def test_ok_write_schema_valid(tmp_path):
+    etree = pytest.importorskip("lxml.etree")
+    imports = "".join(f'<xsd:import namespace="{url}" schemaLocation="{(SCHEMAS / name).as_uri()}"/>' for url, name in SCHEMA_FILES.items())
+    schema = etree.XMLSchema(etree.fromstring(f'<xsd:schema xmlns:xsd="http://www.w3.org/2001/XMLSchema">{imports}</xsd:schema>'))
+
+    path = tmp_path / "track.gpx"
+    assert GpxWriter().write(build_track(), path), "Track should be written."
+
+    assert schema.validate(etree.parse(str(path))), f"Written file should be valid against schemas: {schema.error_log}"
+
+
+def test_ok_write_round_trip(tmp_path):
+    track = build_track()
+    path = tmp_path / "track.gpx"
+    assert GpxWriter().write(track, path), "Track should be written."
+
+    loaded = GpxReader().read(path)
+
+    assert loaded is not None, "Track should be read back."
+    assert loaded.metadata['name'] == 'Ride & <"fun">', "Text should be escaped."
+    assert [s['name'] for _, s in loaded.segments_iter] == ['Climb & descent'], "Segments should be written."
+    assert loaded.curves == track.curves, "Curves should be written."
+    assert [p.get('grade') for _, p in loaded.points_iter] == [p.get('grade') for _, p in track.points_iter], "Point fields should be written."
+
+
+def test_ok_write_points_with_different_fields(tmp_path):
+    track = Track()
+    start = datetime(2024, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
+    points = [{'latitude': 50.0, 'longitude': 19.0, 'heart_rate': 120.6},
+              {'latitude': 50.1, 'longitude': 19.1, 'elevation': 301.5, 'power': 250.0, 'cadence': 85},
+              {'heart_rate': 130}, # no position
+              {'latitude': 50.2, 'longitude': 19.2, 'heart_rate': 140, 'grade': -2.5}]
+    for n, point in enumerate(points):
+        track.upsert_point(start + timedelta(seconds=n), point)
+
+    path = tmp_path / "track.gpx"
+    assert GpxWriter().write(track, path), "Track should be written."
+    loaded = GpxReader().read(path)
+
+    assert loaded is not None, "Track should be read back."
+    assert [{k: v for k, v in p.items() if k != 'timestamp'} for _, p in loaded.points_iter] == \
+        [{**points[0], 'heart_rate': 121}, points[1], points[3]], "Each point should be written with its own fields, heart rate as integer."
+    assert "<tpx:hr>121</tpx:hr>" in path.read_text(), "Heart rate should be written as integer."
+
+
+def test_ok_write_compact_precision(tmp_path):
+    track = build_track()
+    lossless, compact = tmp_path / "lossless.gpx", tmp_path / "compact.gpx"
+    assert GpxWriter().write(track, lossless, Precision.LOSSLESS), "Lossless track should be written."
+    assert GpxWriter().write(track, compact, Precision.COMPACT), "Compact track should be written."
+
+    exact = GpxReader().read(lossless)
+    rounded = GpxReader().read(compact)
+    assert exact is not None and rounded is not None, "Tracks should be read back."
+
+    for (_, lossless_point), (_, point), (_, original) in zip(exact.points_iter, rounded.points_iter, track.points_iter):
+        for key, decimals in COMPACT_DECIMALS.items():
+            if key in original:
+                assert lossless_point[key] == original[key], f"Lossless {key} should read back exactly."
+                assert point[key] == round(original[key], decimals), f"Compact {key} should be rounded to {decimals} decimal places."
+    assert compact.stat().st_size < lossless.stat().st_size, "Compact output should be smaller."
+
+
+def test_ok_write_escapes_text_point_values(tmp_path):
+    track = Track()
+    track.upsert_point(datetime(2024, 1, 1, 12, 0, 0, tzinfo=timezone.utc), {'latitude': 50.0, 'longitude': 19.0, 'power': 'a<b&c'})
+
+    path = tmp_path / "track.gpx"
+    assert GpxWriter().write(track, path), "Track should be written."
+
+    assert "<adx:power>a&lt;b&amp;c</adx:power>" in path.read_text(), "Text point value should be escaped."
+    assert GpxReader().read(path) is not None, "Written file should be well-formed."
+
+
+def test_nok_write_keeps_existing_file(tmp_path, monkeypatch):
+    path = tmp_path / "track.gpx"
+    path.write_text("previous")
+    def fail(*args):
+        raise OSError("disk full")
+    monkeypatch.setattr(GpxWriter, "_write_trkseg", fail)
+
+    assert not GpxWriter().write(build_track(), path), "Failed write should be reported."
+
+    assert path.read_text() == "previous", "Existing file should not be replaced by partial output."
+    assert [p.name for p in tmp_path.iterdir()] == ["track.gpx"], "Temporary file should be removed."
+
+
+def test_ok_write_wrong_type_value_as_text(tmp_path):
+    track = Track()
+    track.upsert_point(datetime(2024, 1, 1, 12, 0, 0, tzinfo=timezone.utc), {'latitude': 50.0, 'longitude': 19.0, 'heart_rate': 'high'})
+
+    path = tmp_path / "track.gpx"
+    assert GpxWriter().write(track, path), "Track with wrong type value should be written."
+
+    assert "<tpx:hr>high</tpx:hr>" in path.read_text(), "Wrong type value should be written as text without format spec."
+
+
+def test_ok_write_compact_wrong_type_value_as_text(tmp_path):
+    track = Track()
+    track.upsert_point(datetime(2024, 1, 1, 12, 0, 0, tzinfo=timezone.utc), {'latitude': 50.0, 'longitude': 19.0, 'elevation': 'n/a', 'power': 250})
+
+    path = tmp_path / "track.gpx"
+    assert GpxWriter().write(track, path, Precision.COMPACT), "Track with wrong type value should be written."
+
+    text = path.read_text()
+    assert "<ele>n/a</ele>" in text, "Wrong type value should be written as text without compact rounding."
+    assert "<adx:power>250</adx:power>" in text, "Numeric values should still be rounded."
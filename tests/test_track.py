@@ -187,6 +187,45 @@ def test_nok_point_type_verification_warnings(caplog):
     assert point_out["speed"] == -1.0, "Speed should be stored as provided despite range warning."
 
 
+def test_ok_extend_points():
+    track = Track()
+    t0, t1, t2 = (datetime(2024, 1, 1, 12, 0, s) for s in range(3))
+    track.upsert_point(t1, {"speed": 1.0})
+    track.extend_points([(t2, {"heart_rate": 120}), (t0, {"heart_rate": 100}), (t1, {"heart_rate": 110})])
+
+    assert [ts for ts, _ in track.points_iter] == [t0, t1, t2], "Points should be stored in timestamp order."
+    point = track.get_point(t1)
+    assert point is not None and point["speed"] == 1.0 and point["heart_rate"] == 110.0, "Rows should be merged into existing points."
+    assert all(isinstance(p["heart_rate"], float) for _, p in track.points_iter), "Int values of float fields should be converted."
+
+
+def test_nok_extend_points_warnings(caplog):
+    track = Track()
+    rows = [(datetime(2024, 1, 1, 12, 0, s), {"speed": -1.0, "latitude": "x", "foo": 1}) for s in range(3)]
+
+    with caplog.at_level(logging.WARNING):
+        track.extend_points(rows)
+    messages = [record.message for record in caplog.records]
+    assert any("below minimum in 3 points" in m for m in messages), "Range problems should be counted per field."
+    assert any("Incorrect type for 'latitude' in 3 points" in m for m in messages), "Type problems should be counted per field."
+    assert any("Unknown field 'foo' in 3 points" in m for m in messages), "Unknown fields should be counted per field."
+    assert len(messages) == 3, "Problems should be logged once per field, not per point."
+    assert len(track.points) == 3, "Points should be stored despite warnings."
+
+    with pytest.raises(ValueError):
+        Track().extend_points([(datetime(2024, 1, 1), {"longitude": 190.0})], strict=True)
+    strict = Track()
+    with pytest.raises(ValueError):
+        strict.extend_points([(datetime(2024, 1, 1), {"speed": 1.0}), (datetime(2024, 1, 2), {"speed": float("nan")}),
+                              (datetime(2024, 1, 3), {"speed": -1.0})], strict=True)
+    assert len(strict.points) == 0, "No point should be stored when strict validation fails."
+
+    rows = [(datetime(2024, 1, 1), {"heart_rate": 120, "speed": -1.0})]
+    with pytest.raises(ValueError):
+        strict.extend_points(rows, strict=True)
+    assert type(rows[0][1]["heart_rate"]) is int, "Rows should be left unchanged when strict validation fails."
+
+
 def test_nok_metadata_type_verification_warnings(caplog):
     track = Track()
 
@@ -255,4 +294,82 @@ def test_nok_upsert_point_invalid_data():
     invalid_data = ["not", "a", "dict"]
 
     with pytest.raises(TypeError, match="Data must be a dictionary"):
-        track.upsert_point(timestamp_in, invalid_data)
\ No newline at end of file
+        track.upsert_point(timestamp_in, invalid_data)
+
+
+def _brute_force_windows(distances: list, size: float) -> list[tuple[int, int]]:
+    windows = []
+    for i, value in enumerate(distances):
+        if value is None:
+            continue
+        lo = i
+        while lo > 0 and distances[lo-1] is not None and abs(distances[lo-1] - value) <= size / 2:
+            lo -= 1
+        hi = i + 1
+        while hi < len(distances) and distances[hi] is not None and abs(distances[hi] - value) <= size / 2:
+            hi += 1
+        windows.append((lo, hi))
+    return windows
+
+
+@pytest.mark.parametrize("distances", [
+    [0.0, 10.0, 20.0, 30.0, 40.0, 50.0, 60.0, 70.0],
+    [0.0, 10.0, None, 20.0, 30.0, 30.0, 45.0, None, 50.0],
+    [0.0, 30.0, 10.0, 40.0, 20.0, 50.0],
+])
+def test_ok_sliding_window(distances):
+    track = Track()
+    for n, distance in enumerate(distances):
+        point = {"elevation": float(n)}
+        if distance is not None:
+            point["distance"] = distance
+        track.upsert_point(datetime(2024, 1, 1, 12, 0, n), point)
+
+    expected = _brute_force_windows(distances, 25.0)
+    result = list(track.sliding_window_iter(key="distance", size=25.0, sums=("elevation",)))
+
+    assert len(result) == len(expected), "Sliding window should yield one window per point with distance."
+    for (_, point, window), (lo, hi) in zip(result, expected):
+        assert (window.start, window.end) == (lo, hi), f"Window bounds for point {point} should match brute force."
+        assert [p["elevation"] for p in window] == [float(n) for n in range(lo, hi)], "Window should contain points in order."
+        assert window.count("elevation") == hi - lo, "Window count should match number of points."
+        assert window.mean("elevation") == sum(range(lo, hi)) / (hi - lo), "Window mean should match points average."
+
+
+def test_ok_sliding_window_non_finite():
+    track = Track()
+    values = [(0.0, 1.0), (10.0, float("nan")), (float("nan"), 5.0), (20.0, float("inf")), (30.0, 3.0)]
+    for n, (distance, elevation) in enumerate(values):
+        track.upsert_point(datetime(2024, 1, 1, 12, 0, n), {"distance": distance, "elevation": elevation})
+
+    result = list(track.sliding_window_iter(key="distance", size=25.0, sums=("elevation",)))
+    assert len(result) == 5, "Every point with numeric distance should get a window."
+    assert (result[2][2].start, result[2][2].end) == (2, 3), "Point with NaN distance should get a window of itself."
+    assert result[2][2].mean("elevation") == 5.0, "Window of a NaN distance point should sum its own value."
+    assert result[0][2].count("elevation") == 1 and result[0][2].mean("elevation") == 1.0, "NaN values should count as missing."
+    assert result[4][2].mean("elevation") == 3.0, "Infinite values should count as missing."
+
+
+def test_ok_range_iter_and_slice():
+    track = Track()
+    for n in range(10):
+        track.upsert_point(datetime(2024, 1, 1, 12, 0, 9 - n), {"distance": float(9 - n)})
+    track.add_segment({"start_time": datetime(2024, 1, 1, 12, 0, 3), "end_time": datetime(2024, 1, 1, 12, 0, 5)})
+    track.add_segment({"start_time": datetime(2024, 1, 1, 12, 0, 1), "end_time": datetime(2024, 1, 1, 12, 0, 8)})
+
+    start = datetime(2024, 1, 1, 12, 0, 2)
+    end = datetime(2024, 1, 1, 12, 0, 6)
+
+    in_range = [point["distance"] for _, point in track.range_iter(start, end)]
+    assert in_range == [2.0, 3.0, 4.0, 5.0, 6.0], "Range iterator should yield points within inclusive bounds in order."
+    assert len(list(track.range_iter(end=start))) == 3, "Range iterator should accept an open start bound."
+    assert len(list(track.range_iter(start=end))) == 4, "Range iterator should accept an open end bound."
+
+    sliced = track.slice(start, end)
+    assert [ts for ts, _ in sliced.points_iter] == [ts for ts, _ in track.range_iter(start, end)], "Slice should contain points within bounds."
+    assert len(sliced.segments) == 1, "Slice should only contain segments lying entirely within bounds."
+
+    sliced_point = sliced.get_point(start)
+    assert sliced_point is not None, "Sliced point should exist."
+    sliced_point["distance"] = 100.0
+    assert track.get_point(start) == {"distance": 2.0}, "Slice should hold copies of points."
@@ -0,0 +1,84 @@
+import os
+from datetime import timedelta
+from pathlib import Path
+
+from gpst.data.columnar_track import ColumnarTrack
+from gpst.data.load_track import load_track
+from gpst.data.reader import FitReader
+from gpst.data.track_cache import TrackCache
+
+from conftest import snapshot
+
+
+SAMPLE = Path(__file__).parent / "data" / "sample.fit"
+
+
+def test_ok_load_from_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("GPST_CACHE_DIR", str(tmp_path / "cache"))
+    expected = load_track(SAMPLE)
+    assert expected is not None, "Track should be read."
+    assert len(list((tmp_path / "cache").glob("*.gpst"))) == 1, "Decoded track should be cached."
+
+    def fail(*args, **kwargs):
+        raise AssertionError("FIT file should not be decoded again")
+    monkeypatch.setattr(FitReader, "read", fail)
+    track = load_track(SAMPLE, columnar=True)
+
+    assert isinstance(track, ColumnarTrack), "Cached track should be read as requested track type."
+    assert snapshot(track) == snapshot(expected), "Cached track should match decoded track."
+
+
+def test_ok_cache_key_follows_content(tmp_path):
+    cache = TrackCache(tmp_path / "cache", 1024)
+    path = tmp_path / "track.fit"
+    path.write_bytes(b"abc")
+    key = cache.key(path)
+    path.write_bytes(b"abd")
+
+    assert cache.key(path) != key, "Changed file should get a different key."
+
+
+def test_ok_evict_least_recently_used(tmp_path):
+    track = load_track(SAMPLE)
+    assert track is not None, "Track should be read."
+    cache = TrackCache(tmp_path, 10**9)
+    for i, key in enumerate(("a", "b", "c")):
+        cache.put(key, track)
+        os.utime(tmp_path / f"{key}.gpst", ns=(i * 10**9, i * 10**9))
+    assert cache.get("a", type(track)) is not None, "Entry should be read from cache."
+
+    cache.max_size = 2 * (tmp_path / "a.gpst").stat().st_size
+    cache._evict()
+
+    assert sorted(p.stem for p in tmp_path.glob("*.gpst")) == ["a", "c"], "Least recently used entry should be evicted."
+
+
+def write_gpx(path: Path, times: list[str]) -> None:
+    points = "".join(f'<trkpt lat="50.0" lon="19.0"><ele>300.0</ele><time>{t}</time></trkpt>' for t in times)
+    path.write_text(f'<?xml version="1.0" encoding="UTF-8"?><gpx xmlns="http://www.topografix.com/GPX/1/1" version="1.1">'
+                    f'<trk><trkseg>{points}</trkseg></trk></gpx>')
+
+
+def test_ok_cached_track_keeps_utc_offset(tmp_path, monkeypatch):
+    monkeypatch.setenv("GPST_CACHE_DIR", str(tmp_path / "cache"))
+    path = tmp_path / "track.gpx"
+    write_gpx(path, ["2024-01-01T14:00:00+02:00", "2024-01-01T14:00:01.250+02:00"])
+    expected = load_track(path)
+
+    track = load_track(path)
+
+    assert len(list((tmp_path / "cache").glob("*.gpst"))) == 1, "Track with one fixed UTC offset should be cached."
+    assert track is not None and expected is not None, "Track should be read."
+    assert snapshot(track) == snapshot(expected), "Cached track should match decoded track including UTC offsets."
+
+
+def test_ok_skip_cache_for_mixed_utc_offsets(tmp_path, monkeypatch):
+    monkeypatch.setenv("GPST_CACHE_DIR", str(tmp_path / "cache"))
+    path = tmp_path / "track.gpx"
+    write_gpx(path, ["2024-01-01T14:00:00+02:00", "2024-01-01T12:00:01Z"])
+
+    track = load_track(path)
+
+    assert track is not None, "Track should be read."
+    assert [ts.utcoffset() for ts, _ in track.points_iter] == [timedelta(hours=2), timedelta(0)], "UTC offsets should be kept."
+    assert list((tmp_path / "cache").glob("*.gpst")) == [], "Track the GPST format cannot store exactly should not be cached."
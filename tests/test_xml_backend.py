@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+
+SAMPLE = Path(__file__).parent / "data" / "sample.fit"
+
+SCRIPT = """
+import sys
+from pathlib import Path
+from gpst.data import xml_backend
+from gpst.data.load_track import load_track
+from gpst.data.save_track import save_track
+
+track = load_track(Path(sys.argv[1]))
+assert track is not None and save_track(track, Path(sys.argv[2]))
+track = load_track(Path(sys.argv[2]))
+assert track is not None
+print(xml_backend.NAME, repr([(ts, dict(p)) for ts, p in track.points_iter]), repr(dict(track.metadata)), repr(list(track.segments_iter)))
+"""
+
+
+def run(backend: str, out: Path) -> str:
+    env = {**os.environ, 'GPST_XML_BACKEND': backend}
+    result = subprocess.run([sys.executable, "-c", SCRIPT, str(SAMPLE), str(out)], env=env, capture_output=True, text=True, check=True)
+    return result.stdout
+
+
+def test_ok_backends_match(tmp_path):
+    pytest.importorskip("lxml")
+
+    lxml = run("lxml", tmp_path / "lxml.gpx")
+    etree = run("etree", tmp_path / "etree.gpx")
+
+    assert lxml.startswith("lxml ") and etree.startswith("etree "), "Requested XML backend should be used."
+    assert lxml.split(" ", 1)[1] == etree.split(" ", 1)[1], "Both XML backends should read the same track."
+    assert (tmp_path / "lxml.gpx").read_bytes() == (tmp_path / "etree.gpx").read_bytes(), "Both XML backends should write the same file."